@@ -0,0 +1,227 @@
+from typing import List, Dict, Tuple, Callable
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from main import (fetch_rider_and_driver_coords, fetch_driver_passengers, calculate_average_coords,
+                  create_entry, sort_statistics)
+from encoding import encode_statistics
+
+# Riders per group mapped to the share of groups with that many riders
+DEFAULT_GROUP_SIZES = {1: 0.3, 2: 0.4, 3: 0.2, 4: 0.1}
+
+DEFAULT_SIZES = [10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5]
+
+STAGES = ["fetch_rider_and_driver_coords", "fetch_driver_passengers",
+          "calculate_average_coords", "sort", "serialize"]
+
+
+def _unique_cells(rng: np.random.Generator, count: int, area: int) -> np.ndarray:
+    """
+    Draws `count` distinct cell numbers out of `area` without building a permutation of the grid
+    """
+    cells = np.unique(rng.integers(0, area, size=count))
+    while len(cells) < count:
+        extra = rng.integers(0, area, size=2 * (count - len(cells)))
+        cells = np.unique(np.concatenate([cells, extra]))
+    # np.unique sorts, shuffle so IDs are not laid out in grid order
+    return rng.permutation(cells)[:count]
+
+
+def generate_payload(users: int, grid_width: int = None, grid_height: int = None,
+                     group_sizes: Dict[int, float] = None, rejected_ratio: float = 0.1,
+                     seed: int = 0) -> Dict:
+    """
+    Generates a deterministic synthetic payload shaped like `test_data.json`
+
+    Args:
+        users (int): Number of users, split into drivers and riders
+        grid_width (int): Number of grid columns, defaults to a square grid about
+            four times as large as the number of users
+        grid_height (int): Number of grid rows, defaults to grid_width
+        group_sizes (Dict[int, float]): Riders per group mapped to the share of groups of that size
+        rejected_ratio (float): Rejected requests added per accepted request
+        seed (int): Seed of the random generator, the same arguments always give the same payload
+
+    Return:
+        Dict: Payload with `users`, `pickupLocations`, `dropoffLocations` and `requests`
+    """
+    rng = np.random.default_rng(seed)
+    group_sizes = group_sizes or DEFAULT_GROUP_SIZES
+    grid_width = grid_width or max(math.ceil(math.sqrt(4 * users)), 1)
+    grid_height = grid_height or grid_width
+    if users > grid_width * grid_height:
+        raise ValueError("The grid is too small for the number of users")
+
+    # Split the users into groups of a driver followed by its riders
+    sizes = np.array(list(group_sizes), dtype=np.int64)
+    weights = np.array(list(group_sizes.values()), dtype=np.float64)
+    mean_group = float((sizes + 1) @ weights / weights.sum())
+    riders_per_group = rng.choice(sizes, size=int(users / mean_group) + 2, p=weights / weights.sum())
+    ends = np.cumsum(riders_per_group + 1)
+    riders_per_group = riders_per_group[ends <= users]
+
+    roles = np.zeros(users, dtype=np.int64)
+    starts = np.concatenate([[0], np.cumsum(riders_per_group + 1)[:-1]]).astype(np.int64)
+    roles[starts] = 1
+    ids = np.arange(1, users + 1)
+
+    requests: List[Dict] = []
+    drivers = ids[starts].tolist()
+    for driver, start, riders in zip(drivers, starts.tolist(), riders_per_group.tolist()):
+        for rider in range(start + 2, start + 2 + riders):
+            requests.append({"rider": rider, "driver": driver, "accepted": True})
+
+    # Rejected requests between random riders and drivers
+    riders = ids[roles == 0]
+    rejected = int(len(requests) * rejected_ratio)
+    if rejected and len(riders) and drivers:
+        for rider, driver in zip(rng.choice(riders, rejected).tolist(), rng.choice(drivers, rejected).tolist()):
+            requests.append({"rider": rider, "driver": driver, "accepted": False})
+    order = rng.permutation(len(requests))
+    requests = [requests[index] for index in order.tolist()]
+
+    def grid() -> List[List[int]]:
+        cells = np.full(grid_width * grid_height, -1, dtype=np.int64)
+        cells[_unique_cells(rng, users, grid_width * grid_height)] = ids
+        return cells.reshape(grid_height, grid_width).tolist()
+
+    return {
+        "users": [{"name": f"user{user}", "id": user, "role": role}
+                  for user, role in zip(ids.tolist(), roles.tolist())],
+        "pickupLocations": grid(),
+        "dropoffLocations": grid(),
+        "requests": requests,
+    }
+
+
+def _run_stages(data: Dict, measure: Callable) -> Dict[str, float]:
+    # Runs every stage in order, `measure` wraps each call and returns (result, measurement)
+    results: Dict[str, float] = {}
+
+    def stage(name, function, *args):
+        value, results[name] = measure(function, *args)
+        return value
+
+    def both_grids():
+        return (fetch_rider_and_driver_coords(data["pickupLocations"]),
+                fetch_rider_and_driver_coords(data["dropoffLocations"]))
+
+    def entries(driver_passengers, pickup_avg, dropoff_avg):
+        return sort_statistics([create_entry(driver, riders, pickup_avg, dropoff_avg)
+                                for driver, riders in driver_passengers.items()])
+
+    pickup, dropoff = stage("fetch_rider_and_driver_coords", both_grids)
+    driver_passengers = stage("fetch_driver_passengers", fetch_driver_passengers, data["requests"])
+    pickup_avg, dropoff_avg = stage("calculate_average_coords", calculate_average_coords,
+                                    driver_passengers, pickup, dropoff)
+    stats_sorted = stage("sort", entries, driver_passengers, pickup_avg, dropoff_avg)
+    stage("serialize", encode_statistics, stats_sorted)
+    return results
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    value = function(*args)
+    return value, time.perf_counter() - start
+
+
+def _peak_memory(function, *args):
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    value = function(*args)
+    return value, tracemalloc.get_traced_memory()[1] - baseline
+
+
+def run_benchmark(users: int, repeat: int = 3, memory: bool = True, **payload_options) -> Dict:
+    """
+    Times every stage of the statistics for one synthetic payload size
+
+    Args:
+        users (int): Number of users in the payload
+        repeat (int): Timing runs per stage, the fastest is reported
+        memory (bool): Also measure the peak memory of each stage in a separate traced run
+        **payload_options: Extra arguments of `generate_payload`
+
+    Return:
+        Dict: Payload size and per stage `seconds` (and `peak_bytes`)
+    """
+    data = generate_payload(users, **payload_options)
+    runs = [_run_stages(data, _timed) for _ in range(max(repeat, 1))]
+    stages = {name: {"seconds": min(run[name] for run in runs)} for name in STAGES}
+
+    if memory:
+        tracemalloc.start()
+        try:
+            peaks = _run_stages(data, _peak_memory)
+        finally:
+            tracemalloc.stop()
+        for name in STAGES:
+            stages[name]["peak_bytes"] = peaks[name]
+
+    return {
+        "users": users,
+        "grid": [len(data["pickupLocations"][0]), len(data["pickupLocations"])],
+        "requests": len(data["requests"]),
+        "stages": stages,
+    }
+
+
+def run_benchmarks(sizes: List[int], repeat: int = 3, memory: bool = True, **payload_options) -> Dict:
+    """
+    Runs `run_benchmark` for every size
+
+    Return:
+        Dict: Machine readable report with the environment and the result of each size
+    """
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": [run_benchmark(users, repeat, memory, **payload_options) for users in sizes],
+    }
+
+
+def _group_size(value: str) -> Tuple[int, float]:
+    # "riders:share", such as "3:0.25"
+    try:
+        riders, share = value.split(":")
+        return int(riders), float(share)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected riders:share, got {value!r}")
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the carpool statistics")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="numbers of users to benchmark (10^7 needs several GB of memory)")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per stage")
+    parser.add_argument("--rejected-ratio", type=float, default=0.1,
+                        help="rejected requests per accepted request")
+    parser.add_argument("--grid-width", type=int, help="grid columns, defaults to a square grid about 4x the users")
+    parser.add_argument("--grid-height", type=int, help="grid rows, defaults to the grid width")
+    parser.add_argument("--group-sizes", type=_group_size, nargs="+", metavar="RIDERS:SHARE",
+                        help="share of groups with each number of riders, such as 1:0.5 3:0.5")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory pass")
+    parser.add_argument("--output", help="write the JSON report to a file instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, args.repeat, not args.no_memory,
+                            grid_width=args.grid_width, grid_height=args.grid_height,
+                            group_sizes=dict(args.group_sizes) if args.group_sizes else None,
+                            rejected_ratio=args.rejected_ratio, seed=args.seed)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+from typing import List, Dict, Optional
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+import requests
+from main import compute_statistics, post_response
+from encoding import encode_statistics
+
+
+class ResultCache:
+    """
+    Bounded cache of computed statistics keyed by the content hash of the payload,
+    the least recently used entry is evicted once `maxsize` is reached. Safe to share
+    between threads.
+
+    Attributes:
+        hits (int): Lookups that found a cached result
+        misses (int): Lookups that did not
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str):
+        """
+        Returns the cached value (None when missing) and marks it as recently used
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class CachedProcessor:
+    """
+    Runs `process_and_post_statistics` with conditional GETs and a result cache
+
+    The GET sends `If-None-Match`/`If-Modified-Since` from the previous response of the
+    same URL, a `304 Not Modified` reuses the last result without downloading the body.
+    Bodies are hashed, a payload that was already computed (from any URL) skips parsing
+    and computing, and the POST is skipped when the same statistics were already posted
+    to that URL.
+
+    Args:
+        session (requests.Session): Session to reuse, defaults to a new one
+        maxsize (int): Maximum number of results kept in the cache
+        skip_duplicate_post (bool): Skip the POST when the payload did not change
+        encoder (str): Output encoder name, see `encoding.get_encoder`
+
+    Example:
+        processor = CachedProcessor()
+        processor.process(url)
+        processor.process(url)  # Not modified, nothing is recomputed or re-posted
+        processor.counters()
+    """
+
+    def __init__(self, session: requests.Session = None, maxsize: int = 128,
+                 skip_duplicate_post: bool = True, encoder: str = "auto"):
+        self.session = session or requests.Session()
+        self.cache = ResultCache(maxsize)
+        self.skip_duplicate_post = skip_duplicate_post
+        self.encoder = encoder
+        self.not_modified = 0
+        self.posts_skipped = 0
+        # URL mapped to its ETag, Last-Modified and content hash of the last payload
+        self._validators: Dict[str, Dict[str, Optional[str]]] = {}
+        # URL mapped to the content hash of the last payload whose statistics were posted
+        self._posted: Dict[str, str] = {}
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "not_modified": self.not_modified,
+            "posts_skipped": self.posts_skipped,
+            "size": len(self.cache),
+        }
+
+    def _fetch(self, url: str, conditional: bool = True):
+        """
+        GET the payload of the URL
+
+        Return:
+            str: Content hash of the payload, and the parsed payload (None when it was not
+                parsed because the result is already cached)
+            - None, if the data is fetched unsuccesfully
+        """
+        previous = self._validators.get(url)
+        headers = {}
+        if conditional and previous and previous["digest"] in self.cache:
+            if previous["etag"]:
+                headers["If-None-Match"] = previous["etag"]
+            if previous["last_modified"]:
+                headers["If-Modified-Since"] = previous["last_modified"]
+
+        try:
+            response = self.session.get(url, headers=headers)
+        except Exception as error:
+            print(f"Error Fetching Data From {url}:", error)
+            return None
+
+        if response.status_code == 304 and headers:
+            self.not_modified += 1
+            return previous["digest"], None
+
+        if response.status_code != 200:
+            print("Unexpected Status Code:", response.status_code)
+            return None
+
+        digest = content_hash(response.content)
+        self._validators[url] = {"etag": response.headers.get("ETag"),
+                                 "last_modified": response.headers.get("Last-Modified"),
+                                 "digest": digest}
+        if digest in self.cache:
+            return digest, None
+
+        try:
+            data = json.loads(response.content)
+        except ValueError as error:
+            print(f"Error Fetching Data From {url}:", error)
+            return None
+        if not data:
+            print("Unexpected Status Code:", response.status_code)
+            return None
+        return digest, data
+
+    def process(self, url: str):
+        """
+        Process data from a API endpoint and post its statistics, reusing cached work
+
+        Args:
+            url (str): API endpoint for retrieving and submitting data
+
+        Return:
+        List[Dict]: Sorted groups of the statistics using manhattan distance formula
+            - "Fail to GET data", if fetching failed or data is empty
+        """
+        fetched = self._fetch(url)
+        if fetched is None:
+            return "Fail to GET data"
+        digest, data = fetched
+
+        stats_sorted: List[Dict] = self.cache.get(digest)
+        if stats_sorted is None and data is None:
+            # Evicted since the conditional GET was sent, download it again
+            fetched = self._fetch(url, conditional=False)
+            if fetched is None:
+                return "Fail to GET data"
+            digest, data = fetched
+            if data is None:
+                stats_sorted = self.cache.get(digest)
+        if stats_sorted is None:
+            stats_sorted = compute_statistics(data)
+            self.cache.put(digest, stats_sorted)
+
+        if self.skip_duplicate_post and self._posted.get(url) == digest:
+            self.posts_skipped += 1
+            return stats_sorted
+
+        response = post_response(url, encode_statistics(stats_sorted, self.encoder), self.session)
+        print(response)
+        if response.startswith("Succesful"):
+            self._posted[url] = digest
+
+        return stats_sorted
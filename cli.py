@@ -0,0 +1,283 @@
+from typing import List, Dict, Iterable, Iterator, Optional, TextIO
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import requests
+from main import compute_statistics, post_response
+from encoding import encode_statistics
+from validation import compute_validated_statistics
+
+# Seconds between two progress lines
+PROGRESS_INTERVAL = 1.0
+
+# Session of each worker process, created by `_init_worker` when results are posted
+_SESSION: Optional[requests.Session] = None
+
+
+def expand_paths(patterns: Iterable[str]) -> List[str]:
+    """
+    Expands files, directories (every .json file below them) and glob patterns
+
+    Args:
+        patterns (Iterable[str]): Paths and patterns given on the command line
+
+    Return:
+        List[str]: Every matching file once, in the order given then sorted within a directory or pattern
+
+    Raises:
+        FileNotFoundError: If a path or pattern matches nothing
+    """
+    files: List[str] = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, "**", "*.json"), recursive=True))
+        elif os.path.isfile(pattern):
+            matches = [pattern]
+        else:
+            matches = sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+        if not matches:
+            raise FileNotFoundError(f"No payload files match {pattern}")
+        files.extend(matches)
+    return list(dict.fromkeys(files))
+
+
+def common_root(files: List[str]) -> str:
+    """
+    Deepest directory containing every file, outputs mirror the paths below it
+    """
+    if not files:
+        return ""
+    return os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in files])
+
+
+def _output_path(path: str, output_dir: str, root: str = None) -> str:
+    # Files with the same name in different directories keep distinct outputs
+    relative = os.path.relpath(os.path.abspath(path), root) if root else os.path.basename(path)
+    stem = os.path.splitext(relative)[0]
+    return os.path.join(output_dir, f"{stem}.stats.json")
+
+
+def _init_worker(post: bool):
+    global _SESSION
+    if post:
+        _SESSION = requests.Session()
+
+
+def process_file(path: str, encoder: str = "json", validation: str = None,
+                 output_dir: str = None, post_url: str = None, root: str = None) -> Dict:
+    """
+    Computes the statistics of one payload file, runs in a worker process
+
+    Args:
+        path (str): Payload file shaped like `test_data.json`
+        encoder (str): Compact output encoder, see `encoding.get_encoder`
+        validation (str): "raise" or "drop" to validate the payload first, see `validation.validate_payload`
+        output_dir (str): Write the statistics to `<output_dir>/<name>.stats.json` instead of returning them
+        post_url (str): Also POST the statistics to this URL
+        root (str): Directory the output_dir layout mirrors, see `common_root`, defaults to a flat
+            output_dir named after the file
+
+    Return:
+        Dict: `file`, `bytes` read, then `statistics` (encoded JSON, unless written to output_dir),
+            `output` and `posted` when requested, or the `error` that stopped the file
+            (reading, parsing, writing the output or posting)
+    """
+    result: Dict = {"file": path, "bytes": 0}
+    try:
+        with open(path, "rb") as file:
+            body = file.read()
+        result["bytes"] = len(body)
+        data = json.loads(body)
+        if validation:
+            stats_sorted = compute_validated_statistics(data, validation)
+        else:
+            stats_sorted = compute_statistics(data)
+        encoded = encode_statistics(stats_sorted, encoder)
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+        return result
+
+    try:
+        if output_dir:
+            result["output"] = _output_path(path, output_dir, root)
+            os.makedirs(os.path.dirname(result["output"]), exist_ok=True)
+            with open(result["output"], "wb") as file:
+                file.write(encoded)
+        else:
+            result["statistics"] = encoded
+
+        if post_url:
+            result["posted"] = False
+            response = post_response(post_url, encoded, _SESSION)
+            result["posted"] = response.startswith("Succesful")
+            if not result["posted"]:
+                result["error"] = response
+    except (OSError, requests.RequestException) as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+    return result
+
+
+def jsonl_line(result: Dict) -> bytes:
+    """
+    One JSON lines record of a processed file, the encoded statistics are embedded as they are
+    """
+    fields = {key: value for key, value in result.items() if key not in ("statistics", "bytes")}
+    line = json.dumps(fields, separators=(",", ":")).encode()
+    if "statistics" in result:
+        line = line[:-1] + b',"statistics":' + result["statistics"] + b"}"
+    return line + b"\n"
+
+
+def iter_results(files: List[str], workers: int = None, **options) -> Iterator[Dict]:
+    """
+    Processes the files on a pool of processes, yielding each result as soon as it is done
+
+    At most a few files per worker are queued at once, so results stream out and memory
+    stays bounded however many files there are.
+
+    Args:
+        files (List[str]): Payload files
+        workers (int): Number of processes, defaults to the number of CPUs
+        **options: Extra arguments of `process_file`
+
+    Return:
+        Iterator[Dict]: Result of every file, in completion order
+    """
+    workers = workers or os.cpu_count() or 1
+    pending: set = set()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(bool(options.get("post_url")),)) as executor:
+        for path in files:
+            pending.add(executor.submit(process_file, path, **options))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+        for future in _completed(pending):
+            yield future.result()
+
+
+def _completed(pending: set) -> Iterator[Future]:
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        yield from done
+
+
+class Progress:
+    """
+    Prints the files processed, failures and throughput at most once per interval
+    """
+
+    def __init__(self, total: int, stream: TextIO = sys.stderr, interval: float = PROGRESS_INTERVAL):
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.files = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self._printed = self.started
+
+    def update(self, result: Dict):
+        self.files += 1
+        self.failed += "error" in result
+        self.bytes += result["bytes"]
+        now = time.perf_counter()
+        if self.stream and (now - self._printed >= self.interval or self.files == self.total):
+            self._printed = now
+            self.stream.write(self.line() + "\n")
+            self.stream.flush()
+
+    def summary(self) -> Dict:
+        seconds = time.perf_counter() - self.started
+        return {
+            "files": self.files,
+            "failed": self.failed,
+            "bytes": self.bytes,
+            "seconds": seconds,
+            "files_per_second": self.files / seconds if seconds else 0.0,
+            "megabytes_per_second": self.bytes / seconds / 1e6 if seconds else 0.0,
+        }
+
+    def line(self) -> str:
+        summary = self.summary()
+        return (f"{self.files}/{self.total} files, {self.failed} failed, "
+                f"{summary['files_per_second']:.1f} files/s, {summary['megabytes_per_second']:.2f} MB/s")
+
+
+def run_batch(files: List[str], output: str = None, output_dir: str = None, workers: int = None,
+              progress: TextIO = sys.stderr, **options) -> Dict:
+    """
+    Processes payload files in parallel and streams their statistics out
+
+    Args:
+        files (List[str]): Payload files
+        output (str): JSON lines file with a record per payload, "-" or None for stdout,
+            unused when output_dir is given
+        output_dir (str): Directory of the per file outputs, created if needed, mirroring the
+            directories of the files below their `common_root`
+        workers (int): Number of processes, defaults to the number of CPUs
+        progress (TextIO): Stream of the progress lines, None to stay quiet
+        **options: `encoder`, `validation` and `post_url` of `process_file`
+
+    Return:
+        Dict: Files processed, failures, bytes read, seconds and throughput
+    """
+    tracker = Progress(len(files), progress)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        sink = open(os.path.join(output_dir, "results.jsonl"), "wb")
+    elif output and output != "-":
+        sink = open(output, "wb")
+    else:
+        sink = None
+
+    try:
+        root = common_root(files) if output_dir else None
+        for result in iter_results(files, workers, output_dir=output_dir, root=root, **options):
+            line = jsonl_line(result)
+            if sink:
+                sink.write(line)
+            else:
+                sys.stdout.buffer.write(line)
+                sys.stdout.flush()
+            tracker.update(result)
+    finally:
+        if sink:
+            sink.close()
+    return tracker.summary()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compute the carpool statistics of archived payload files")
+    parser.add_argument("paths", nargs="+", help="payload files, directories of .json files or glob patterns")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parallel processes")
+    parser.add_argument("--output", "-o", default="-",
+                        help="JSON lines file with a record per payload, stdout by default")
+    parser.add_argument("--output-dir", help="write <name>.stats.json per payload, in the directories of the payloads, (and results.jsonl) here")
+    parser.add_argument("--post", dest="post_url", help="also POST every result to this URL")
+    parser.add_argument("--validate", dest="validation", choices=["raise", "drop"],
+                        help="validate payloads, failing or dropping the invalid records")
+    parser.add_argument("--encoder", default="json", choices=["auto", "json", "orjson"])
+    parser.add_argument("--quiet", "-q", action="store_true", help="no progress lines")
+    args = parser.parse_args(argv)
+
+    try:
+        files = expand_paths(args.paths)
+    except FileNotFoundError as error:
+        parser.error(str(error))
+
+    summary = run_batch(files, args.output, args.output_dir, args.workers,
+                        None if args.quiet else sys.stderr,
+                        encoder=args.encoder, validation=args.validation, post_url=args.post_url)
+    if not args.quiet:
+        sys.stderr.write(json.dumps(summary) + "\n")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+from typing import List, Tuple, Dict
+import numpy as np
+
+
+class GroupColumns:
+    """
+    Columnar store of every carpool group for bulk statistics
+
+    Every rider is a row in contiguous integer arrays (user ID, pickup xy, dropoff xy
+    and the index of the group it belongs to), drivers are stored once per group.
+    Group averages are computed for all groups at once with grouped sums instead of
+    building tuples and dicts one driver at a time.
+
+    Attributes:
+        driver_ids (np.ndarray): Driver ID of each group, shape (groups,)
+        driver_pickup (np.ndarray): Pickup (x, y) of each driver, shape (groups, 2)
+        driver_dropoff (np.ndarray): Dropoff (x, y) of each driver, shape (groups, 2)
+        rider_ids (np.ndarray): ID of each rider, shape (riders,)
+        rider_group (np.ndarray): Index into driver_ids of each rider, shape (riders,)
+        rider_pickup (np.ndarray): Pickup (x, y) of each rider, shape (riders, 2)
+        rider_dropoff (np.ndarray): Dropoff (x, y) of each rider, shape (riders, 2)
+    """
+
+    def __init__(self, driver_ids: np.ndarray, driver_pickup: np.ndarray, driver_dropoff: np.ndarray,
+                 rider_ids: np.ndarray, rider_group: np.ndarray,
+                 rider_pickup: np.ndarray, rider_dropoff: np.ndarray):
+        self.driver_ids = np.asarray(driver_ids, dtype=np.int64)
+        self.driver_pickup = np.asarray(driver_pickup, dtype=np.int64).reshape(-1, 2)
+        self.driver_dropoff = np.asarray(driver_dropoff, dtype=np.int64).reshape(-1, 2)
+        self.rider_ids = np.asarray(rider_ids, dtype=np.int64)
+        self.rider_group = np.asarray(rider_group, dtype=np.int64)
+        self.rider_pickup = np.asarray(rider_pickup, dtype=np.int64).reshape(-1, 2)
+        self.rider_dropoff = np.asarray(rider_dropoff, dtype=np.int64).reshape(-1, 2)
+
+    def __len__(self) -> int:
+        return len(self.driver_ids)
+
+    @classmethod
+    def from_mappings(cls, driver_passengers: Dict[int, List[int]],
+                      pickup_coords: Dict[int, Tuple[int, int]],
+                      dropoff_coords: Dict[int, Tuple[int, int]]) -> "GroupColumns":
+        """
+        Builds the columns from the outputs of `fetch_driver_passengers` and
+        `fetch_rider_and_driver_coords`
+
+        Args:
+            driver_passengers (Dict[int, List[int]]): Driver mapped to the list of its riders
+            pickup_coords (Dict[int, Tuple[int, int]]): User mapped to its pickup (x, y)
+            dropoff_coords (Dict[int, Tuple[int, int]]): User mapped to its dropoff (x, y)
+
+        Returns:
+            GroupColumns: Columns with the groups in the order of driver_passengers
+        """
+        drivers = list(driver_passengers)
+        riders = [rider for driver in drivers for rider in driver_passengers[driver]]
+        sizes = [len(driver_passengers[driver]) for driver in drivers]
+
+        return cls(
+            driver_ids=np.array(drivers, dtype=np.int64),
+            driver_pickup=np.array([pickup_coords[driver] for driver in drivers], dtype=np.int64),
+            driver_dropoff=np.array([dropoff_coords[driver] for driver in drivers], dtype=np.int64),
+            rider_ids=np.array(riders, dtype=np.int64),
+            rider_group=np.repeat(np.arange(len(drivers), dtype=np.int64), sizes),
+            rider_pickup=np.array([pickup_coords[rider] for rider in riders], dtype=np.int64),
+            rider_dropoff=np.array([dropoff_coords[rider] for rider in riders], dtype=np.int64))
+
+    @classmethod
+    def from_arrays(cls, drivers: np.ndarray, riders: np.ndarray, accepted: np.ndarray,
+                    pickup_cells: np.ndarray, dropoff_cells: np.ndarray) -> "GroupColumns":
+        """
+        Builds the columns from request and sparse grid arrays without any per-user Python objects
+
+        Args:
+            drivers (np.ndarray): Driver ID of each request
+            riders (np.ndarray): Rider ID of each request
+            accepted (np.ndarray): Accepted flag of each request
+            pickup_cells (np.ndarray): (id, x, y) rows of every occupied pickup cell
+            dropoff_cells (np.ndarray): (id, x, y) rows of every occupied dropoff cell
+
+        Returns:
+            GroupColumns: Columns with the groups in order of each driver's first accepted request,
+                the same order `fetch_driver_passengers` produces
+
+        Raises:
+            KeyError: With the first user of a group that is not on a grid, like `calculate_average_coords`
+            ValueError: If a cell has a negative user ID
+        """
+        keep = np.asarray(accepted).astype(bool)
+        drivers = np.asarray(drivers, dtype=np.int64)[keep]
+        riders = np.asarray(riders, dtype=np.int64)[keep]
+
+        # Group index for every request, numbered by first appearance of the driver
+        unique_drivers, first_seen, inverse = np.unique(drivers, return_index=True, return_inverse=True)
+        order = np.argsort(first_seen, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        driver_ids = unique_drivers[order]
+        rider_group = rank[inverse.reshape(-1)]
+
+        pickup_lookup = _coord_lookup(pickup_cells)
+        dropoff_lookup = _coord_lookup(dropoff_cells)
+
+        return cls(driver_ids=driver_ids,
+                   driver_pickup=_lookup_coords(pickup_lookup, driver_ids),
+                   driver_dropoff=_lookup_coords(dropoff_lookup, driver_ids),
+                   rider_ids=riders,
+                   rider_group=rider_group,
+                   rider_pickup=_lookup_coords(pickup_lookup, riders),
+                   rider_dropoff=_lookup_coords(dropoff_lookup, riders))
+
+    def averages(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calculates the floor average pickup and dropoff of every group in one grouped reduction
+
+        Return:
+            np.ndarray: Average pickup (x, y) of each group, shape (groups, 2)
+            np.ndarray: Average dropoff (x, y) of each group, shape (groups, 2)
+        """
+        groups = len(self.driver_ids)
+
+        # + 1 to account for the driver
+        counts = np.bincount(self.rider_group, minlength=groups) + 1
+
+        pickup = self.driver_pickup + self._group_sums(self.rider_pickup, groups)
+        dropoff = self.driver_dropoff + self._group_sums(self.rider_dropoff, groups)
+        return pickup // counts[:, None], dropoff // counts[:, None]
+
+    def _group_sums(self, coords: np.ndarray, groups: int) -> np.ndarray:
+        # Segment sum of the x and y columns of the riders of each group,
+        # float64 sums stay exact for any realistic grid size
+        return np.stack([np.bincount(self.rider_group, weights=coords[:, axis], minlength=groups)
+                         for axis in (0, 1)], axis=1).astype(np.int64)
+
+    def distances(self) -> np.ndarray:
+        """
+        Calculates the Manhattan distance between the average pickup and dropoff of every group
+
+        Return:
+            np.ndarray: Distance of each group, shape (groups,)
+        """
+        pickup, dropoff = self.averages()
+        return _distances(pickup, dropoff)
+
+    def entries(self, order: np.ndarray = None,
+                averages: Tuple[np.ndarray, np.ndarray] = None) -> List[Dict]:
+        """
+        Emits the statistics entries, the same dictionaries `create_entry` produces
+
+        Args:
+            order (np.ndarray): Group indices to emit, defaults to every group in stored order
+            averages (Tuple[np.ndarray, np.ndarray]): Precomputed output of `averages`
+
+        Return:
+            List[Dict]: Statistics entry of each group
+        """
+        pickup, dropoff = averages if averages is not None else self.averages()
+        if order is None:
+            order = np.arange(len(self.driver_ids))
+
+        # Riders of each group in their original order
+        by_group = np.argsort(self.rider_group, kind="stable")
+        offsets = np.searchsorted(self.rider_group[by_group], np.arange(len(self.driver_ids) + 1))
+        riders = self.rider_ids[by_group].tolist()
+        offsets = offsets.tolist()
+
+        driver_ids = self.driver_ids.tolist()
+        pickup = pickup.tolist()
+        dropoff = dropoff.tolist()
+        return [{
+            "driverId": driver_ids[group],
+            "riderIds": riders[offsets[group]:offsets[group + 1]],
+            "averagePickup": {"x": pickup[group][0], "y": pickup[group][1]},
+            "averageDropoff": {"x": dropoff[group][0], "y": dropoff[group][1]}
+        } for group in np.asarray(order).tolist()]
+
+    def sorted_entries(self) -> List[Dict]:
+        """
+        Emits the statistics entries sorted in ascending order using Manhattan distance,
+        the same output as `process_and_post_statistics`
+
+        Return:
+            List[Dict]: Sorted statistics entry of each group
+        """
+        pickup, dropoff = self.averages()
+        order = np.argsort(_distances(pickup, dropoff), kind="stable")
+        return self.entries(order, (pickup, dropoff))
+
+
+def _distances(pickup: np.ndarray, dropoff: np.ndarray) -> np.ndarray:
+    return np.abs(pickup - dropoff).sum(axis=1)
+
+
+def _coord_lookup(cells: np.ndarray) -> np.ndarray:
+    """
+    Builds a dense table indexed by user ID holding the (x, y) of each occupied cell,
+    -1 for users without a cell
+
+    Raises:
+        ValueError: If an ID is negative, it would index the table from its end
+    """
+    cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+    if len(cells) and cells[:, 0].min() < 0:
+        raise ValueError(f"Negative user ID in grid: {int(cells[:, 0].min())}")
+    size = int(cells[:, 0].max()) + 1 if len(cells) else 0
+    lookup = np.full((size, 2), -1, dtype=np.int64)
+    lookup[cells[:, 0]] = cells[:, 1:]
+    return lookup
+
+
+def _lookup_coords(lookup: np.ndarray, users: np.ndarray) -> np.ndarray:
+    """
+    Finds the (x, y) of many users in a `_coord_lookup` table
+
+    Raises:
+        KeyError: With the first user that has no cell
+    """
+    users = np.asarray(users, dtype=np.int64)
+    known = (users >= 0) & (users < len(lookup))
+    xy = np.full((len(users), 2), -1, dtype=np.int64)
+    xy[known] = lookup[users[known]]
+    missing = np.flatnonzero(xy[:, 0] == -1)
+    if len(missing):
+        raise KeyError(int(users[missing[0]]))
+    return xy
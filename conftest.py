@@ -0,0 +1,15 @@
+import json
+import pytest
+
+
+@pytest.fixture
+def data():
+    with open("test_data.json", "r") as file:
+        data = json.load(file)
+    return data
+
+
+@pytest.fixture
+def solution_data_list():
+    with open("test_solution.json", "r") as data:
+        return json.load(data)
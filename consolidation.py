@@ -0,0 +1,205 @@
+from typing import List, Tuple, Dict, Iterator
+import math
+import numpy as np
+from main import decode_grid_coords, fetch_driver_passengers, calculate_average_coords
+
+# Most pairwise distances computed by one vectorized block
+BLOCK_SIZE = 1 << 20
+
+# Groups aimed for in one pruning bucket
+GROUPS_PER_BUCKET = 32
+
+# Buckets compared with each bucket, every neighbouring pair is visited once
+HALF_NEIGHBOURHOOD = ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def group_centroids(pickup_avg: Dict[int, Tuple[int, int]],
+                    dropoff_avg: Dict[int, Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stacks the average pickup and dropoff of every group into one array
+
+    Args:
+        pickup_avg (Dict[int, Tuple[int, int]]): Driver mapped to the average pickup (x, y) of its group
+        dropoff_avg (Dict[int, Tuple[int, int]]): Driver mapped to the average dropoff (x, y) of its group
+
+    Return:
+        np.ndarray: Driver of each group, shape (groups,)
+        np.ndarray: (pickup x, pickup y, dropoff x, dropoff y) of each group, shape (groups, 4)
+    """
+    drivers = np.fromiter(pickup_avg, dtype=np.int64, count=len(pickup_avg))
+    points = np.array([pickup_avg[driver] + dropoff_avg[driver] for driver in pickup_avg],
+                      dtype=np.int64).reshape(-1, 4)
+    return drivers, points
+
+
+def pairwise_distances(points_a: np.ndarray, points_b: np.ndarray) -> np.ndarray:
+    """
+    Group distances of every pair, the Manhattan distance between their pickups plus
+    the distance between their dropoffs
+
+    The distance is summed one coordinate at a time, so the only temporary is one
+    len(points_a) x len(points_b) matrix.
+
+    Args:
+        points_a (np.ndarray): Groups as rows of (pickup x, pickup y, dropoff x, dropoff y)
+        points_b (np.ndarray): Groups as rows of (pickup x, pickup y, dropoff x, dropoff y)
+
+    Return:
+        np.ndarray: Distances, shape (len(points_a), len(points_b))
+    """
+    return _column_distances(np.ascontiguousarray(points_a.T), np.ascontiguousarray(points_b.T))
+
+
+def _column_distances(columns_a: np.ndarray, columns_b: np.ndarray) -> np.ndarray:
+    # Groups are columns here, so every coordinate is a contiguous row
+    distances = np.abs(columns_a[0][:, None] - columns_b[0][None, :])
+    for axis in range(1, len(columns_a)):
+        distances += np.abs(columns_a[axis][:, None] - columns_b[axis][None, :])
+    return distances
+
+
+def _bucket_size(points: np.ndarray, threshold: int) -> int:
+    # Buckets are never smaller than the threshold, so close groups are in neighbouring buckets
+    width = int(np.ptp(points[:, 0])) + 1
+    height = int(np.ptp(points[:, 1])) + 1
+    dense = math.sqrt(width * height * GROUPS_PER_BUCKET / len(points))
+    return max(threshold, int(dense), 1)
+
+
+def _close_pairs(coords: np.ndarray, rows: np.ndarray, columns: np.ndarray, threshold: int,
+                 same: bool, block_size: int) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    # Compares the rows with the columns a block of rows at a time
+    step = max(block_size // max(len(columns), 1), 1)
+    for start in range(0, len(rows), step):
+        block = rows[start:start + step]
+        distances = _column_distances(coords[:, block], coords[:, columns])
+        close = distances <= threshold
+        if same:
+            # Pairs inside a bucket are counted once
+            close &= block[:, None] < columns[None, :]
+        a, b = np.nonzero(close)
+        if len(a):
+            yield block[a], columns[b], distances[a, b]
+
+
+def merge_candidates(pickup_avg: Dict[int, Tuple[int, int]], dropoff_avg: Dict[int, Tuple[int, int]],
+                     threshold: int, block_size: int = BLOCK_SIZE) -> List[Tuple[int, int, int]]:
+    """
+    Finds the pairs of groups close enough to share one vehicle
+
+    Groups are bucketed on a square grid of their average pickup, with buckets at least
+    `threshold` wide, so a close pair is always in the same or a neighbouring bucket. Only those
+    buckets are compared, each comparison is a vectorized block of pairwise distances of at
+    most `block_size` entries, so no groups x groups matrix is ever built.
+
+    Args:
+        pickup_avg (Dict[int, Tuple[int, int]]): Average pickups, as from `calculate_average_coords`
+        dropoff_avg (Dict[int, Tuple[int, int]]): Average dropoffs, as from `calculate_average_coords`
+        threshold (int): Largest pickup plus dropoff Manhattan distance of a candidate pair
+        block_size (int): Most pairwise distances computed at once
+
+    Return:
+        List[Tuple[int, int, int]]: (driver, other driver, distance) of every candidate pair,
+            sorted by distance then drivers, the first driver comes first in pickup_avg
+
+    Example:
+        pickup_avg = {1: (0, 0), 2: (1, 1), 3: (9, 9)}
+        dropoff_avg = {1: (5, 5), 2: (5, 6), 3: (0, 0)}
+        merge_candidates(pickup_avg, dropoff_avg, 3)
+
+        Output:
+        [(1, 2, 3)]
+    """
+    drivers, points = group_centroids(pickup_avg, dropoff_avg)
+    if len(drivers) < 2 or threshold < 0:
+        return []
+
+    # Grid coordinates fit 32 bits, which halves the memory traffic of the distance blocks
+    span = max(int(np.abs(points).max()), threshold)
+    dtype = np.int32 if 4 * span < np.iinfo(np.int32).max else np.int64
+    coords = np.ascontiguousarray(points.T, dtype=dtype)
+
+    size = _bucket_size(points, threshold)
+    cells = points[:, :2] // size
+
+    # Groups sorted by bucket, each bucket is a contiguous slice
+    order = np.lexsort((cells[:, 1], cells[:, 0]))
+    buckets, starts = np.unique(cells[order], axis=0, return_index=True)
+    ends = np.append(starts[1:], len(order))
+    slices = {(x, y): (start, end) for (x, y), start, end in
+              zip(buckets.tolist(), starts.tolist(), ends.tolist())}
+
+    found_a: List[np.ndarray] = []
+    found_b: List[np.ndarray] = []
+    found_distance: List[np.ndarray] = []
+    for (x, y), (start, end) in slices.items():
+        rows = order[start:end]
+        for dx, dy in HALF_NEIGHBOURHOOD:
+            neighbour = slices.get((x + dx, y + dy))
+            if neighbour is None:
+                continue
+            columns = order[neighbour[0]:neighbour[1]]
+            same = (dx, dy) == (0, 0)
+            for a, b, distance in _close_pairs(coords, rows, columns, threshold, same, block_size):
+                found_a.append(a)
+                found_b.append(b)
+                found_distance.append(distance)
+
+    if not found_a:
+        return []
+    a, b, distance = np.concatenate(found_a), np.concatenate(found_b), np.concatenate(found_distance)
+    first, second = np.minimum(a, b), np.maximum(a, b)
+    ranked = np.lexsort((second, first, distance))
+    return list(zip(drivers[first[ranked]].tolist(), drivers[second[ranked]].tolist(),
+                    distance[ranked].tolist()))
+
+
+def merge_clusters(candidates: List[Tuple[int, int, int]]) -> List[List[int]]:
+    """
+    Joins the candidate pairs into clusters of groups that are linked by close pairs (union-find)
+
+    Args:
+        candidates (List[Tuple[int, int, int]]): Output of `merge_candidates`
+
+    Return:
+        List[List[int]]: Drivers of every cluster, each cluster and the list sorted
+    """
+    parent: Dict[int, int] = {}
+
+    def root(driver: int) -> int:
+        parent.setdefault(driver, driver)
+        while parent[driver] != driver:
+            # Path halving keeps the trees flat
+            parent[driver] = parent[parent[driver]]
+            driver = parent[driver]
+        return driver
+
+    for driver, other, _ in candidates:
+        first, second = root(driver), root(other)
+        if first != second:
+            parent[max(first, second)] = min(first, second)
+
+    clusters: Dict[int, List[int]] = {}
+    for driver in parent:
+        clusters.setdefault(root(driver), []).append(driver)
+    return sorted(sorted(cluster) for cluster in clusters.values())
+
+
+def consolidate_payload(data: Dict, threshold: int) -> Tuple[List[Tuple[int, int, int]], List[List[int]]]:
+    """
+    Merge candidates and clusters of the groups of a payload
+
+    Args:
+        data (Dict): API payload shaped like `test_data.json`
+        threshold (int): Largest pickup plus dropoff Manhattan distance of a candidate pair
+
+    Return:
+        List[Tuple[int, int, int]]: Candidate pairs, see `merge_candidates`
+        List[List[int]]: Clusters of drivers, see `merge_clusters`
+    """
+    pickup_avg, dropoff_avg = calculate_average_coords(
+        fetch_driver_passengers(data["requests"]),
+        decode_grid_coords(data["pickupLocations"]),
+        decode_grid_coords(data["dropoffLocations"]))
+    candidates = merge_candidates(pickup_avg, dropoff_avg, threshold)
+    return candidates, merge_clusters(candidates)
@@ -0,0 +1,222 @@
+from typing import List, Tuple, Dict, Iterator, Mapping, Union
+import numpy as np
+from columnar import GroupColumns
+from main import decode_grid_cells, record_columns
+
+# Marks an ID without a location
+MISSING = -1
+
+
+def _id_dtype(largest: int) -> np.dtype:
+    # IDs and coordinates fit in half the memory unless they are huge
+    return np.dtype(np.int32) if largest < 2 ** 31 else np.dtype(np.int64)
+
+
+def _valid_id(user, size: int) -> bool:
+    return isinstance(user, (int, np.integer)) and 0 <= user < size
+
+
+class DenseCoords(Mapping):
+    """
+    Read-only mapping of user ID to (x, y) stored in one contiguous array indexed by ID
+
+    Behaves like the dictionary returned by `fetch_rider_and_driver_coords` (lookups, `in`,
+    iteration, `len`, comparison) while holding 8 bytes per ID instead of a dict entry and
+    a tuple per user. Iteration is in ID order.
+
+    Attributes:
+        xy (np.ndarray): (x, y) of every ID up to the largest one, shape (ids, 2),
+            [-1, -1] for IDs that are not on the grid
+    """
+
+    def __init__(self, xy: np.ndarray):
+        self.xy = xy
+        self._size = int(np.count_nonzero(xy[:, 0] != MISSING))
+
+    @classmethod
+    def from_cells(cls, cells: np.ndarray) -> "DenseCoords":
+        """
+        Builds the mapping from (id, x, y) rows, a later row of the same ID wins like in a dict
+
+        Args:
+            cells (np.ndarray): (id, x, y) rows, such as the output of `fetch_grid_cells`
+
+        Raises:
+            ValueError: If an ID is negative, it would index the table from its end
+        """
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+        if len(cells) and cells[:, 0].min() < 0:
+            raise ValueError(f"Negative user ID in grid: {int(cells[:, 0].min())}")
+        size = int(cells[:, 0].max()) + 1 if len(cells) else 0
+        xy = np.full((size, 2), MISSING, dtype=_id_dtype(int(cells[:, 1:].max(initial=0))))
+        xy[cells[:, 0]] = cells[:, 1:]
+        return cls(xy)
+
+    @classmethod
+    def from_grid(cls, grid: Union[List[List[int]], Dict]) -> "DenseCoords":
+        """
+        Builds the mapping from a pickupLocations/dropoffLocations grid in any encoding
+        read by `decode_grid_coords`
+        """
+        return cls.from_cells(decode_grid_cells(grid))
+
+    def __getitem__(self, user: int) -> Tuple[int, int]:
+        if user in self:
+            return tuple(self.xy[user].tolist())
+        raise KeyError(user)
+
+    def __contains__(self, user) -> bool:
+        return _valid_id(user, len(self.xy)) and self.xy[user, 0] != MISSING
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(np.flatnonzero(self.xy[:, 0] != MISSING).tolist())
+
+    def __len__(self) -> int:
+        return self._size
+
+    def lookup(self, users: np.ndarray) -> np.ndarray:
+        """
+        Finds the (x, y) of many users at once
+
+        Args:
+            users (np.ndarray): User IDs
+
+        Return:
+            np.ndarray: (x, y) of each user, shape (users, 2)
+
+        Raises:
+            KeyError: With the first user that is not on the grid
+        """
+        users = np.asarray(users, dtype=np.int64)
+        known = (users >= 0) & (users < len(self.xy))
+        xy = np.full((len(users), 2), MISSING, dtype=np.int64)
+        xy[known] = self.xy[users[known]]
+        missing = np.flatnonzero(xy[:, 0] == MISSING)
+        if len(missing):
+            raise KeyError(int(users[missing[0]]))
+        return xy
+
+
+class DriverRiders(Mapping):
+    """
+    Read-only mapping of driver ID to the list of its riders stored in CSR form
+
+    The riders of every group sit back to back in one array, `offsets[group]` to
+    `offsets[group + 1]`, and a table indexed by driver ID gives the group of a driver.
+    Behaves like the dictionary returned by `fetch_driver_passengers`, iterating the drivers
+    in order of their first accepted request and returning each group's riders as a new list.
+
+    Attributes:
+        drivers (np.ndarray): Driver ID of each group, shape (groups,)
+        offsets (np.ndarray): Start of the riders of each group, shape (groups + 1,)
+        riders (np.ndarray): Rider IDs of every group in request order, shape (riders,)
+    """
+
+    def __init__(self, drivers: np.ndarray, offsets: np.ndarray, riders: np.ndarray):
+        self.drivers = drivers
+        self.offsets = offsets
+        self.riders = riders
+        largest = int(drivers.max()) + 1 if len(drivers) else 0
+        self._group_of = np.full(largest, -1, dtype=_id_dtype(len(drivers)))
+        self._group_of[drivers] = np.arange(len(drivers))
+
+    @classmethod
+    def from_arrays(cls, drivers: np.ndarray, riders: np.ndarray, accepted: np.ndarray) -> "DriverRiders":
+        """
+        Groups the accepted requests without any per-request Python objects
+
+        Args:
+            drivers (np.ndarray): Driver ID of each request
+            riders (np.ndarray): Rider ID of each request
+            accepted (np.ndarray): Accepted flag of each request
+        """
+        keep = np.asarray(accepted).astype(bool)
+        drivers = np.asarray(drivers, dtype=np.int64)[keep]
+        riders = np.asarray(riders, dtype=np.int64)[keep]
+
+        # Groups are numbered by the first appearance of their driver
+        unique_drivers, first_seen, inverse = np.unique(drivers, return_index=True, return_inverse=True)
+        order = np.argsort(first_seen, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        group = rank[inverse.reshape(-1)]
+
+        # A stable sort by group keeps the riders of a group in request order
+        by_group = np.argsort(group, kind="stable")
+        offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(group, minlength=len(order)), out=offsets[1:])
+
+        dtype = _id_dtype(max(int(drivers.max(initial=0)), int(riders.max(initial=0))))
+        return cls(unique_drivers[order].astype(dtype), offsets, riders[by_group].astype(dtype))
+
+    @classmethod
+    def from_requests(cls, requests: List[Dict]) -> "DriverRiders":
+        """
+        Groups the accepted requests of a payload, the CSR form of `fetch_driver_passengers`
+        """
+        # JSON booleans decode to True/False, accepted is read as 1/0
+        riders, drivers, accepted = record_columns(requests, "rider", "driver", "accepted").T
+        return cls.from_arrays(drivers, riders, accepted == 1)
+
+    def _group(self, driver) -> int:
+        if _valid_id(driver, len(self._group_of)):
+            return int(self._group_of[driver])
+        return -1
+
+    def __getitem__(self, driver: int) -> List[int]:
+        group = self._group(driver)
+        if group == -1:
+            raise KeyError(driver)
+        return self.riders[self.offsets[group]:self.offsets[group + 1]].tolist()
+
+    def __contains__(self, driver) -> bool:
+        return self._group(driver) != -1
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.drivers.tolist())
+
+    def __len__(self) -> int:
+        return len(self.drivers)
+
+    def rider_groups(self) -> np.ndarray:
+        """
+        Group index of every rider in `riders`
+        """
+        return np.repeat(np.arange(len(self.drivers), dtype=np.int64), np.diff(self.offsets))
+
+
+def load_dense_payload(data: Dict) -> Tuple[DriverRiders, DenseCoords, DenseCoords]:
+    """
+    Decodes a payload into the dense equivalents of `fetch_driver_passengers` and
+    `fetch_rider_and_driver_coords`, usable wherever those dictionaries are
+
+    Args:
+        data (Dict): API payload, the grids may use any encoding read by `decode_grid_coords`
+
+    Return:
+        DriverRiders: Riders of every driver
+        DenseCoords: Pickup (x, y) of every user
+        DenseCoords: Dropoff (x, y) of every user
+    """
+    return (DriverRiders.from_requests(data["requests"]),
+            DenseCoords.from_grid(data["pickupLocations"]),
+            DenseCoords.from_grid(data["dropoffLocations"]))
+
+
+def dense_statistics(driver_riders: DriverRiders, pickup: DenseCoords, dropoff: DenseCoords) -> List[Dict]:
+    """
+    Generates the sorted statistics straight from the dense arrays, the same output as `build_statistics`
+
+    Raises:
+        KeyError: If a user of a group is not on the pickup or dropoff grid
+    """
+    riders = driver_riders.riders
+    drivers = driver_riders.drivers
+    columns = GroupColumns(driver_ids=drivers,
+                           driver_pickup=pickup.lookup(drivers),
+                           driver_dropoff=dropoff.lookup(drivers),
+                           rider_ids=riders,
+                           rider_group=driver_riders.rider_groups(),
+                           rider_pickup=pickup.lookup(riders),
+                           rider_dropoff=dropoff.lookup(riders))
+    return columns.sorted_entries()
@@ -0,0 +1,142 @@
+from typing import List, Tuple, Dict, Iterator
+from bisect import bisect_left, bisect_right, insort
+
+# Target size of each sorted block, blocks are split at twice this size
+LOAD = 512
+
+
+class DistanceIndex:
+    """
+    Ordered index of groups keyed on their pickup to dropoff Manhattan distance
+
+    Keys are stored in a list of sorted blocks, inserts and removals bisect to the right
+    block and only shift that block, so the index is maintained in O(log n) comparisons
+    as groups change instead of re-sorting every group. Ties keep the order in which the
+    groups were first inserted, the same order a stable `sorted()` over the groups gives.
+
+    Example:
+        index = DistanceIndex()
+        index.insert(5, 2)
+        index.insert(6, 5)
+        index.insert(1, 4)
+        index.update(6, 0)
+        index.top_k(2)
+
+        Output:
+        [(6, 0), (5, 2)]
+    """
+
+    def __init__(self, load: int = LOAD):
+        self._load = load
+        # Sorted blocks of (distance, sequence, driver) keys and the last key of each block
+        self._blocks: List[List[Tuple[int, int, int]]] = []
+        self._maxes: List[Tuple[int, int, int]] = []
+        # Driver mapped to its current key
+        self._keys: Dict[int, Tuple[int, int, int]] = {}
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, driver: int) -> bool:
+        return driver in self._keys
+
+    def __iter__(self) -> Iterator[int]:
+        """
+        Iterates the drivers in ascending order of distance
+        """
+        for block in self._blocks:
+            for _, _, driver in block:
+                yield driver
+
+    def distance(self, driver: int) -> int:
+        return self._keys[driver][0]
+
+    def insert(self, driver: int, distance: int):
+        """
+        Adds a group to the index
+
+        Raises:
+            KeyError: If the driver is already indexed
+        """
+        if driver in self._keys:
+            raise KeyError(f"Driver {driver} is already indexed")
+        key = (distance, self._sequence, driver)
+        self._sequence += 1
+        self._insert_key(key)
+
+    def update(self, driver: int, distance: int):
+        """
+        Moves an indexed group to its new distance, keeping its position among ties
+        """
+        key = self._keys[driver]
+        if key[0] == distance:
+            return
+        self._remove_key(key)
+        self._insert_key((distance, key[1], driver))
+
+    def remove(self, driver: int):
+        """
+        Removes a group from the index
+
+        Raises:
+            KeyError: If the driver is not indexed
+        """
+        self._remove_key(self._keys[driver])
+
+    def top_k(self, k: int) -> List[Tuple[int, int]]:
+        """
+        Returns the k groups with the smallest distance as (driver, distance) pairs
+        """
+        found: List[Tuple[int, int]] = []
+        for block in self._blocks:
+            for distance, _, driver in block:
+                if len(found) >= k:
+                    return found
+                found.append((driver, distance))
+        return found
+
+    def range(self, low: int, high: int) -> List[Tuple[int, int]]:
+        """
+        Returns the groups with low <= distance <= high as (driver, distance) pairs in ascending order
+        """
+        found: List[Tuple[int, int]] = []
+        start = bisect_left(self._maxes, (low,))
+        for block in self._blocks[start:]:
+            for distance, _, driver in block[bisect_left(block, (low,)):]:
+                if distance > high:
+                    return found
+                found.append((driver, distance))
+        return found
+
+    def _insert_key(self, key: Tuple[int, int, int]):
+        self._keys[key[2]] = key
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            return
+
+        # Insert into the first block whose last key is not smaller, or the last block
+        position = min(bisect_left(self._maxes, key), len(self._blocks) - 1)
+        block = self._blocks[position]
+        insort(block, key)
+        self._maxes[position] = block[-1]
+
+        # Split the block once it grows too large
+        if len(block) > 2 * self._load:
+            self._blocks.insert(position + 1, block[self._load:])
+            del block[self._load:]
+            self._maxes[position] = block[-1]
+            self._maxes.insert(position + 1, self._blocks[position + 1][-1])
+
+    def _remove_key(self, key: Tuple[int, int, int]):
+        position = bisect_left(self._maxes, key)
+        block = self._blocks[position]
+        del block[bisect_right(block, key) - 1]
+        del self._keys[key[2]]
+
+        if block:
+            self._maxes[position] = block[-1]
+        else:
+            del self._blocks[position]
+            del self._maxes[position]
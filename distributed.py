@@ -0,0 +1,598 @@
+from typing import List, Tuple, Dict, Union, Callable, Iterable, Iterator, Optional
+from collections import defaultdict, deque
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import numpy as np
+import requests
+from main import fetch_driver_passengers, fetch_grid_cells, post_response
+from encoding import encode_statistics
+from parallel import group_lookup, statistics_from_sums
+from streaming import CHUNK_SIZE, _JsonStream, _stream_requests, decode_chunks
+
+# Rows and columns of a square tile
+DEFAULT_TILE_SIZE = 512
+
+# Seconds a worker may take to answer before it is considered dead
+DEFAULT_TIMEOUT = 30.0
+
+# Every frame is a 4 byte big endian length followed by that many bytes of JSON
+FRAME_HEADER = struct.Struct(">I")
+
+# Largest frame accepted, a guard against reading garbage as a length
+MAX_FRAME = 1 << 30
+
+GRIDS = ("pickupLocations", "dropoffLocations")
+
+
+def send_frame(connection: socket.socket, message: Dict):
+    """
+    Sends one length prefixed JSON message
+    """
+    body = json.dumps(message, separators=(",", ":")).encode()
+    connection.sendall(FRAME_HEADER.pack(len(body)) + body)
+
+
+def _receive_exactly(connection: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = connection.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed in the middle of a frame")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def receive_frame(connection: socket.socket) -> Dict:
+    """
+    Receives one length prefixed JSON message
+
+    Raises:
+        ConnectionError: If the connection is closed or the frame is too large
+    """
+    (size,) = FRAME_HEADER.unpack(_receive_exactly(connection, FRAME_HEADER.size))
+    if size > MAX_FRAME:
+        raise ConnectionError(f"Frame of {size} bytes is too large")
+    return json.loads(_receive_exactly(connection, size))
+
+
+def _band_tiles(band: List[List[int]], row: int, tile_size: int) -> Iterator[Tuple[int, int, List[List[int]]]]:
+    # Tiles of one band of at most tile_size rows starting at grid row `row`
+    width = max((len(cells) for cells in band), default=0)
+    for column in range(0, width, tile_size):
+        yield row, column, [cells[column:column + tile_size] for cells in band]
+
+
+def split_tiles(grid: List[List[int]], tile_size: int = DEFAULT_TILE_SIZE) -> List[Tuple[int, int, List[List[int]]]]:
+    """
+    Splits a grid into square tiles of at most tile_size x tile_size cells
+
+    Return:
+        List[Tuple[int, int, List[List[int]]]]: (row offset, column offset, rows) of each tile
+    """
+    tile_size = max(tile_size, 1)
+    return [tile for row in range(0, len(grid), tile_size)
+            for tile in _band_tiles(grid[row:row + tile_size], row, tile_size)]
+
+
+def _stream_tiles(stream: _JsonStream, name: str, tile_size: int) -> Iterator[Tuple[int, int, List[List[int]]]]:
+    # Tiles of a streamed dense grid, only one band of tile_size rows is decoded at a time
+    if stream.peek() != "[":
+        raise ValueError(f"{name} must be a dense grid to be tiled")
+    band: List[List[int]] = []
+    row = 0
+    for _ in stream.iter_array():
+        band.append(stream.decode_value())
+        if len(band) == tile_size:
+            yield from _band_tiles(band, row, tile_size)
+            row += len(band)
+            band = []
+    yield from _band_tiles(band, row, tile_size)
+
+
+def _stream_grid_tiles(chunks: Iterable[str], tile_size: int) -> Iterator[Tuple[str, int, int, List[List[int]]]]:
+    # (grid name, row offset, column offset, rows) of every tile of a streamed payload, in document order
+    stream = _JsonStream(chunks)
+    for key in stream.iter_object():
+        if key in GRIDS:
+            for row, column, rows in _stream_tiles(stream, key, max(tile_size, 1)):
+                yield key, row, column, rows
+        else:
+            stream.skip_value()
+
+
+def _stream_driver_passengers(chunks: Iterable[str]) -> Optional[Dict[int, List[int]]]:
+    # Driver passengers of a streamed payload, the grids are skipped a row at a time
+    stream = _JsonStream(chunks)
+    driver_passengers: Dict = defaultdict(list)
+    found = False
+    for key in stream.iter_object():
+        found = True
+        if key == "requests":
+            _stream_requests(stream, driver_passengers)
+        else:
+            stream.skip_value()
+    stream.expect_end()
+    return driver_passengers if found else None
+
+
+def tile_partial_sums(rows: List[List[int]], users: List[int], user_groups: List[int],
+                      row_offset: int = 0, column_offset: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sums the coordinates of the grouped users found in a tile
+
+    Args:
+        rows (List[List[int]]): Cells of the tile
+        users (List[int]): Sorted IDs of the grouped users in the tile
+        user_groups (List[int]): Group index of each of `users`
+        row_offset (int): Grid row of the first row of the tile
+        column_offset (int): Grid column of the first column of the tile
+
+    Return:
+        Tuple[np.ndarray, np.ndarray]: Groups found in the tile, and their [x total, y total, users found]
+    """
+    users = np.asarray(users, dtype=np.int64)
+    user_groups = np.asarray(user_groups, dtype=np.int64)
+    ids, columns, cell_rows = fetch_grid_cells(rows).T
+
+    # Keep only the cells of the users listed for the tile
+    position = np.minimum(np.searchsorted(users, ids), max(len(users) - 1, 0))
+    grouped = users[position] == ids if len(users) else np.zeros(len(ids), dtype=bool)
+    found, group = np.unique(user_groups[position[grouped]], return_inverse=True)
+
+    sums = np.zeros((len(found), 3), dtype=np.int64)
+    sums[:, 0] = np.bincount(group, weights=columns[grouped] + column_offset, minlength=len(found))
+    sums[:, 1] = np.bincount(group, weights=cell_rows[grouped] + row_offset, minlength=len(found))
+    sums[:, 2] = np.bincount(group, minlength=len(found))
+    return found, sums
+
+
+def parse_address(address: str) -> Tuple[int, Union[str, Tuple[str, int]]]:
+    """
+    Socket family and address of a worker, "host:port", "tcp://host:port" or "unix:///path"
+    """
+    if address.startswith("unix://"):
+        return socket.AF_UNIX, address[len("unix://"):]
+    if address.startswith("tcp://"):
+        address = address[len("tcp://"):]
+    host, port = address.rsplit(":", 1)
+    return socket.AF_INET, (host, int(port))
+
+
+def connect(address: str, timeout: float = DEFAULT_TIMEOUT) -> socket.socket:
+    """
+    Opens a connection to a worker
+    """
+    family, target = parse_address(address)
+    if family == socket.AF_UNIX:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        connection.connect(target)
+        return connection
+    return socket.create_connection(target, timeout=timeout)
+
+
+class _WorkerHandler(socketserver.BaseRequestHandler):
+    """
+    Serves one coordinator connection
+
+    Messages:
+        - {"type": "tile", "tile": i, "rows": [[...]], "row_offset": r, "column_offset": c,
+          "users": [...], "groups": [...]}: users are the grouped users of the tile and groups their group
+          indices, answered with {"type": "partial", "tile": i, "groups": [...], "sums": [[x total, y total,
+          users], ...]} holding only the groups found in the tile, see `tile_partial_sums`
+        - {"type": "stop"}: closes the connection
+    Failures are answered with {"type": "error", "message": "..."}.
+    """
+
+    def handle(self):
+        while True:
+            try:
+                message = receive_frame(self.request)
+            except (ConnectionError, OSError, ValueError):
+                return
+
+            kind = message.get("type")
+            if kind == "stop":
+                return
+            if kind != "tile":
+                send_frame(self.request, {"type": "error", "message": f"Unknown message type: {kind}"})
+                continue
+
+            try:
+                found, sums = tile_partial_sums(message["rows"], message["users"], message["groups"],
+                                                message["row_offset"], message["column_offset"])
+            except (KeyError, ValueError, TypeError, IndexError) as error:
+                send_frame(self.request, {"type": "error", "message": f"{type(error).__name__}: {error}"})
+                continue
+
+            send_frame(self.request, {"type": "partial", "tile": message["tile"],
+                                      "groups": found.tolist(), "sums": sums.tolist()})
+
+
+class _TCPWorkerServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _UnixWorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_worker(address: str = "127.0.0.1:0") -> socketserver.BaseServer:
+    """
+    Creates a worker node, call `serve_forever` on it to start serving
+
+    Args:
+        address (str): "host:port" (port 0 picks a free one) or "unix:///path"
+
+    Return:
+        socketserver.BaseServer: The server, every coordinator connection is handled on its own thread
+    """
+    family, target = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(target):
+            os.remove(target)
+        return _UnixWorkerServer(target, _WorkerHandler)
+    return _TCPWorkerServer(target, _WorkerHandler)
+
+
+def worker_address(server: socketserver.BaseServer) -> str:
+    """
+    Address of a worker node to give to a `Coordinator`
+    """
+    if isinstance(server.server_address, str):
+        return f"unix://{server.server_address}"
+    host, port = server.server_address[:2]
+    return f"{host}:{port}"
+
+
+class Coordinator:
+    """
+    Computes the statistics of a payload by sending tiles of its grids to worker nodes
+
+    Both grids are split into square tiles, which are cut lazily from bands of tile_size rows.
+    Every worker connection runs on its own thread and takes the next tile when it is done with
+    the last one, so faster workers get more tiles. A tile is sent with the groups of the users
+    found in it, and the worker answers with the coordinate sums and user counts of those groups,
+    which are added up and floor averaged into the same output as `compute_statistics`. When a
+    worker fails (refused or closed connection, no answer within the timeout, an error answer) it
+    is dropped and its tile is handed to the other workers, only when every worker failed is the
+    run aborted.
+
+    `compute_statistics_file` and `compute_statistics_stream` read the payload twice, once for the
+    requests and once for the grids, so the coordinator holds the groups and one band of grid rows
+    rather than the whole payload. Workers only ever hold one tile.
+
+    Args:
+        workers (List[str]): Worker addresses, "host:port" or "unix:///path"
+        tile_size (int): Rows and columns of a tile
+        timeout (float): Seconds a worker may take to answer
+
+    Attributes:
+        reassigned (int): Tiles sent again after the worker they were sent to failed
+        failed_workers (List[str]): Workers that failed during the last run
+
+    Example:
+        coordinator = Coordinator(["127.0.0.1:9001", "127.0.0.1:9002"], tile_size=256)
+        stats_sorted = coordinator.compute_statistics_file("payload.json")
+    """
+
+    def __init__(self, workers: List[str], tile_size: int = DEFAULT_TILE_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT):
+        if not workers:
+            raise ValueError("At least one worker is needed")
+        self.workers = list(workers)
+        self.tile_size = tile_size
+        self.timeout = timeout
+        self.reassigned = 0
+        self.failed_workers: List[str] = []
+
+    def compute_statistics(self, data: Dict) -> List[Dict]:
+        """
+        Generate the sorted statistics of one payload on the workers
+
+        Args:
+            data (Dict): API payload with dense `pickupLocations` and `dropoffLocations` grids
+
+        Return:
+            List[Dict]: Groups of the statistics sorted in ascending order using manhattan distance
+
+        Raises:
+            ValueError: If a grid is not dense or a tile was rejected by every worker
+            ConnectionError: If every worker failed before all tiles were done
+            KeyError: If a user of a group is missing from the grids
+        """
+        for name in GRIDS:
+            if not isinstance(data[name], list):
+                raise ValueError(f"{name} must be a dense grid to be tiled")
+
+        driver_passengers = fetch_driver_passengers(data["requests"])
+        tiles = ((name,) + tile for name in GRIDS for tile in split_tiles(data[name], self.tile_size))
+        return self._statistics(driver_passengers, tiles)
+
+    def compute_statistics_stream(self, open_chunks: Callable[[], Iterable[str]]) -> Optional[List[Dict]]:
+        """
+        Generate the sorted statistics of a payload streamed from JSON text
+
+        Args:
+            open_chunks (Callable[[], Iterable[str]]): Returns the chunks of the JSON document from
+                its start, it is called twice
+
+        Return:
+            List[Dict]: Groups of the statistics sorted in ascending order using manhattan distance
+                - None, if the payload is an empty object
+
+        Raises:
+            ValueError: If a grid is not dense or a tile was rejected by every worker
+            ConnectionError: If every worker failed before all tiles were done
+            KeyError: If a user of a group is missing from the grids
+        """
+        # The requests usually follow the grids, so they are read in a pass of their own
+        driver_passengers = _stream_driver_passengers(open_chunks())
+        if driver_passengers is None:
+            return None
+
+        tiles = _stream_grid_tiles(open_chunks(), self.tile_size)
+        try:
+            return self._statistics(driver_passengers, tiles)
+        finally:
+            tiles.close()
+
+    def compute_statistics_file(self, path: str, chunk_size: int = CHUNK_SIZE) -> Optional[List[Dict]]:
+        """
+        Generate the sorted statistics of a payload stored in a JSON file, see `compute_statistics_stream`
+        """
+        def open_chunks():
+            with open(path, "r", encoding="utf-8") as file:
+                yield from iter(lambda: file.read(chunk_size), "")
+
+        return self.compute_statistics_stream(open_chunks)
+
+    def _statistics(self, driver_passengers: Dict[int, List[int]],
+                    tiles: Iterator[Tuple[str, int, int, List[List[int]]]]) -> List[Dict]:
+        sums = self.partial_sums(tiles, group_lookup(driver_passengers), len(driver_passengers))
+        return statistics_from_sums(driver_passengers, sums["pickupLocations"], sums["dropoffLocations"])
+
+    def partial_sums(self, tiles: Iterator[Tuple[str, int, int, List[List[int]]]],
+                     group_of: np.ndarray, groups: int) -> Dict[str, np.ndarray]:
+        """
+        Per group [x total, y total, users found] of both grids, computed by the workers
+
+        Args:
+            tiles (Iterator): (grid name, row offset, column offset, rows) of each tile, only
+                pulled when a worker is ready for it
+            group_of (np.ndarray): Group index of each user, from `group_lookup`
+            groups (int): Number of groups
+
+        Return:
+            Dict[str, np.ndarray]: Grid name mapped to its sums, shape (groups, 3)
+        """
+        run = _Run(tiles, group_of, groups)
+        self.reassigned = 0
+        self.failed_workers = []
+        threads = [threading.Thread(target=self._drive, args=(address, run), daemon=True)
+                   for address in self.workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if run.error is not None:
+            raise run.error
+        rejected = [index for index, workers in run.rejected.items() if len(workers) == len(set(self.workers))]
+        if not run.done.is_set() and rejected:
+            raise ValueError(f"Tile {rejected[0]} was rejected by every worker: {run.errors[rejected[0]]}")
+        if not run.done.is_set():
+            raise ConnectionError("Every worker failed before every tile was done")
+        return run.sums
+
+    def _drive(self, address: str, run: "_Run"):
+        # Feeds tiles to one worker until every tile is done or the worker fails
+        tile = None
+        try:
+            with connect(address, self.timeout) as connection:
+                while not run.done.is_set():
+                    tile = run.take()
+                    if tile is None:
+                        # Another worker still holds a tile that may come back
+                        run.done.wait(0.05)
+                        continue
+                    index, name, row, column, rows, users, user_groups = tile
+                    send_frame(connection, {"type": "tile", "tile": index, "rows": rows,
+                                            "row_offset": row, "column_offset": column,
+                                            "users": users, "groups": user_groups})
+                    reply = receive_frame(connection)
+                    if reply.get("type") != "partial" or reply.get("tile") != index:
+                        # A failing worker is dropped like a dead one, another worker retries the tile
+                        run.reject(index, address, reply.get("message", str(reply)))
+                        raise ConnectionError(f"Worker {address} rejected tile {index}")
+                    run.add(name, reply["groups"], reply["sums"])
+                    tile = None
+                send_frame(connection, {"type": "stop"})
+        except (OSError, ValueError):
+            # socket.timeout and ConnectionError are OSErrors, a garbled frame is a ValueError
+            with run.lock:
+                self.failed_workers.append(address)
+                if tile is not None:
+                    self.reassigned += 1
+            if tile is not None:
+                run.retry(tile)
+
+
+class _Run:
+    # State shared by the worker threads of one `Coordinator.partial_sums` call
+
+    def __init__(self, tiles: Iterator, group_of: np.ndarray, groups: int):
+        self.tiles = tiles
+        self.group_of = group_of
+        self.sums = {name: np.zeros((groups, 3), dtype=np.int64) for name in GRIDS}
+        # Tiles handed out and not answered yet, and tiles whose worker failed
+        self.outstanding = 0
+        self.retries: deque = deque()
+        self.exhausted = False
+        self.count = 0
+        self.error: Optional[Exception] = None
+        # Tile mapped to the workers that answered it with an error, and the last error
+        self.rejected: Dict[int, set] = {}
+        self.errors: Dict[int, str] = {}
+        self.lock = threading.Lock()
+        # Only one thread at a time reads the next band of the payload
+        self.source_lock = threading.Lock()
+        self.done = threading.Event()
+
+    def take(self) -> Optional[Tuple]:
+        """
+        Next tile for a worker, (index, name, row, column, rows, users, user groups),
+        None when no tile is available right now
+        """
+        with self.lock:
+            if self.retries:
+                self.outstanding += 1
+                return self.retries.popleft()
+            if self.exhausted:
+                return None
+            self.outstanding += 1
+
+        tile = None
+        with self.source_lock:
+            try:
+                name, row, column, rows = next(self.tiles)
+                tile = (self.count, name, row, column, rows) + self._tile_groups(rows)
+                self.count += 1
+            except StopIteration:
+                pass
+            except (KeyError, ValueError, TypeError) as error:
+                self.error = error
+
+        if tile is None:
+            with self.lock:
+                self.outstanding -= 1
+                self.exhausted = True
+                self._settle()
+        return tile
+
+    def _tile_groups(self, rows: List[List[int]]) -> Tuple[List[int], List[int]]:
+        # Grouped users of a tile and their groups, the only part of the group table the worker needs
+        ids = np.unique(fetch_grid_cells(rows)[:, 0])
+        ids = ids[(ids >= 0) & (ids < len(self.group_of))]
+        groups = self.group_of[ids]
+        grouped = groups >= 0
+        return ids[grouped].tolist(), groups[grouped].tolist()
+
+    def _settle(self):
+        if self.error is not None or (self.exhausted and not self.outstanding and not self.retries):
+            self.done.set()
+
+    def add(self, name: str, groups: List[int], sums: List[List[int]]):
+        with self.lock:
+            if groups:
+                self.sums[name][groups] += np.asarray(sums, dtype=np.int64)
+            self.outstanding -= 1
+            self._settle()
+
+    def retry(self, tile: Tuple):
+        with self.lock:
+            self.outstanding -= 1
+            self.retries.append(tile)
+
+    def reject(self, index: int, address: str, error: str):
+        with self.lock:
+            self.rejected.setdefault(index, set()).add(address)
+            self.errors[index] = error
+
+
+def _spool_response(url: str, session: requests.Session, file) -> Optional[str]:
+    # Downloads the body of a GET into a file, returns its text encoding or None if the GET failed
+    try:
+        with (session or requests).get(url, stream=True) as response:
+            if response.status_code != 200:
+                print("Unexpected Status Code:", response.status_code)
+                return None
+            for chunk in response.iter_content(CHUNK_SIZE):
+                file.write(chunk)
+            return response.encoding or "utf-8"
+    except requests.RequestException as error:
+        print(f"Error Fetching Data From {url}:", error)
+        return None
+
+
+def process_and_post_statistics_distributed(url: str, workers: List[str], session: requests.Session = None,
+                                            encoder: str = "auto", tile_size: int = DEFAULT_TILE_SIZE,
+                                            timeout: float = DEFAULT_TIMEOUT):
+    """
+    Process data from a API endpoint on worker nodes and post its statistics
+
+    Args:
+        url (str): API endpoint for retrieving and submitting data
+        workers (List[str]): Worker addresses, see `Coordinator`
+        session (requests.Session): Session to reuse pooled connections from
+        encoder (str): Output encoder name, see `encoding.get_encoder`
+        tile_size (int): Rows and columns of a tile
+        timeout (float): Seconds a worker may take to answer
+
+    Return:
+    List[Dict]: Sorted groups of the statistics using manhattan distance formula
+        - "Fail to GET data", if fetching failed or data is empty
+    """
+    # The body is spooled to disk so it can be streamed twice without a second GET
+    with tempfile.TemporaryFile() as file:
+        encoding = _spool_response(url, session, file)
+        if encoding is None:
+            return "Fail to GET data"
+
+        def open_chunks():
+            file.seek(0)
+            return decode_chunks(iter(lambda: file.read(CHUNK_SIZE), b""), encoding)
+
+        stats_sorted = Coordinator(workers, tile_size, timeout).compute_statistics_stream(open_chunks)
+
+    if stats_sorted is None:
+        return "Fail to GET data"
+    print(post_response(url, encode_statistics(stats_sorted, encoder), session))
+    return stats_sorted
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Compute carpool statistics on worker nodes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker = commands.add_parser("worker", help="serve tiles to coordinators")
+    worker.add_argument("address", help="host:port or unix:///path to listen on")
+
+    coordinate = commands.add_parser("coordinate", help="compute the statistics of a payload")
+    coordinate.add_argument("source", help="payload file, or API URL to GET from and POST back to")
+    coordinate.add_argument("--workers", nargs="+", required=True, help="worker addresses")
+    coordinate.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE, help="rows and columns of a tile")
+    coordinate.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds a worker may take")
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        server = create_worker(args.address)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    if args.source.startswith(("http://", "https://")):
+        process_and_post_statistics_distributed(args.source, args.workers, tile_size=args.tile_size,
+                                                timeout=args.timeout)
+        return
+    stats_sorted = Coordinator(args.workers, args.tile_size, args.timeout).compute_statistics_file(args.source)
+    if stats_sorted is None:
+        sys.exit(f"{args.source} holds an empty payload")
+    sys.stdout.write(json.dumps(stats_sorted) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+from typing import List, Dict, Callable, Iterable, Iterator
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional accelerated encoder
+    orjson = None
+
+# Number of entries encoded together when streaming
+BATCH_SIZE = 1024
+
+
+def _compact_json(value) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _pretty_json(value) -> bytes:
+    return json.dumps(value, indent=2).encode()
+
+
+ENCODERS: Dict[str, Callable] = {
+    "json": _compact_json,
+    "pretty": _pretty_json,
+}
+if orjson is not None:
+    ENCODERS["orjson"] = orjson.dumps
+
+
+def get_encoder(name: str = "auto") -> Callable:
+    """
+    Looks up an output encoder by name
+
+    Args:
+        name (str): One of
+            - "auto": orjson when it is installed, otherwise "json"
+            - "json": compact standard library JSON
+            - "orjson": accelerated compact JSON, needs the orjson package
+            - "pretty": indented JSON, the original output format
+
+    Return:
+        Callable: Function encoding a Python value into JSON bytes
+
+    Raises:
+        ValueError: If the encoder is unknown or not installed
+    """
+    if name == "auto":
+        name = "orjson" if "orjson" in ENCODERS else "json"
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown or unavailable encoder: {name}")
+    return ENCODERS[name]
+
+
+def encode_statistics(stats_sorted: List[Dict], encoder: str = "auto") -> bytes:
+    """
+    Serializes the sorted statistics into a single JSON body
+
+    Args:
+        stats_sorted (List[Dict]): Sorted statistics using manhattan distance
+        encoder (str): Name of the encoder, see `get_encoder`
+
+    Return:
+        bytes: JSON array of the statistics
+    """
+    return get_encoder(encoder)(stats_sorted)
+
+
+def iter_encoded_statistics(stats_sorted: Iterable[Dict], encoder: str = "auto",
+                            batch_size: int = BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Serializes the sorted statistics as a stream of JSON chunks
+
+    Entries are encoded a batch at a time as they are produced, so the whole body never
+    has to be built in memory. Passing the iterator as the body of `post_response`
+    sends it with chunked transfer encoding.
+
+    Args:
+        stats_sorted (Iterable[Dict]): Sorted statistics using manhattan distance, may be a generator
+        encoder (str): Name of a compact encoder, see `get_encoder`
+        batch_size (int): Number of entries encoded per chunk
+
+    Return:
+        Iterator[bytes]: Chunks that concatenate into a compact JSON array
+    """
+    encode = get_encoder(encoder)
+    return iter_json_array(map(encode, stats_sorted), batch_size)
+
+
+def iter_json_array(encoded_entries: Iterable[bytes], batch_size: int = BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Joins already encoded entries into chunks that concatenate into one JSON array
+
+    Args:
+        encoded_entries (Iterable[bytes]): Compact JSON of each entry, may be a generator
+        batch_size (int): Number of entries joined per chunk
+
+    Return:
+        Iterator[bytes]: Chunks of the JSON array
+    """
+    separator = b"["
+    batch: List[bytes] = []
+
+    for encoded in encoded_entries:
+        batch.append(encoded)
+        if len(batch) >= batch_size:
+            yield separator + b",".join(batch)
+            separator = b","
+            batch = []
+
+    if batch:
+        yield separator + b",".join(batch)
+        separator = b","
+
+    # An empty stream still has to be a valid array
+    yield b"[]" if separator == b"[" else b"]"
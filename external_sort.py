@@ -0,0 +1,237 @@
+from typing import List, Tuple, Dict, Iterable, Iterator, Mapping, BinaryIO
+import heapq
+import os
+import struct
+import sys
+import tempfile
+import requests
+from main import manhattan_distance, create_entry, calculate_average_coords, post_response
+from encoding import get_encoder, iter_json_array
+from streaming import fetch_payload_stream
+
+# Entries buffered in memory before a sorted run is spilled to disk
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+# Most runs read at once by a merge, more runs are merged in several passes
+MAX_FAN_IN = 64
+
+# Run records are (distance, sequence number, length of the encoded entry) then the entry
+RECORD_HEADER = struct.Struct("<qqI")
+
+# Bookkeeping of a buffered entry on top of its encoded bytes (tuple, ints, list slot)
+RECORD_OVERHEAD = 120
+
+
+def entry_distance(entry: Dict) -> int:
+    """
+    Sort key of `sort_statistics`, the distance between the average pickup and dropoff
+    """
+    return manhattan_distance((entry["averagePickup"]["x"], entry["averageDropoff"]["x"]),
+                              (entry["averagePickup"]["y"], entry["averageDropoff"]["y"]))
+
+
+def iter_statistics(driver_passengers: Mapping[int, List[int]],
+                    pickup_coords: Mapping[int, Tuple[int, int]],
+                    dropoff_coords: Mapping[int, Tuple[int, int]]) -> Iterator[Dict]:
+    """
+    Creates the unsorted statistics entry of every group one at a time
+
+    Args:
+        driver_passengers (Mapping[int, List[int]]): Driver mapped to the list of its riders,
+            a dict or a `dense.DriverRiders`
+        pickup_coords (Mapping[int, Tuple[int, int]]): User mapped to its pickup (x, y)
+        dropoff_coords (Mapping[int, Tuple[int, int]]): User mapped to its dropoff (x, y)
+
+    Return:
+        Iterator[Dict]: Entries in the order of driver_passengers, the input of `build_statistics`'s sort
+    """
+    for driver, riders in driver_passengers.items():
+        pickup_avg, dropoff_avg = calculate_average_coords({driver: riders}, pickup_coords, dropoff_coords)
+        yield create_entry(driver, riders, pickup_avg, dropoff_avg)
+
+
+def _write_record(file: BinaryIO, record: Tuple[int, int, bytes]):
+    distance, sequence, encoded = record
+    file.write(RECORD_HEADER.pack(distance, sequence, len(encoded)))
+    file.write(encoded)
+
+
+def _read_run(path: str) -> Iterator[Tuple[int, int, bytes]]:
+    with open(path, "rb") as file:
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if not header:
+                return
+            distance, sequence, length = RECORD_HEADER.unpack(header)
+            yield distance, sequence, file.read(length)
+
+
+class ExternalSorter:
+    """
+    Sorts statistics entries that may not fit in memory
+
+    Entries are encoded as they are added and buffered with their (distance, sequence number)
+    key. Once the buffer reaches the memory budget it is sorted and spilled to a temporary
+    file as a run, and the runs are k-way merged when the output is read. The sequence number
+    breaks ties in order of addition, so the output is in exactly the order `sort_statistics`
+    gives.
+
+    Args:
+        memory_budget (int): Approximate bytes of buffered entries before a run is spilled
+        encoder (str): Name of a compact encoder, see `encoding.get_encoder`
+        tmpdir (str): Directory of the run files, defaults to the system temporary directory
+        fan_in (int): Most runs merged at once
+
+    Example:
+        with ExternalSorter(memory_budget=16 * 1024 * 1024) as sorter:
+            sorter.extend(iter_statistics(driver_passengers, pickup_coords, dropoff_coords))
+            for encoded_entry in sorter:
+                ...
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET, encoder: str = "auto",
+                 tmpdir: str = None, fan_in: int = MAX_FAN_IN):
+        self.memory_budget = memory_budget
+        self.encode = get_encoder(encoder)
+        self.tmpdir = tmpdir
+        self.fan_in = max(fan_in, 2)
+        self.runs: List[str] = []
+        self._buffer: List[Tuple[int, int, bytes]] = []
+        self._buffered_bytes = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self) -> "ExternalSorter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def add(self, entry: Dict):
+        encoded = self.encode(entry)
+        self._buffer.append((entry_distance(entry), self._count, encoded))
+        self._count += 1
+        self._buffered_bytes += sys.getsizeof(encoded) + RECORD_OVERHEAD
+        if self._buffered_bytes >= self.memory_budget:
+            self._spill()
+
+    def extend(self, entries: Iterable[Dict]):
+        for entry in entries:
+            self.add(entry)
+
+    def _new_run(self) -> Tuple[BinaryIO, str]:
+        descriptor, path = tempfile.mkstemp(prefix="statistics-run-", suffix=".bin", dir=self.tmpdir)
+        self.runs.append(path)
+        return os.fdopen(descriptor, "wb"), path
+
+    def _spill(self):
+        if not self._buffer:
+            return
+        self._buffer.sort()
+        file, _ = self._new_run()
+        with file:
+            for record in self._buffer:
+                _write_record(file, record)
+        self._buffer = []
+        self._buffered_bytes = 0
+
+    def _merge_runs(self):
+        # Merge the oldest runs until one pass can read every run
+        while len(self.runs) > self.fan_in:
+            merged, self.runs = self.runs[:self.fan_in], self.runs[self.fan_in:]
+            file, _ = self._new_run()
+            with file:
+                for record in heapq.merge(*(_read_run(path) for path in merged)):
+                    _write_record(file, record)
+            for path in merged:
+                os.remove(path)
+
+    def __iter__(self) -> Iterator[bytes]:
+        """
+        Yields every encoded entry in sorted order, the sorter is emptied once read
+        """
+        if not self.runs:
+            # Everything fit in the budget, no disk is used
+            self._buffer.sort()
+            records: Iterable[Tuple[int, int, bytes]] = self._buffer
+        else:
+            self._spill()
+            self._merge_runs()
+            records = heapq.merge(*(_read_run(path) for path in self.runs))
+
+        try:
+            for _, _, encoded in records:
+                yield encoded
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Removes every run file and drops the buffered entries
+        """
+        for path in self.runs:
+            if os.path.exists(path):
+                os.remove(path)
+        self.runs = []
+        self._buffer = []
+        self._buffered_bytes = 0
+
+
+def write_jsonl(encoded_entries: Iterable[bytes], path: str) -> int:
+    """
+    Writes already encoded entries to a JSON lines file, one entry per line
+
+    Return:
+        int: Number of entries written
+    """
+    written = 0
+    with open(path, "wb") as file:
+        for encoded in encoded_entries:
+            file.write(encoded + b"\n")
+            written += 1
+    return written
+
+
+def process_and_post_statistics_external(url: str, session: requests.Session = None,
+                                         memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                                         encoder: str = "auto", output: str = None,
+                                         compression: str = None, tmpdir: str = None):
+    """
+    Process data from a API endpoint and post its statistics, sorting them out of core
+
+    The payload is parsed by `streaming.fetch_payload_stream` while it downloads, so only the
+    accepted requests and occupied cells are kept, never the JSON text or the full grids. The
+    entries are sorted by an `ExternalSorter` and the sorted output is streamed straight into
+    the POST body (or a JSON lines file), so no list of every entry is ever built.
+
+    Args:
+        url (str): API endpoint for retrieving and submitting data
+        session (requests.Session): Session to reuse pooled connections from
+        memory_budget (int): Approximate bytes of entries kept in memory while sorting
+        encoder (str): Name of a compact encoder, see `encoding.get_encoder`
+        output (str): Write the sorted entries to this JSON lines file instead of posting them
+        compression (str): Compress the POST body with this codec ("gzip" or "zstd")
+        tmpdir (str): Directory of the sorted runs, defaults to the system temporary directory
+
+    Return:
+        int: Number of statistics entries sent or written
+            - "Fail to GET data", if fetching failed or data is empty
+    """
+    payload = fetch_payload_stream(url, session=session, compressed=compression is not None)
+    if payload is None:
+        return "Fail to GET data"
+
+    with ExternalSorter(memory_budget, encoder, tmpdir) as sorter:
+        sorter.extend(iter_statistics(*payload))
+        # The payload is no longer needed once every entry is buffered or spilled
+        del payload
+
+        if output:
+            return write_jsonl(sorter, output)
+
+        count = len(sorter)
+        print(post_response(url, iter_json_array(sorter), session, compression))
+        return count
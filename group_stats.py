@@ -0,0 +1,247 @@
+from typing import List, Tuple, Dict
+from main import (manhattan_distance, decode_grid_coords, fetch_driver_passengers,
+                  calculate_coord_total, create_entry)
+from distance_index import DistanceIndex
+
+
+class GroupStats:
+    """
+    Long-lived statistics of every carpool group that are updated in place
+
+    Keeps the running pickup/dropoff coordinate sums of every group (driver plus riders),
+    so accepting or revoking a request, or moving a user, only touches the group involved
+    instead of re-scanning the grids and regrouping everything. Groups are also kept in a
+    `DistanceIndex`, so the sorted statistics never need a full re-sort.
+
+    Example:
+        stats = GroupStats({5: [3, 4]},
+                           {3: (12, 13), 4: (2, 9), 5: (13, 7), 8: (1, 1)},
+                           {3: (13, 1), 4: (3, 11), 5: (11, 10), 8: (2, 2)})
+        stats.accept(5, 8)
+        stats.revoke(5, 3)
+        stats.average(5)
+
+        Output:
+        ((5, 5), (5, 7))
+    """
+
+    def __init__(self, driver_passengers: Dict[int, List[int]],
+                 pickup_coords: Dict[int, Tuple[int, int]],
+                 dropoff_coords: Dict[int, Tuple[int, int]]):
+        """
+        Args:
+            driver_passengers (Dict[int, List[int]]): Dictonary, where the driver is the key and
+                                                    value is the list of riderIds associated with it
+            pickup_coords (Dict[int, Tuple[int, int]]): Dictonary, where the user is the key and
+                                                    value is a tuple (x, y) representing the pickup coords
+            dropoff_coords (Dict[int, Tuple[int, int]]): Dictonary, where the user is the key and
+                                                    value is a tuple (x, y) representing the dropoff coords
+        """
+        self.pickup_coords: Dict[int, Tuple[int, int]] = dict(pickup_coords)
+        self.dropoff_coords: Dict[int, Tuple[int, int]] = dict(dropoff_coords)
+
+        # Driver mapped to its riders (dict keeps order with O(1) removal)
+        self._riders: Dict[int, Dict[int, None]] = {}
+        # Rider mapped to its driver
+        self._driver_of: Dict[int, int] = {}
+        # Driver mapped to [pickup x, pickup y, dropoff x, dropoff y] totals of the group
+        self._sums: Dict[int, List[int]] = {}
+        # Groups ordered by Manhattan distance between average pickup and dropoff
+        self._index = DistanceIndex()
+
+        for driver, riders in driver_passengers.items():
+            if not riders:
+                continue
+            pickup_x, pickup_y, _ = calculate_coord_total(
+                [self.pickup_coords[user] for user in [driver] + riders])
+            dropoff_x, dropoff_y, _ = calculate_coord_total(
+                [self.dropoff_coords[user] for user in [driver] + riders])
+            self._sums[driver] = [pickup_x, pickup_y, dropoff_x, dropoff_y]
+            self._riders[driver] = dict.fromkeys(riders)
+            for rider in riders:
+                self._driver_of[rider] = driver
+            self._index.insert(driver, self.distance(driver))
+
+    @classmethod
+    def from_payload(cls, data: Dict) -> "GroupStats":
+        """
+        Builds the statistics from an API payload shaped like `test_data.json`,
+        the grids may use any encoding read by `decode_grid_coords`
+        """
+        return cls(fetch_driver_passengers(data["requests"]),
+                   decode_grid_coords(data["pickupLocations"]),
+                   decode_grid_coords(data["dropoffLocations"]))
+
+    def __len__(self) -> int:
+        return len(self._riders)
+
+    def __contains__(self, driver: int) -> bool:
+        return driver in self._riders
+
+    def drivers(self) -> List[int]:
+        return list(self._riders)
+
+    def riders(self, driver: int) -> List[int]:
+        return list(self._riders[driver])
+
+    def driver_of(self, rider: int):
+        """
+        Returns the driver the rider is grouped with, None if the rider has no accepted request
+        """
+        return self._driver_of.get(rider)
+
+    def _add(self, driver: int, user: int, sign: int):
+        # Add (or remove with sign -1) the user's coordinates to the group totals
+        sums = self._sums[driver]
+        pickup = self.pickup_coords[user]
+        dropoff = self.dropoff_coords[user]
+        sums[0] += sign * pickup[0]
+        sums[1] += sign * pickup[1]
+        sums[2] += sign * dropoff[0]
+        sums[3] += sign * dropoff[1]
+
+    def accept(self, driver: int, rider: int):
+        """
+        Adds the rider to the driver's group
+
+        Raises:
+            ValueError: If the rider is already grouped with another driver, or a
+                driver is used as a rider (and vice versa)
+            KeyError: If the driver or rider has no pickup/dropoff location
+        """
+        current = self._driver_of.get(rider)
+        if current == driver:
+            return
+        if current is not None:
+            raise ValueError(f"Rider {rider} is already accepted by driver {current}")
+        if rider in self._riders or driver in self._driver_of:
+            raise ValueError(f"User {rider if rider in self._riders else driver} cannot be both a driver and a rider")
+
+        # Check the locations before touching the totals
+        for user in (driver, rider):
+            if user not in self.pickup_coords or user not in self.dropoff_coords:
+                raise KeyError(f"User {user} has no pickup/dropoff location")
+
+        new_group = driver not in self._riders
+        if new_group:
+            self._riders[driver] = {}
+            self._sums[driver] = [0, 0, 0, 0]
+            self._add(driver, driver, 1)
+        self._riders[driver][rider] = None
+        self._driver_of[rider] = driver
+        self._add(driver, rider, 1)
+
+        if new_group:
+            self._index.insert(driver, self.distance(driver))
+        else:
+            self._index.update(driver, self.distance(driver))
+
+    def revoke(self, driver: int, rider: int):
+        """
+        Removes the rider from the driver's group, the group is dropped once it has no riders
+
+        Raises:
+            KeyError: If the rider is not in the driver's group
+        """
+        if self._driver_of.get(rider) != driver:
+            raise KeyError(f"Rider {rider} is not accepted by driver {driver}")
+
+        del self._riders[driver][rider]
+        del self._driver_of[rider]
+        if self._riders[driver]:
+            self._add(driver, rider, -1)
+            self._index.update(driver, self.distance(driver))
+        else:
+            del self._riders[driver]
+            del self._sums[driver]
+            self._index.remove(driver)
+
+    def _group_of(self, user: int):
+        if user in self._riders:
+            return user
+        return self._driver_of.get(user)
+
+    def move_pickup(self, user: int, coords: Tuple[int, int]):
+        """
+        Moves the user to a new (x, y) on the pickup grid
+        """
+        self._move(user, coords, self.pickup_coords, 0)
+
+    def move_dropoff(self, user: int, coords: Tuple[int, int]):
+        """
+        Moves the user to a new (x, y) on the dropoff grid
+        """
+        self._move(user, coords, self.dropoff_coords, 2)
+
+    def _move(self, user: int, coords: Tuple[int, int], locations: Dict[int, Tuple[int, int]], axis: int):
+        driver = self._group_of(user)
+        if driver is not None:
+            old = locations[user]
+            sums = self._sums[driver]
+            sums[axis] += coords[0] - old[0]
+            sums[axis + 1] += coords[1] - old[1]
+            self._index.update(driver, self.distance(driver))
+        locations[user] = tuple(coords)
+
+    def average(self, driver: int) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        """
+        Calculates the average pickup and dropoff of a single group
+
+        Return:
+            Tuple[int, int]: Average pickup (x, y) of the driver and riders
+            Tuple[int, int]: Average dropoff (x, y) of the driver and riders
+        """
+        pickup_x, pickup_y, dropoff_x, dropoff_y = self._sums[driver]
+
+        # + 1 to account for the driver
+        n = len(self._riders[driver]) + 1
+        return (pickup_x // n, pickup_y // n), (dropoff_x // n, dropoff_y // n)
+
+    def distance(self, driver: int) -> int:
+        """
+        Calculates the Manhattan distance between the average pickup and dropoff of a group
+        """
+        pickup, dropoff = self.average(driver)
+        return manhattan_distance((pickup[0], dropoff[0]), (pickup[1], dropoff[1]))
+
+    def averages(self) -> Tuple[Dict[int, Tuple[int, int]], Dict[int, Tuple[int, int]]]:
+        """
+        Calculates the average of every group, in the same form as `calculate_average_coords`
+        """
+        avg_pickup_location: Dict[int, Tuple[int, int]] = {}
+        avg_dropoff_location: Dict[int, Tuple[int, int]] = {}
+        for driver in self._riders:
+            avg_pickup_location[driver], avg_dropoff_location[driver] = self.average(driver)
+        return avg_pickup_location, avg_dropoff_location
+
+    def entry(self, driver: int) -> Dict:
+        """
+        Creates the statistics entry of a single group, the same as `create_entry`
+        """
+        pickup, dropoff = self.average(driver)
+        return create_entry(driver, self.riders(driver), {driver: pickup}, {driver: dropoff})
+
+    def entries(self) -> List[Dict]:
+        """
+        Creates the statistics entries of every group in group order
+        """
+        return [self.entry(driver) for driver in self._riders]
+
+    def sorted_entries(self) -> List[Dict]:
+        """
+        Creates the statistics entries sorted in ascending order using Manhattan distance,
+        the same output as `build_statistics`
+        """
+        return [self.entry(driver) for driver in self._index]
+
+    def top_k(self, k: int) -> List[Dict]:
+        """
+        Creates the statistics entries of the k groups with the shortest distance
+        """
+        return [self.entry(driver) for driver, _ in self._index.top_k(k)]
+
+    def within(self, low: int, high: int) -> List[Dict]:
+        """
+        Creates the statistics entries of the groups with low <= distance <= high, in ascending order
+        """
+        return [self.entry(driver) for driver, _ in self._index.range(low, high)]
@@ -0,0 +1,115 @@
+from typing import List, Iterable, Iterator, Union
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # Optional zstd support
+    zstandard = None
+
+try:
+    # urllib3 only decodes zstd responses when it has a zstd module of its own
+    from urllib3.response import HAS_ZSTD as RESPONSE_ZSTD
+except ImportError:
+    RESPONSE_ZSTD = False
+
+# Errors raised by `decompress_chunks` on a corrupt body
+DECODE_ERRORS = (zlib.error,) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+# Size of the compressed pieces handed to the socket
+CHUNK_SIZE = 1 << 16
+
+
+def available_codecs() -> List[str]:
+    """
+    Returns the codecs usable for both directions, in order of preference
+    """
+    return (["zstd"] if zstandard is not None else []) + ["gzip"]
+
+
+def response_codecs() -> List[str]:
+    """
+    Returns the codecs `requests` decodes in a response body, in order of preference
+    """
+    return (["zstd"] if RESPONSE_ZSTD else []) + ["gzip"]
+
+
+def accept_encoding() -> str:
+    """
+    Value of the `Accept-Encoding` header advertising every codec a response may be sent with
+    """
+    return ", ".join(response_codecs())
+
+
+def _check_codec(codec: str):
+    if codec not in available_codecs():
+        raise ValueError(f"Unknown or unavailable compression: {codec}")
+
+
+def _as_chunks(body: Union[str, bytes, Iterable[bytes]]) -> Iterable[bytes]:
+    # A whole body is split so that compression still streams
+    if isinstance(body, str):
+        body = body.encode()
+    if isinstance(body, bytes):
+        return (body[start:start + CHUNK_SIZE] for start in range(0, len(body), CHUNK_SIZE))
+    return body
+
+
+def compress_chunks(body: Union[str, bytes, Iterable[bytes]], codec: str = "gzip",
+                    level: int = 6) -> Iterator[bytes]:
+    """
+    Compresses a body piece by piece, the output can be sent as a chunked POST body
+
+    Args:
+        body (Union[str, bytes, Iterable[bytes]]): Whole body or an iterator of its chunks
+        codec (str): "gzip" or "zstd" (needs the zstandard package)
+        level (int): Compression level of the codec
+
+    Return:
+        Iterator[bytes]: Compressed chunks
+
+    Raises:
+        ValueError: If the codec is unknown or not installed
+    """
+    _check_codec(codec)
+    if codec == "zstd":
+        compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    else:
+        # wbits 31 writes the gzip header and trailer
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    for chunk in _as_chunks(body):
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def decompress_chunks(chunks: Iterable[bytes], codec: str = "gzip") -> Iterator[bytes]:
+    """
+    Decompresses a body piece by piece as it is received
+
+    Args:
+        chunks (Iterable[bytes]): Compressed chunks
+        codec (str): "gzip" or "zstd" (needs the zstandard package)
+
+    Return:
+        Iterator[bytes]: Decompressed chunks
+
+    Raises:
+        ValueError: If the codec is unknown or not installed
+        DECODE_ERRORS: If the body is corrupt
+    """
+    _check_codec(codec)
+    if codec == "zstd":
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        decompressor = zlib.decompressobj(31)
+
+    for chunk in chunks:
+        decompressed = decompressor.decompress(chunk)
+        if decompressed:
+            yield decompressed
+    if codec == "gzip":
+        tail = decompressor.flush()
+        if tail:
+            yield tail
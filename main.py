@@ -1,7 +1,12 @@
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Iterable, Union
 from collections import defaultdict
+from itertools import chain
+from operator import itemgetter
+import numpy as np
 import requests
-import json
+from encoding import encode_statistics, iter_encoded_statistics
+from metrics import MetricsCollector, NULL_METRICS
+from http_compression import accept_encoding, compress_chunks
 
 
 def manhattan_distance(horizontal_dist: Tuple[int, int],
@@ -28,6 +33,7 @@ def fetch_rider_and_driver_coords(grid: List[List[int]]) -> Dict[int, Tuple[int,
 
     Args:
         grid (List[List[int]]): A 2D grid representing the location of each driver or rider
+            - The grid does not need to be square, every row must have the same length
             - Grid cells contain integers, where:
                 - `-1` indicates no rider
                 - Other integers represent rider or driver IDs
@@ -50,14 +56,226 @@ def fetch_rider_and_driver_coords(grid: List[List[int]]) -> Dict[int, Tuple[int,
         {1: (0, 0), 2: (3, 2), 3: (1, 3)}
     """
 
-    # Find the coordinates of driver/rider
-    n = len(grid)
-    coords: Dict = {}
-    for row in range(n):
-        for column in range(n):
-            if grid[row][column] != -1:
-                coords[grid[row][column]] = column, row
-    return coords
+    ids, columns, rows = fetch_grid_cells(grid).T
+
+    # Row-major order matches a cell by cell scan of the grid
+    return dict(zip(ids.tolist(), zip(columns.tolist(), rows.tolist())))
+
+
+def fetch_grid_cells(grid: List[List[int]]) -> np.ndarray:
+    """
+    Obtains the occupied cells of a 2D grid as sparse (id, x, y) rows
+
+    Args:
+        grid (List[List[int]]): A 2D grid representing the location of each driver or rider,
+            `-1` indicates no rider
+
+    Returns:
+        np.ndarray: An (n, 3) integer array with a (id, column, row) row per occupied cell,
+            in row-major order
+
+    Example:
+        grid = [
+              [ 1,-1],
+              [-1, 2]
+            ]
+        fetch_grid_cells(grid)
+
+        Output:
+        array([[1, 0, 0],
+               [2, 1, 1]])
+    """
+    # Empty grids have no users to locate
+    if not grid:
+        return np.empty((0, 3), dtype=np.int64)
+
+    # Locate every occupied cell in bulk, rows and columns are sized independently
+    cells = np.asarray(grid, dtype=np.int64)
+    rows, columns = np.nonzero(cells != -1)
+    return np.stack([cells[rows, columns], columns, rows], axis=1)
+
+
+def fetch_sparse_coords(entries: Iterable[Tuple[int, int, int]]) -> Dict[int, Tuple[int, int]]:
+    """
+    Obtains each riders/driver (x,y) position from a sparse list of occupied cells
+
+    Args:
+        entries (Iterable[Tuple[int, int, int]]): (id, x, y) triples for every occupied cell,
+            the sparse equivalent of a pickupLocations/dropoffLocations grid
+
+    Returns:
+        Dict: A dictonary where the rider ID (int) represents the key and
+            values are the coordinates of the rider (column, row)
+
+    Example:
+        entries = [(1, 0, 0), (2, 3, 2), (3, 1, 3)]
+        fetch_sparse_coords(entries)
+
+        Output:
+        {1: (0, 0), 2: (3, 2), 3: (1, 3)}
+    """
+    return {user_id: (x, y) for user_id, x, y in entries}
+
+
+def fetch_rle_cells(rows: List[List[List[int]]]) -> np.ndarray:
+    """
+    Obtains the occupied cells of a row-wise run-length encoded grid as sparse (id, x, y) rows
+
+    Args:
+        rows (List[List[List[int]]]): One list of [value, count] runs per grid row,
+            `-1` runs are empty cells and other values are rider or driver IDs
+
+    Returns:
+        np.ndarray: An (n, 3) integer array with a (id, column, row) row per occupied cell,
+            in row-major order
+
+    Raises:
+        ValueError: If a rider or driver run is longer than one cell, a user has one location
+    """
+    cells: List[Tuple[int, int, int]] = []
+    for row, runs in enumerate(rows):
+        column = 0
+        for value, count in runs:
+            if value != -1:
+                if count != 1:
+                    raise ValueError(f"User {value} spans {count} cells in row {row}")
+                cells.append((value, column, row))
+            column += count
+    return np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+
+
+def fetch_rle_coords(rows: List[List[List[int]]]) -> Dict[int, Tuple[int, int]]:
+    """
+    Obtains each riders/driver (x,y) position from a row-wise run-length encoded grid
+
+    Args:
+        rows (List[List[List[int]]]): One list of [value, count] runs per grid row,
+            `-1` runs are empty cells and other values are rider or driver IDs
+
+    Returns:
+        Dict: A dictonary where the rider ID (int) represents the key and
+            values are the coordinates of the rider (column, row)
+
+    Example:
+        rows = [
+              [[1, 1], [-1, 4]],
+              [[-1, 5]],
+              [[-1, 3], [2, 1], [-1, 1]]
+            ]
+        fetch_rle_coords(rows)
+
+        Output:
+        {1: (0, 0), 2: (3, 2)}
+
+    Raises:
+        ValueError: If a rider or driver run is longer than one cell
+    """
+    return fetch_sparse_coords(fetch_rle_cells(rows).tolist())
+
+
+def decode_grid_cells(grid: Union[List[List[int]], Dict]) -> np.ndarray:
+    """
+    Obtains the occupied cells of a grid in any supported encoding as sparse (id, x, y) rows
+
+    The encoding is detected from the payload:
+        - A list of rows is a dense grid, see `fetch_grid_cells`
+        - {"format": "coo", "entries": [[id, x, y], ...]} lists only the occupied cells
+        - {"format": "rle", "rows": [[[value, count], ...], ...]} run-length encodes
+          each row, see `fetch_rle_cells`
+
+    Args:
+        grid (Union[List[List[int]], Dict]): A pickupLocations/dropoffLocations grid
+
+    Returns:
+        np.ndarray: An (n, 3) integer array with a (id, column, row) row per occupied cell,
+            duplicated IDs are kept
+
+    Raises:
+        ValueError: If the grid uses an unknown format or an rle user run is longer than one cell
+    """
+    if not isinstance(grid, dict):
+        return fetch_grid_cells(grid)
+    if not grid:
+        return np.empty((0, 3), dtype=np.int64)
+
+    grid_format = grid.get("format")
+    if grid_format == "coo":
+        return np.asarray(grid["entries"], dtype=np.int64).reshape(-1, 3)
+    if grid_format == "rle":
+        return fetch_rle_cells(grid["rows"])
+    raise ValueError(f"Unknown grid format: {grid_format}")
+
+
+def decode_grid_coords(grid: Union[List[List[int]], Dict]) -> Dict[int, Tuple[int, int]]:
+    """
+    Obtains each riders/driver (x,y) position from a grid in any supported encoding
+
+    Dense grids are read by `fetch_rider_and_driver_coords`, encoded ones are decoded by
+    `decode_grid_cells` in time proportional to their encoded size, no dense grid is ever
+    built for them.
+
+    Args:
+        grid (Union[List[List[int]], Dict]): A pickupLocations/dropoffLocations grid
+
+    Returns:
+        Dict: A dictonary where the rider ID (int) represents the key and
+            values are the coordinates of the rider (column, row)
+
+    Raises:
+        ValueError: If the grid uses an unknown format
+    """
+    if not isinstance(grid, dict):
+        return fetch_rider_and_driver_coords(grid)
+    return fetch_sparse_coords(decode_grid_cells(grid).tolist())
+
+
+def encode_grid(grid: List[List[int]], grid_format: str) -> Dict:
+    """
+    Encodes a dense grid into one of the formats read by `decode_grid_coords`
+
+    Args:
+        grid (List[List[int]]): A dense pickupLocations/dropoffLocations grid
+        grid_format (str): "coo" or "rle"
+
+    Returns:
+        Dict: The encoded grid, with its `width` and `height`
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    height = len(grid)
+    width = len(grid[0]) if height else 0
+
+    if grid_format == "coo":
+        return {"format": "coo", "width": width, "height": height,
+                "entries": fetch_grid_cells(grid).tolist()}
+
+    if grid_format == "rle":
+        rows = []
+        for cells in grid:
+            runs: List[List[int]] = []
+            for value in cells:
+                # Only empty cells are merged, IDs are unique
+                if value == -1 and runs and runs[-1][0] == -1:
+                    runs[-1][1] += 1
+                else:
+                    runs.append([value, 1])
+            rows.append(runs)
+        return {"format": "rle", "width": width, "height": height, "rows": rows}
+
+    raise ValueError(f"Unknown grid format: {grid_format}")
+
+
+def record_columns(records: List[Dict], *keys: str) -> np.ndarray:
+    """
+    Reads integer fields of many records, such as `requests` or `users`, into one array
+
+    Returns:
+        np.ndarray: A (len(records), len(keys)) integer array read in a single pass over the records,
+            JSON booleans are read as 1/0
+    """
+    values = chain.from_iterable(map(itemgetter(*keys), records))
+    return np.fromiter(values, dtype=np.int64, count=len(records) * len(keys)).reshape(-1, len(keys))
 
 
 def fetch_driver_passengers(requests: List) -> Dict[int, List[int]]:
@@ -238,12 +456,16 @@ def calculate_average_coords(driver_passengers: Dict[int, List[int]],
     return avg_pickup_location, avg_dropdown_location
 
 
-def fetch_response(url: str):
+def fetch_response(url: str, session: requests.Session = None, compressed: bool = False):
     """
     GET API data and parse it into a Python Object
 
     Args:
         url (str): API endpoint for retrieving and submitting data
+        session (requests.Session): Session to reuse pooled connections from,
+                    defaults to a new connection for every call
+        compressed (bool): Ask for a compressed body with every available codec (gzip, zstd),
+                    the body is decompressed as it is read
 
     Return:
     Dict: A Python dictonary of the data
@@ -251,7 +473,8 @@ def fetch_response(url: str):
     """
 
     try:
-        response = requests.get(url)
+        headers = {"Accept-Encoding": accept_encoding()} if compressed else None
+        response = (session or requests).get(url, headers=headers)
         data = response.json()
         if response.status_code == 200 and data:
             return data
@@ -264,24 +487,35 @@ def fetch_response(url: str):
         return None
 
 
-def post_response(url: str, json_stats_sorted: str):
+def post_response(url: str, json_stats_sorted: str, session: requests.Session = None,
+                  compression: str = None):
     """
     POST parsed API data
 
     Args:
         url (str): API endpoint for retrieving and submitting data
         json_stats_sorted: Sorted statistics using manhattan distance 
-                    in ascending order
+                    in ascending order, as a JSON str/bytes or an iterator of
+                    bytes chunks that is sent with chunked transfer encoding
+        session (requests.Session): Session to reuse pooled connections from,
+                    defaults to a new connection for every call
+        compression (str): Compress the body while it is sent ("gzip" or "zstd"),
+                    defaults to an uncompressed body
 
     Return:
         str: A message that tells you what kind of response was recieved
             - If the request status is 200, then it returns a sucess message
             - If the request status is not 200, then returns a unsucessful message
     """
+    headers = {"Content-Type": "application/json"}
+    if compression:
+        json_stats_sorted = compress_chunks(json_stats_sorted, compression)
+        headers["Content-Encoding"] = compression
+
     # Post the parsed data back to the API endpoint
-    response = requests.post(url,
-                             data=json_stats_sorted,
-                             headers={"Content-Type": "application/json"})
+    response = (session or requests).post(url,
+                                          data=json_stats_sorted,
+                                          headers=headers)
 
     if response.status_code == 200:
         return f"Succesful: {response.text}"
@@ -289,7 +523,109 @@ def post_response(url: str, json_stats_sorted: str):
         return f"Request Failed Error: {response.text}"
 
 
-def process_and_post_statistics(url: str):
+def build_statistics(driver_passengers: Dict[int, List[int]],
+                     pickup_locations: Dict[int, Tuple[int, int]],
+                     dropoff_locations: Dict[int, Tuple[int, int]],
+                     metrics: MetricsCollector = None) -> List[Dict]:
+    """
+    Generate the statistics of every group sorted using Manhattan distance
+
+    Args:
+        driver_passengers (Dict[int, List[int]]): Dictonary, where the driver is the key and
+                                                value is the list of riderIds associated with it
+        pickup_locations (Dict[int, Tuple[int, int]]): Dictonary, where the user is the key and
+                                                value is a tuple (x, y) representing the pickup coords
+        dropoff_locations (Dict[int, Tuple[int, int]]): Dictonary, where the user is the key and
+                                                value is a tuple (x, y) representing the dropoff coords
+        metrics (MetricsCollector): Records the `averaging` and `sort` stages, off by default
+
+    Return:
+        List[Dict]: Groups of the statistics sorted in ascending order using manhattan distance
+    """
+    metrics = metrics or NULL_METRICS
+
+    with metrics.stage("averaging") as stage:
+        pickup_avg, dropoff_avg = calculate_average_coords(driver_passengers,
+                                                           pickup_locations,
+                                                           dropoff_locations)
+        stage.count(groups=len(pickup_avg))
+
+    with metrics.stage("sort") as stage:
+        # Unsorted statistics for each group
+        stats = [create_entry(driver, riders, pickup_avg, dropoff_avg)
+                 for driver, riders in driver_passengers.items()]
+        stats_sorted = sort_statistics(stats)
+        stage.count(entries=len(stats_sorted))
+
+    return stats_sorted
+
+
+def sort_statistics(stats: List[Dict]) -> List[Dict]:
+    """
+    Sorts the statistics entries in ascending order using manhattan distance
+
+    Args:
+        stats (List[Dict]): Statistics entries created by `create_entry`
+
+    Return:
+        List[Dict]: The entries sorted by the distance between averagePickup and averageDropoff,
+            entries with the same distance keep their order
+    """
+    return sorted(stats, key=lambda s: manhattan_distance(
+        (s["averagePickup"]["x"], s['averageDropoff']["x"]),
+        (s['averagePickup']["y"], s['averageDropoff']["y"])))
+
+
+def compute_statistics(data: Dict, metrics: MetricsCollector = None) -> List[Dict]:
+    """
+    Generate the sorted statistics of every group from an API payload
+
+    Args:
+        data (Dict): API payload containing `requests`, `pickupLocations` and `dropoffLocations`,
+                    the grids may use any encoding read by `decode_grid_coords`
+        metrics (MetricsCollector): Records the `grouping`, `pickup_grid`, `dropoff_grid`,
+                    `averaging` and `sort` stages, off by default
+
+    Return:
+        List[Dict]: Groups of the statistics sorted in ascending order using manhattan distance
+    """
+    metrics = metrics or NULL_METRICS
+
+    # Fetching relevant data
+    with metrics.stage("grouping") as stage:
+        driver_passengers = fetch_driver_passengers(data["requests"])
+        stage.count(requests=len(data["requests"]), groups=len(driver_passengers))
+
+    with metrics.stage("pickup_grid") as stage:
+        pickup_locations = decode_grid_coords(
+            data["pickupLocations"])
+        stage.count(cells_scanned=_grid_area(data["pickupLocations"]),
+                    users_found=len(pickup_locations))
+
+    with metrics.stage("dropoff_grid") as stage:
+        dropoff_locations = decode_grid_coords(
+            data["dropoffLocations"])
+        stage.count(cells_scanned=_grid_area(data["dropoffLocations"]),
+                    users_found=len(dropoff_locations))
+
+    return build_statistics(driver_passengers,
+                            pickup_locations,
+                            dropoff_locations,
+                            metrics)
+
+
+def _grid_area(grid: Union[List[List[int]], Dict]) -> int:
+    # Encoded grids are scanned one entry or run at a time
+    if isinstance(grid, dict):
+        if grid.get("format") == "rle":
+            return sum(len(runs) for runs in grid["rows"])
+        return len(grid.get("entries", ()))
+    return len(grid) * len(grid[0]) if grid else 0
+
+
+def process_and_post_statistics(url: str, session: requests.Session = None,
+                                encoder: str = "auto", stream: bool = False,
+                                metrics: MetricsCollector = None, compression: str = None):
     """
     Process data from a API endpoint and generate statistics about that data and post it
 
@@ -303,42 +639,40 @@ def process_and_post_statistics(url: str):
 
     Args:
         url (str): API endpoint for retrieving and submitting data
+        session (requests.Session): Session to reuse pooled connections from,
+                    defaults to a new connection for every call
+        encoder (str): Output encoder name, see `encoding.get_encoder`
+        stream (bool): Send the statistics as they are encoded instead of building the whole body
+        metrics (MetricsCollector): Records every stage (`get`, `grouping`, `pickup_grid`, `dropoff_grid`,
+                    `averaging`, `sort`, `serialize`, `post`), off by default
+        compression (str): Ask for a compressed GET body and compress the POST body with
+                    this codec ("gzip" or "zstd"), off by default
 
     Return:
     List[Dict]: Sorted groups of the statistics using manhattan distance formula
         - None, if fetching failed or data is empty
     """
 
-    data = fetch_response(url)
+    metrics = metrics or NULL_METRICS
+
+    with metrics.stage("get"):
+        data = fetch_response(url, session, compressed=compression is not None)
 
     if data is None:
         return "Fail to GET data"
 
-    # Unsorted statistics for each group
-    stats = []
-
-    # Fetching relevant data
-    driver_passengers = fetch_driver_passengers(data["requests"])
-    pickup_locations = fetch_rider_and_driver_coords(
-        data["pickupLocations"])
-    dropoff_locations = fetch_rider_and_driver_coords(
-        data["dropoffLocations"])
-    pickup_avg, dropoff_avg = calculate_average_coords(driver_passengers,
-                                                       pickup_locations,
-                                                       dropoff_locations)
-
-    # Loop through the driver groups
-    for driver, riders in driver_passengers.items():
-        stats.append(create_entry(driver, riders, pickup_avg, dropoff_avg))
+    stats_sorted = compute_statistics(data, metrics)
 
-    # Sort the list of dictonaries in ascending order using manhattan distance
-    stats_sorted: List[Dict] = sorted(stats, key=lambda s: manhattan_distance(
-        (s["averagePickup"]["x"], s['averageDropoff']["x"]),
-        (s['averagePickup']["y"], s['averageDropoff']["y"])))
+    # Convert to JSON and POST it, streamed bodies are encoded during the POST
+    with metrics.stage("serialize") as stage:
+        if stream:
+            json_stats_sorted = iter_encoded_statistics(stats_sorted, encoder)
+        else:
+            json_stats_sorted = encode_statistics(stats_sorted, encoder)
+            stage.count(payload_bytes=len(json_stats_sorted))
 
-    # Convert to JSON string and POST it
-    json_stats_sorted = json.dumps(stats_sorted, indent=2)
-    response = post_response(url, json_stats_sorted)
+    with metrics.stage("post"):
+        response = post_response(url, json_stats_sorted, session, compression)
 
     print(response)
 
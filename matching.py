@@ -0,0 +1,242 @@
+from typing import List, Tuple, Dict, Iterable, Union, Optional
+import math
+from main import decode_grid_coords, fetch_driver_passengers
+
+
+class KDTreeIndex:
+    """
+    KD-tree of drivers over their (pickup x, pickup y, dropoff x, dropoff y)
+
+    The Manhattan distance between two such points is the pickup distance plus the dropoff
+    distance, so the nearest point is the closest driver for both legs. Subtrees whose box is
+    further than the best driver found so far are skipped, and removed drivers are counted
+    out of every subtree above them so full subtrees are skipped too.
+
+    Args:
+        points (Dict[int, Tuple[int, int, int, int]]): Driver mapped to its point
+        leaf_size (int): Most drivers kept in a leaf
+    """
+
+    def __init__(self, points: Dict[int, Tuple[int, int, int, int]], leaf_size: int = 32):
+        self.leaf_size = max(leaf_size, 1)
+        # Per node: bounding box, children (-1 for leaves), parent, drivers left and leaf drivers
+        self._low: List[Tuple[int, ...]] = []
+        self._high: List[Tuple[int, ...]] = []
+        self._children: List[Tuple[int, int]] = []
+        self._parent: List[int] = []
+        self._alive: List[int] = []
+        self._leaves: List[Dict[int, Tuple[int, ...]]] = []
+        self._leaf_of: Dict[int, int] = {}
+        if points:
+            self._build(list(points.items()), -1)
+
+    def __len__(self) -> int:
+        return len(self._leaf_of)
+
+    def __contains__(self, driver: int) -> bool:
+        return driver in self._leaf_of
+
+    def _build(self, items: List[Tuple[int, Tuple[int, ...]]], parent: int) -> int:
+        node = len(self._parent)
+        low = tuple(map(min, *(point for _, point in items))) if len(items) > 1 else items[0][1]
+        high = tuple(map(max, *(point for _, point in items))) if len(items) > 1 else items[0][1]
+        self._low.append(low)
+        self._high.append(high)
+        self._children.append((-1, -1))
+        self._parent.append(parent)
+        self._alive.append(len(items))
+        self._leaves.append({})
+
+        if len(items) <= self.leaf_size:
+            self._leaves[node] = dict(items)
+            for driver, _ in items:
+                self._leaf_of[driver] = node
+            return node
+
+        # Split at the median of the widest axis
+        axis = max(range(len(low)), key=lambda axis: high[axis] - low[axis])
+        items.sort(key=lambda item: item[1][axis])
+        middle = len(items) // 2
+        left = self._build(items[:middle], node)
+        right = self._build(items[middle:], node)
+        self._children[node] = (left, right)
+        return node
+
+    def remove(self, driver: int):
+        node = self._leaf_of.pop(driver)
+        del self._leaves[node][driver]
+        while node != -1:
+            self._alive[node] -= 1
+            node = self._parent[node]
+
+    def _gap(self, node: int, point: Tuple[int, ...], axes: int) -> int:
+        # Smallest distance from the point to the box of the node over the first axes
+        gap = 0
+        for value, low, high in zip(point[:axes], self._low[node], self._high[node]):
+            if value < low:
+                gap += low - value
+            elif value > high:
+                gap += value - high
+        return gap
+
+    def nearest(self, point: Tuple[int, int, int, int], max_distance: int = None) -> Optional[int]:
+        """
+        Finds the closest driver whose pickup is within max_distance of the rider's pickup
+
+        Args:
+            point (Tuple[int, int, int, int]): Pickup and dropoff (x, y) of the rider
+            max_distance (int): Largest allowed pickup distance, defaults to no limit
+
+        Return:
+            int: The driver, ties go to the lowest driver ID
+                - None, if no driver qualifies
+        """
+        if not self._leaf_of:
+            return None
+
+        px, py, dx, dy = point
+        best_distance, best = math.inf, None
+        stack = [(0, 0)]
+        while stack:
+            bound, node = stack.pop()
+            # Equal bounds are still searched for a lower driver ID
+            if bound > best_distance or not self._alive[node]:
+                continue
+            left, right = self._children[node]
+            if left == -1:
+                for driver, (x, y, u, v) in self._leaves[node].items():
+                    pickup = abs(px - x) + abs(py - y)
+                    if max_distance is not None and pickup > max_distance:
+                        continue
+                    distance = pickup + abs(dx - u) + abs(dy - v)
+                    if distance < best_distance or (distance == best_distance and driver < best):
+                        best_distance, best = distance, driver
+                continue
+
+            children = []
+            for child in (left, right):
+                if max_distance is not None and self._gap(child, point, 2) > max_distance:
+                    continue
+                children.append((self._gap(child, point, 4), child))
+            # The closer child is popped first
+            children.sort(reverse=True)
+            stack.extend(children)
+        return best
+
+
+def match_riders(riders: Iterable[int], drivers: Iterable[int],
+                 pickup_coords: Dict[int, Tuple[int, int]],
+                 dropoff_coords: Dict[int, Tuple[int, int]],
+                 capacity: Union[int, Dict[int, int]] = 4,
+                 seats_taken: Dict[int, int] = None,
+                 max_distance: int = None) -> Tuple[Dict[int, int], List[int]]:
+    """
+    Assigns riders to the closest driver with a free seat
+
+    Riders are matched greedily in the order given. The cost of a driver is the Manhattan
+    distance between their pickups plus the distance between their dropoffs, drivers are
+    looked up in a `KDTreeIndex` so matching stays close to linear in the number of riders.
+
+    Args:
+        riders (Iterable[int]): Riders to match
+        drivers (Iterable[int]): Candidate drivers
+        pickup_coords (Dict[int, Tuple[int, int]]): User mapped to its pickup (x, y)
+        dropoff_coords (Dict[int, Tuple[int, int]]): User mapped to its dropoff (x, y)
+        capacity (Union[int, Dict[int, int]]): Seats of every driver, or of each driver
+        seats_taken (Dict[int, int]): Seats already used by each driver, e.g. accepted riders
+        max_distance (int): Largest allowed pickup distance, defaults to no limit
+
+    Return:
+        Dict[int, int]: Matched rider mapped to its driver
+        List[int]: Riders that could not be matched (no location, or no driver with a seat in range)
+
+    Example:
+        pickup_coords = {1: (0, 0), 2: (9, 9), 5: (1, 0), 6: (8, 9)}
+        dropoff_coords = {1: (5, 5), 2: (0, 0), 5: (5, 6), 6: (1, 1)}
+        match_riders([5, 6], [1, 2], pickup_coords, dropoff_coords, capacity=1)
+
+        Output:
+        ({5: 1, 6: 2}, [])
+    """
+    seats_taken = seats_taken or {}
+    free: Dict[int, int] = {}
+    points: Dict[int, Tuple[int, int, int, int]] = {}
+
+    for driver in drivers:
+        if driver not in pickup_coords or driver not in dropoff_coords:
+            continue
+        seats = capacity if isinstance(capacity, int) else capacity.get(driver, 0)
+        free[driver] = seats - seats_taken.get(driver, 0)
+        if free[driver] > 0:
+            points[driver] = pickup_coords[driver] + dropoff_coords[driver]
+    index = KDTreeIndex(points)
+
+    assignments: Dict[int, int] = {}
+    unmatched: List[int] = []
+
+    for rider in riders:
+        if rider not in pickup_coords or rider not in dropoff_coords:
+            unmatched.append(rider)
+            continue
+
+        driver = index.nearest(pickup_coords[rider] + dropoff_coords[rider], max_distance)
+        if driver is None:
+            unmatched.append(rider)
+            continue
+
+        assignments[rider] = driver
+        free[driver] -= 1
+        if free[driver] == 0:
+            index.remove(driver)
+
+    return assignments, unmatched
+
+
+def unassigned_riders(data: Dict) -> List[int]:
+    """
+    Finds the riders of a payload that are not in any group
+
+    Riders are the users with role 0, or the riders named in `requests` when the payload has
+    no `users`. A rider is unassigned when none of its requests was accepted.
+    """
+    accepted = {rider for riders in fetch_driver_passengers(data["requests"]).values() for rider in riders}
+    if data.get("users"):
+        riders = [user["id"] for user in data["users"] if user["role"] == 0]
+    else:
+        riders = list(dict.fromkeys(request["rider"] for request in data["requests"]))
+    return [rider for rider in riders if rider not in accepted]
+
+
+def match_payload(data: Dict, capacity: Union[int, Dict[int, int]] = 4,
+                  max_distance: int = None) -> Tuple[Dict[int, List[int]], List[int]]:
+    """
+    Adds the unassigned riders of a payload to the groups of nearby drivers
+
+    Args:
+        data (Dict): API payload shaped like `test_data.json`
+        capacity (Union[int, Dict[int, int]]): Seats of every driver (accepted riders included)
+        max_distance (int): Largest allowed pickup distance, defaults to no limit
+
+    Return:
+        Dict[int, List[int]]: Driver mapped to its riders, accepted riders first, then matched ones,
+            ready for `build_statistics`
+        List[int]: Riders that could not be matched
+    """
+    driver_passengers = {driver: list(riders)
+                         for driver, riders in fetch_driver_passengers(data["requests"]).items()}
+    if data.get("users"):
+        drivers = [user["id"] for user in data["users"] if user["role"] == 1]
+    else:
+        drivers = list(dict.fromkeys(request["driver"] for request in data["requests"]))
+
+    assignments, unmatched = match_riders(
+        unassigned_riders(data), drivers,
+        decode_grid_coords(data["pickupLocations"]),
+        decode_grid_coords(data["dropoffLocations"]),
+        capacity,
+        seats_taken={driver: len(riders) for driver, riders in driver_passengers.items()},
+        max_distance=max_distance)
+
+    for rider, driver in assignments.items():
+        driver_passengers.setdefault(driver, []).append(rider)
+    return driver_passengers, unmatched
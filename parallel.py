@@ -0,0 +1,189 @@
+from typing import List, Tuple, Dict, Iterable
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
+from main import (fetch_grid_cells, decode_grid_cells, fetch_driver_passengers, create_entry,
+                  sort_statistics, compute_statistics)
+
+# Group lookup installed in each worker process by `_init_worker`
+_GROUP_OF = None
+
+
+def group_lookup(driver_passengers: Dict[int, List[int]]) -> np.ndarray:
+    """
+    Builds a dense table indexed by user ID holding the index of the group the user belongs to
+
+    Args:
+        driver_passengers (Dict[int, List[int]]): Driver mapped to the list of its riders
+
+    Return:
+        np.ndarray: Group index (position of the driver in driver_passengers) of each user,
+            -1 for users without a group
+    """
+    users = [user for driver, riders in driver_passengers.items() for user in [driver] + riders]
+    group_of = np.full(max(users, default=-1) + 1, -1, dtype=np.int64)
+    for group, (driver, riders) in enumerate(driver_passengers.items()):
+        group_of[[driver] + riders] = group
+    return group_of
+
+
+def band_partial_sums(band: List[List[int]], group_of: np.ndarray, groups: int,
+                      row_offset: int = 0, column_offset: int = 0) -> np.ndarray:
+    """
+    Sums the coordinates of the grouped users found in part of a grid
+
+    Args:
+        band (List[List[int]]): Rows of a pickupLocations/dropoffLocations grid (or a tile of them)
+        group_of (np.ndarray): Group index of each user, from `group_lookup`
+        groups (int): Number of groups
+        row_offset (int): Grid row of the first row of the band
+        column_offset (int): Grid column of the first column of the band
+
+    Return:
+        np.ndarray: Per group [x total, y total, users found], shape (groups, 3)
+    """
+    return cell_partial_sums(fetch_grid_cells(band), group_of, groups, row_offset, column_offset)
+
+
+def cell_partial_sums(cells: np.ndarray, group_of: np.ndarray, groups: int,
+                      row_offset: int = 0, column_offset: int = 0) -> np.ndarray:
+    """
+    Sums the coordinates of the grouped users among sparse (id, x, y) cells, see `band_partial_sums`
+    """
+    partial = np.zeros((groups, 3), dtype=np.int64)
+    ids, columns, rows = np.asarray(cells, dtype=np.int64).reshape(-1, 3).T
+
+    # Keep only the users that belong to a group
+    known = (ids >= 0) & (ids < len(group_of))
+    group = np.full(len(ids), -1, dtype=np.int64)
+    group[known] = group_of[ids[known]]
+    grouped = group >= 0
+    group = group[grouped]
+
+    partial[:, 0] = np.bincount(group, weights=columns[grouped] + column_offset, minlength=groups)
+    partial[:, 1] = np.bincount(group, weights=rows[grouped] + row_offset, minlength=groups)
+    partial[:, 2] = np.bincount(group, minlength=groups)
+    return partial
+
+
+def merge_partial_sums(partials: Iterable[np.ndarray], groups: int) -> np.ndarray:
+    """
+    Adds up the partial sums of every band of a grid
+    """
+    total = np.zeros((groups, 3), dtype=np.int64)
+    for partial in partials:
+        total += partial
+    return total
+
+
+def statistics_from_sums(driver_passengers: Dict[int, List[int]],
+                         pickup_sums: np.ndarray, dropoff_sums: np.ndarray) -> List[Dict]:
+    """
+    Floor averages the merged sums and creates the sorted statistics, the same output as `build_statistics`
+
+    Raises:
+        KeyError: If a user of a group was not found on the pickup or dropoff grid
+    """
+    pickup_avg: Dict[int, Tuple[int, int]] = {}
+    dropoff_avg: Dict[int, Tuple[int, int]] = {}
+
+    for group, (driver, riders) in enumerate(driver_passengers.items()):
+        # + 1 to account for the driver
+        n = len(riders) + 1
+        pickup_x, pickup_y, pickup_n = pickup_sums[group].tolist()
+        dropoff_x, dropoff_y, dropoff_n = dropoff_sums[group].tolist()
+        if pickup_n != n or dropoff_n != n:
+            raise KeyError(f"Users of driver {driver} are missing from the grids")
+        pickup_avg[driver] = (pickup_x // n, pickup_y // n)
+        dropoff_avg[driver] = (dropoff_x // n, dropoff_y // n)
+
+    stats = [create_entry(driver, riders, pickup_avg, dropoff_avg)
+             for driver, riders in driver_passengers.items()]
+    return sort_statistics(stats)
+
+
+def split_rows(grid: List[List[int]], bands: int) -> List[Tuple[int, List[List[int]]]]:
+    """
+    Splits a grid into at most `bands` contiguous row bands
+
+    Return:
+        List[Tuple[int, List[List[int]]]]: (row offset, rows) of each band
+
+    Raises:
+        ValueError: If the grid is encoded, only dense grids have rows to split
+    """
+    if isinstance(grid, dict):
+        raise ValueError("Only dense grids can be split into row bands")
+    size = max(-(-len(grid) // max(bands, 1)), 1)
+    return [(start, grid[start:start + size]) for start in range(0, len(grid), size)]
+
+
+def _init_worker(group_of: np.ndarray):
+    global _GROUP_OF
+    _GROUP_OF = group_of
+
+
+def _band_task(band: List[List[int]], groups: int, row_offset: int) -> np.ndarray:
+    return band_partial_sums(band, _GROUP_OF, groups, row_offset)
+
+
+def _cells_task(cells: np.ndarray, groups: int) -> np.ndarray:
+    return cell_partial_sums(cells, _GROUP_OF, groups)
+
+
+def compute_statistics_banded(data: Dict, bands: int = None, workers: int = None) -> List[Dict]:
+    """
+    Generate the sorted statistics of one payload with its grids split into row bands
+    that are scanned on a pool of processes
+
+    Each band returns the per group coordinate sums and counts of the users it contains,
+    the partial sums are merged and floor averaged into the same output as `compute_statistics`.
+    Encoded grids are already proportional to the number of users, they are summed in one
+    piece from their decoded cells instead of being split.
+
+    Args:
+        data (Dict): API payload containing `requests`, `pickupLocations` and `dropoffLocations`,
+            the grids may use any encoding read by `decode_grid_coords`
+        bands (int): Number of row bands per grid, defaults to the number of workers
+        workers (int): Number of processes, defaults to the number of CPUs
+
+    Return:
+        List[Dict]: Groups of the statistics sorted in ascending order using manhattan distance
+    """
+    workers = workers or os.cpu_count() or 1
+    bands = bands or workers
+
+    driver_passengers = fetch_driver_passengers(data["requests"])
+    group_of = group_lookup(driver_passengers)
+    groups = len(driver_passengers)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(group_of,)) as executor:
+
+        def submit(grid) -> list:
+            if isinstance(grid, dict):
+                return [executor.submit(_cells_task, decode_grid_cells(grid), groups)]
+            return [executor.submit(_band_task, band, groups, offset) for offset, band in split_rows(grid, bands)]
+
+        pickup_jobs = submit(data["pickupLocations"])
+        dropoff_jobs = submit(data["dropoffLocations"])
+
+        pickup_sums = merge_partial_sums((job.result() for job in pickup_jobs), groups)
+        dropoff_sums = merge_partial_sums((job.result() for job in dropoff_jobs), groups)
+
+    return statistics_from_sums(driver_passengers, pickup_sums, dropoff_sums)
+
+
+def process_payloads(payloads: Iterable[Dict], workers: int = None) -> List[List[Dict]]:
+    """
+    Generate the sorted statistics of a batch of payloads, one payload per process at a time
+
+    Args:
+        payloads (Iterable[Dict]): API payloads shaped like `test_data.json`
+        workers (int): Number of processes, defaults to the number of CPUs
+
+    Return:
+        List[List[Dict]]: Sorted statistics of each payload in the order given
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(compute_statistics, payloads))
@@ -0,0 +1,93 @@
+from typing import List, Dict, Iterable, Union
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import requests
+from requests.adapters import HTTPAdapter
+from main import fetch_response, post_response, compute_statistics
+from encoding import encode_statistics
+
+
+def create_session(pool_size: int = 8) -> requests.Session:
+    """
+    Creates a session that keeps up to `pool_size` connections alive per host
+
+    Args:
+        pool_size (int): Number of pooled connections kept open for each host
+
+    Return:
+        requests.Session: Session with a sized connection pool for http and https
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _compute_and_encode(data: Dict):
+    # Sorting and serializing are both CPU bound, keep them off the event loop
+    stats_sorted = compute_statistics(data)
+    return stats_sorted, encode_statistics(stats_sorted)
+
+
+async def process_and_post_statistics_many(urls: Iterable[str], concurrency: int = 8,
+                                           session: requests.Session = None) -> List[Union[List[Dict], str]]:
+    """
+    Process and post the statistics of many API endpoints concurrently
+
+    Every URL goes through the same steps as `process_and_post_statistics`. A shard holds
+    one of `concurrency` slots from its GET until its POST is done, so at most that many
+    payloads and results are in memory at once. The requests share a keep-alive connection
+    pool and the CPU work runs in worker threads, so fetching one shard overlaps with
+    computing and posting another.
+
+    Args:
+        urls (Iterable[str]): API endpoints for retrieving and submitting data
+        concurrency (int): Maximum number of shards in flight (fetched, computed or posted) at once
+        session (requests.Session): Session to reuse, defaults to a pooled session
+                    that is closed once every shard is done
+
+    Return:
+        List: Result of each URL in the order given
+            - List[Dict], sorted groups of the statistics using manhattan distance formula
+            - "Fail to GET data", if fetching failed or data is empty
+            - "Fail to POST data", if the statistics could not be sent
+    """
+    owns_session = session is None
+    if owns_session:
+        session = create_session(concurrency)
+
+    loop = asyncio.get_running_loop()
+    in_flight = asyncio.Semaphore(concurrency)
+
+    # Network calls and CPU work share one bounded pool of worker threads
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+
+        async def run(url: str):
+            async with in_flight:
+                data = await loop.run_in_executor(executor, fetch_response, url, session)
+
+                if data is None:
+                    return "Fail to GET data"
+
+                stats_sorted, json_stats_sorted = await loop.run_in_executor(
+                    executor, _compute_and_encode, data)
+                # The payload is not needed once the statistics are computed
+                del data
+
+                try:
+                    response = await loop.run_in_executor(
+                        executor, post_response, url, json_stats_sorted, session)
+                except requests.RequestException:
+                    # One unreachable endpoint must not lose the results of the other shards
+                    return "Fail to POST data"
+
+            print(response)
+
+            return stats_sorted
+
+        try:
+            return await asyncio.gather(*(run(url) for url in urls))
+        finally:
+            if owns_session:
+                session.close()
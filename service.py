@@ -0,0 +1,253 @@
+from typing import List, Dict, Tuple, Callable
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import argparse
+import json
+import math
+import os
+import socketserver
+import threading
+import time
+import requests
+from main import compute_statistics
+from encoding import encode_statistics
+from http_compression import decompress_chunks, DECODE_ERRORS
+from cache import CachedProcessor, content_hash
+from pipeline import create_session
+
+# Latency samples kept per route, older ones are forgotten
+LATENCY_WINDOW = 10000
+
+
+class LatencyRecorder:
+    """
+    Thread safe record of the latest request latencies of every route
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(route, deque(maxlen=self.window)).append(seconds)
+            self._counts[route] = self._counts.get(route, 0) + 1
+
+    def percentiles(self) -> Dict[str, Dict]:
+        """
+        Latency percentiles of each route over its recent requests
+
+        Return:
+            Dict[str, Dict]: Route mapped to its total `count` and the p50, p90, p99
+                and max latency in milliseconds of the recent requests
+        """
+        with self._lock:
+            samples = {route: sorted(values) for route, values in self._samples.items()}
+            counts = dict(self._counts)
+
+        report = {}
+        for route, values in samples.items():
+            def rank(percent: float) -> float:
+                # Nearest rank percentile
+                return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)] * 1000
+
+            report[route] = {"count": counts[route], "p50_ms": rank(50), "p90_ms": rank(90),
+                             "p99_ms": rank(99), "max_ms": values[-1] * 1000}
+        return report
+
+
+def _payload_statistics(body: bytes) -> List[Dict]:
+    # Runs in a worker process, decoding the body there keeps the request thread free
+    return compute_statistics(json.loads(body))
+
+
+class StatisticsService:
+    """
+    Warm state shared by every request of the service
+
+    The connection pool, the result cache and the conditional GET validators live as long as
+    the service, so repeated payloads and URLs skip the work a fresh process would redo.
+    Pushed payloads are decoded and computed on a pool of worker processes, so they run in
+    parallel. URLs are processed on a pool of threads, they share the cache and connection pool,
+    which overlaps their network calls but not their CPU work.
+
+    Args:
+        workers (int): Number of worker processes, and of URLs processed at once
+        cache_size (int): Maximum number of results kept in the cache
+        encoder (str): Output encoder name, see `encoding.get_encoder`
+        session (requests.Session): Session for the URLs, defaults to a pool sized for the workers
+    """
+
+    def __init__(self, workers: int = 4, cache_size: int = 128, encoder: str = "auto",
+                 session: requests.Session = None):
+        self.workers = workers
+        self.encoder = encoder
+        self.session = session or create_session(workers)
+        self.processor = CachedProcessor(self.session, cache_size, encoder=encoder)
+        self.latency = LatencyRecorder()
+        self.started = time.time()
+        self._processes = ProcessPoolExecutor(max_workers=workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="statistics")
+
+    def run(self, function: Callable, *args):
+        # Wait for a worker thread, the request thread only handles I/O
+        return self._executor.submit(function, *args).result()
+
+    def statistics(self, body: bytes) -> bytes:
+        """
+        Computes the encoded statistics of a pushed payload, reusing the cached result of
+        an identical payload
+
+        Raises:
+            ValueError: If the body is not a JSON payload
+            KeyError: If the payload is missing a field or a user location
+        """
+        digest = content_hash(body)
+        stats_sorted = self.processor.cache.get(digest)
+        if stats_sorted is None:
+            stats_sorted = self._processes.submit(_payload_statistics, body).result()
+            self.processor.cache.put(digest, stats_sorted)
+        return encode_statistics(stats_sorted, self.encoder)
+
+    def process(self, url: str):
+        """
+        Runs `CachedProcessor.process` for a URL on a worker
+        """
+        return self.run(self.processor.process, url)
+
+    def status(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "uptime_seconds": time.time() - self.started,
+            "cache": self.processor.counters(),
+            "latency": self.latency.percentiles(),
+        }
+
+    def close(self):
+        self._processes.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    """
+    Routes of the service:
+        - POST /statistics: body is a payload shaped like `test_data.json` (optionally with a
+          gzip/zstd Content-Encoding), answers its sorted statistics
+        - POST /process: body is {"url": ...}, GETs the URL, POSTs its statistics back to it and
+          answers {"url": ..., "result": ...}
+        - GET /status: worker count, uptime, cache counters and latency percentiles
+    """
+    protocol_version = "HTTP/1.1"
+    service: StatisticsService = None
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        codec = self.headers.get("Content-Encoding")
+        if codec:
+            try:
+                body = b"".join(decompress_chunks([body], codec))
+            except DECODE_ERRORS as error:
+                raise ValueError(f"Corrupt {codec} body: {error}") from error
+        return body
+
+    def _timed(self, route: str, handle: Callable[[], Tuple[int, bytes]]):
+        start = time.perf_counter()
+        try:
+            status, body = handle()
+        except (ValueError, KeyError, TypeError) as error:
+            status, body = 400, json.dumps({"error": f"{type(error).__name__}: {error}"}).encode()
+        except requests.RequestException as error:
+            # The upstream API failed, not the request
+            status, body = 502, json.dumps({"error": f"{type(error).__name__}: {error}"}).encode()
+        self._reply(status, body)
+        self.service.latency.record(route, time.perf_counter() - start)
+
+    def do_GET(self):
+        if self.path == "/status":
+            self._reply(200, json.dumps(self.service.status()).encode())
+        else:
+            self._reply(404, b'{"error": "Not found"}')
+
+    def do_POST(self):
+        if self.path == "/statistics":
+            self._timed("statistics", lambda: (200, self.service.statistics(self._body())))
+        elif self.path == "/process":
+            self._timed("process", self._process)
+        else:
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._reply(404, b'{"error": "Not found"}')
+
+    def _process(self) -> Tuple[int, bytes]:
+        url = json.loads(self._body())["url"]
+        result = self.service.process(url)
+        status = 502 if isinstance(result, str) else 200
+        return status, json.dumps({"url": url, "result": result}).encode()
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(service: StatisticsService, host: str = "127.0.0.1", port: int = 8080,
+                  unix_socket: str = None) -> socketserver.BaseServer:
+    """
+    Creates the HTTP server of a service, call `serve_forever` on it to start serving
+
+    Args:
+        service (StatisticsService): Warm state the requests share
+        host (str): Interface to listen on
+        port (int): TCP port, 0 picks a free one
+        unix_socket (str): Listen on this Unix socket path instead of TCP
+
+    Return:
+        socketserver.BaseServer: The server, every connection is handled on its own thread
+    """
+    handler = type("ServiceHandler", (_ServiceHandler,), {"service": service})
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        return _UnixHTTPServer(unix_socket, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Serve carpool statistics from a warm process")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix-socket", help="listen on a Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes computing pushed payloads, and URLs processed at once "
+                             "(on threads, which only overlap their network calls)")
+    parser.add_argument("--cache-size", type=int, default=128, help="results kept in the cache")
+    parser.add_argument("--encoder", default="auto", help="output encoder, see encoding.get_encoder")
+    args = parser.parse_args(argv)
+
+    service = StatisticsService(args.workers, args.cache_size, args.encoder)
+    server = create_server(service, args.host, args.port, args.unix_socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+from typing import List, Dict, NamedTuple, Tuple, Union
+import json
+import struct
+import numpy as np
+from main import decode_grid_cells
+from columnar import GroupColumns
+
+MAGIC = b"CARPOOL\x00"
+VERSION = 1
+
+# magic, version, pickup cells, dropoff cells, requests, grid width, grid height
+HEADER = struct.Struct("<8sIIIIII")
+
+CELL_DTYPE = np.dtype("<i4")
+REQUEST_DTYPE = np.dtype([("driver", "<i4"), ("rider", "<i4"), ("accepted", "u1")])
+
+
+class Snapshot(NamedTuple):
+    """
+    Arrays of a binary snapshot, memory-mapped from the file
+
+    Attributes:
+        pickup_cells (np.ndarray): (id, x, y) int32 rows of every occupied pickup cell
+        dropoff_cells (np.ndarray): (id, x, y) int32 rows of every occupied dropoff cell
+        requests (np.ndarray): Packed (driver, rider, accepted) records
+        width (int): Number of grid columns
+        height (int): Number of grid rows
+    """
+    pickup_cells: np.ndarray
+    dropoff_cells: np.ndarray
+    requests: np.ndarray
+    width: int
+    height: int
+
+
+def _int32(values, name: str) -> np.ndarray:
+    # Values that do not fit the int32 fields of the file are refused instead of wrapping around
+    values = np.asarray(values, dtype=np.int64)
+    info = np.iinfo(CELL_DTYPE)
+    if values.size and (values.min() < info.min or values.max() > info.max):
+        raise ValueError(f"{name} out of the int32 range of a snapshot")
+    return values.astype(CELL_DTYPE)
+
+
+def _grid_size(grid: Union[List[List[int]], Dict], cells: np.ndarray) -> Tuple[int, int]:
+    # Width and height of a dense grid, or the ones stored with an encoded grid
+    if not isinstance(grid, dict):
+        return max((len(row) for row in grid), default=0), len(grid)
+    # Without a stored size the grid ends at its last occupied cell
+    width, height = (cells[:, 1:].max(axis=0) + 1).tolist() if len(cells) else (0, 0)
+    if "rows" in grid:
+        height = len(grid["rows"])
+    return grid.get("width", width), grid.get("height", height)
+
+
+def write_snapshot(data: Dict, path: str):
+    """
+    Writes an API payload as a binary snapshot
+
+    Layout (little-endian):
+        - Header: magic, version, pickup cell count, dropoff cell count, request count,
+          grid width, grid height
+        - Pickup cells: int32 (id, x, y) rows
+        - Dropoff cells: int32 (id, x, y) rows
+        - Requests: packed 9 byte (int32 driver, int32 rider, uint8 accepted) records
+
+    Args:
+        data (Dict): API payload containing `requests`, `pickupLocations` and `dropoffLocations`,
+            the grids may be dense or encoded (see `decode_grid_cells`)
+        path (str): Destination file
+
+    Raises:
+        ValueError: If an ID or coordinate does not fit in an int32, or a grid uses an unknown format
+    """
+    pickup_cells = decode_grid_cells(data["pickupLocations"])
+    dropoff_cells = decode_grid_cells(data["dropoffLocations"])
+    pickup = _int32(pickup_cells, "Pickup cell")
+    dropoff = _int32(dropoff_cells, "Dropoff cell")
+
+    requests = np.empty(len(data["requests"]), dtype=REQUEST_DTYPE)
+    requests["driver"] = _int32([request["driver"] for request in data["requests"]], "Driver ID")
+    requests["rider"] = _int32([request["rider"] for request in data["requests"]], "Rider ID")
+    requests["accepted"] = [request["accepted"] is True for request in data["requests"]]
+
+    # The grids share one size, take the larger in case they disagree
+    pickup_size = _grid_size(data["pickupLocations"], pickup_cells)
+    dropoff_size = _grid_size(data["dropoffLocations"], dropoff_cells)
+    width, height = max(pickup_size[0], dropoff_size[0]), max(pickup_size[1], dropoff_size[1])
+
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(pickup), len(dropoff), len(requests), width, height))
+        file.write(pickup.tobytes())
+        file.write(dropoff.tobytes())
+        file.write(requests.tobytes())
+
+
+def convert_json_snapshot(json_path: str, snapshot_path: str):
+    """
+    Converts a JSON payload file shaped like `test_data.json` into a binary snapshot
+    """
+    with open(json_path, "r") as file:
+        data = json.load(file)
+    write_snapshot(data, snapshot_path)
+
+
+def _map(path: str, dtype: np.dtype, offset: int, shape) -> np.ndarray:
+    # Empty regions cannot be memory-mapped
+    if shape[0] == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+
+def read_snapshot(path: str) -> Snapshot:
+    """
+    Memory-maps a binary snapshot written by `write_snapshot`
+
+    Args:
+        path (str): Snapshot file
+
+    Return:
+        Snapshot: Read-only arrays backed by the file, pages are only read when used
+
+    Raises:
+        ValueError: If the file is not a snapshot or has an unsupported version
+    """
+    with open(path, "rb") as file:
+        header = file.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise ValueError(f"{path} is not a carpool snapshot")
+
+    magic, version, pickup_n, dropoff_n, request_n, width, height = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a carpool snapshot")
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+
+    offset = HEADER.size
+    pickup = _map(path, CELL_DTYPE, offset, (pickup_n, 3))
+    offset += pickup_n * 3 * CELL_DTYPE.itemsize
+    dropoff = _map(path, CELL_DTYPE, offset, (dropoff_n, 3))
+    offset += dropoff_n * 3 * CELL_DTYPE.itemsize
+    requests = _map(path, REQUEST_DTYPE, offset, (request_n,))
+
+    return Snapshot(pickup, dropoff, requests, width, height)
+
+
+def snapshot_statistics(path: str) -> List[Dict]:
+    """
+    Generate the sorted statistics of a binary snapshot, the same output as
+    `process_and_post_statistics` without parsing any JSON
+
+    The mapped arrays are not used in place, `GroupColumns` reads them once into
+    int64 columns, so the snapshot saves the JSON parsing but not that copy.
+
+    Args:
+        path (str): Snapshot file
+
+    Return:
+        List[Dict]: Groups of the statistics sorted in ascending order using manhattan distance
+
+    Raises:
+        KeyError: If a user of a group is missing from the grids
+    """
+    snapshot = read_snapshot(path)
+    columns = GroupColumns.from_arrays(drivers=snapshot.requests["driver"],
+                                       riders=snapshot.requests["rider"],
+                                       accepted=snapshot.requests["accepted"],
+                                       pickup_cells=snapshot.pickup_cells,
+                                       dropoff_cells=snapshot.dropoff_cells)
+    return columns.sorted_entries()
@@ -0,0 +1,287 @@
+from typing import List, Tuple, Dict, Iterable, Iterator, NamedTuple, Optional
+from collections import defaultdict
+import codecs
+import json
+import numpy as np
+import requests
+from main import decode_grid_coords
+from http_compression import accept_encoding
+
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = " \t\n\r"
+
+
+class StreamedPayload(NamedTuple):
+    """
+    The parts of an API payload needed for the statistics, extracted while streaming
+
+    Attributes:
+        driver_passengers (Dict[int, List[int]]): Driver mapped to the riders of its accepted requests
+        pickup_locations (Dict[int, Tuple[int, int]]): User mapped to its pickup (x, y)
+        dropoff_locations (Dict[int, Tuple[int, int]]): User mapped to its dropoff (x, y)
+    """
+    driver_passengers: Dict[int, List[int]]
+    pickup_locations: Dict[int, Tuple[int, int]]
+    dropoff_locations: Dict[int, Tuple[int, int]]
+
+
+class _JsonStream:
+    """
+    Pull parser over an iterable of text chunks
+
+    Only keeps the unread part of the current chunk(s) in memory, containers are walked
+    element by element so that no more than one element is decoded at a time.
+    """
+
+    def __init__(self, chunks: Iterable[str]):
+        self._chunks = iter(chunks)
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        # Read at least as much as is already buffered so retries stay linear
+        if self._eof:
+            return False
+        pending = [self._buffer[self._pos:]]
+        wanted = max(len(pending[0]), 1)
+        read = 0
+        for chunk in self._chunks:
+            pending.append(chunk)
+            read += len(chunk)
+            if read >= wanted:
+                break
+        else:
+            self._eof = True
+        self._buffer = "".join(pending)
+        self._pos = 0
+        return read > 0
+
+    def peek(self) -> str:
+        """
+        Returns the next non-whitespace character without consuming it, "" at the end of input
+        """
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill() and self._eof:
+                return ""
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in JSON stream, found {found or 'end of input'!r}")
+        self._pos += 1
+
+    def decode_value(self):
+        """
+        Decodes and consumes the next complete JSON value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # The value continues in the next chunk
+                if self._fill() or not self._eof:
+                    continue
+                raise
+            # A number running into the end of the buffer may be cut in half
+            if end == len(self._buffer) and not self._eof and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def iter_array(self) -> Iterator[None]:
+        """
+        Walks a JSON array, the stream is positioned at each element when control is yielded
+        and the caller must consume that element before resuming
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ",":
+                self._pos += 1
+            else:
+                self.expect("]")
+                return
+
+    def iter_object(self) -> Iterator[str]:
+        """
+        Walks a JSON object yielding each key, the stream is positioned at the value
+        and the caller must consume it before resuming
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.decode_value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self._pos += 1
+            else:
+                self.expect("}")
+                return
+
+    def expect_end(self):
+        """
+        Checks that only whitespace is left after the top-level value
+        """
+        found = self.peek()
+        if found:
+            raise ValueError(f"Extra data after the JSON document, found {found!r}")
+
+    def skip_value(self):
+        """
+        Consumes the next JSON value, containers are skipped one element at a time
+        """
+        char = self.peek()
+        if char == "[":
+            for _ in self.iter_array():
+                self.skip_value()
+        elif char == "{":
+            for _ in self.iter_object():
+                self.skip_value()
+        else:
+            self.decode_value()
+
+
+def _stream_grid(stream: _JsonStream) -> Dict[int, Tuple[int, int]]:
+    """
+    Collects the occupied cells of a grid one row at a time
+    """
+    # Encoded grids are already proportional to the number of users
+    if stream.peek() == "{":
+        return decode_grid_coords(stream.decode_value())
+
+    coords: Dict[int, Tuple[int, int]] = {}
+    for row, _ in enumerate(stream.iter_array()):
+        cells = np.asarray(stream.decode_value(), dtype=np.int64)
+        columns = np.flatnonzero(cells != -1)
+        for column, user_id in zip(columns.tolist(), cells[columns].tolist()):
+            coords[user_id] = column, row
+    return coords
+
+
+def _stream_requests(stream: _JsonStream, driver_passengers: Dict[int, List[int]]):
+    """
+    Adds the riders of the accepted requests to their drivers one request at a time
+    """
+    for _ in stream.iter_array():
+        request = stream.decode_value()
+        if request["accepted"] is True:
+            driver_passengers[request["driver"]].append(request["rider"])
+
+
+def parse_payload_stream(chunks: Iterable[str]) -> Optional[StreamedPayload]:
+    """
+    Incrementally parse an API payload from chunks of JSON text
+
+    Only accepted requests and occupied grid cells are kept, so memory scales with
+    the number of users instead of the area of the grids. Other sections such as
+    `users` are skipped without being decoded as a whole.
+
+    Args:
+        chunks (Iterable[str]): Consecutive pieces of the JSON document
+
+    Return:
+        StreamedPayload: Driver passengers, pickup and dropoff locations of the payload
+            - None, if the payload is an empty object
+
+    Raises:
+        ValueError: If the chunks are not one JSON object, trailing whitespace aside
+    """
+    stream = _JsonStream(chunks)
+    driver_passengers: Dict = defaultdict(list)
+    pickup_locations: Dict[int, Tuple[int, int]] = {}
+    dropoff_locations: Dict[int, Tuple[int, int]] = {}
+    found = False
+
+    for key in stream.iter_object():
+        found = True
+        if key == "requests":
+            _stream_requests(stream, driver_passengers)
+        elif key == "pickupLocations":
+            pickup_locations = _stream_grid(stream)
+        elif key == "dropoffLocations":
+            dropoff_locations = _stream_grid(stream)
+        else:
+            stream.skip_value()
+    stream.expect_end()
+
+    if not found:
+        return None
+    return StreamedPayload(driver_passengers, pickup_locations, dropoff_locations)
+
+
+def decode_chunks(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[str]:
+    """
+    Decodes byte chunks into text, multibyte characters may be split across chunks
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def load_payload_stream(path: str, chunk_size: int = CHUNK_SIZE) -> Optional[StreamedPayload]:
+    """
+    Incrementally parse an API payload stored in a JSON file
+
+    Args:
+        path (str): Path of the JSON file, shaped like `test_data.json`
+        chunk_size (int): Number of characters read at a time
+
+    Return:
+        StreamedPayload: Driver passengers, pickup and dropoff locations of the payload
+            - None, if the payload is an empty object
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        return parse_payload_stream(iter(lambda: file.read(chunk_size), ""))
+
+
+def fetch_payload_stream(url: str, chunk_size: int = CHUNK_SIZE, session: requests.Session = None,
+                         compressed: bool = False) -> Optional[StreamedPayload]:
+    """
+    GET API data and incrementally parse it while the body is downloaded
+
+    Args:
+        url (str): API endpoint for retrieving and submitting data
+        chunk_size (int): Number of bytes read from the response at a time
+        session (requests.Session): Session to reuse connections from, defaults to a new connection
+        compressed (bool): Ask for a compressed body with every available codec (gzip, zstd),
+            it is decompressed chunk by chunk as it is parsed
+
+    Return:
+        StreamedPayload: Driver passengers, pickup and dropoff locations of the payload
+            - If the data is fetched unsuccesfully then return None
+    """
+    try:
+        headers = {"Accept-Encoding": accept_encoding()} if compressed else None
+        with (session or requests).get(url, stream=True, headers=headers) as response:
+            if response.status_code != 200:
+                print("Unexpected Status Code:", response.status_code)
+                return None
+
+            payload = parse_payload_stream(decode_chunks(
+                response.iter_content(chunk_size), response.encoding or "utf-8"))
+            if payload is None:
+                print("Unexpected Status Code:", response.status_code)
+            return payload
+
+    except Exception as error:
+        print(f"Error Fetching Data From {url}:", error)
+        return None
@@ -0,0 +1,50 @@
+import json
+import pytest
+from main import fetch_rider_and_driver_coords, fetch_driver_passengers, compute_statistics
+from bench import generate_payload, run_benchmark, main, STAGES
+
+
+def test_generate_payload():
+    data = generate_payload(500, group_sizes={2: 0.5, 3: 0.5}, rejected_ratio=0.25, seed=3)
+
+    # Test the same arguments give the same payload
+    assert data == generate_payload(500, group_sizes={2: 0.5, 3: 0.5}, rejected_ratio=0.25, seed=3), \
+        "Payload is not deterministic"
+
+    # Test every user is on both grids
+    assert len(fetch_rider_and_driver_coords(data["pickupLocations"])) == 500, "Failed pickup grid"
+    assert len(fetch_rider_and_driver_coords(data["dropoffLocations"])) == 500, "Failed dropoff grid"
+
+    # Test group sizes and the rejected ratio
+    accepted = [request for request in data["requests"] if request["accepted"]]
+    groups = fetch_driver_passengers(data["requests"])
+    assert {len(riders) for riders in groups.values()} <= {2, 3}, "Failed group sizes"
+    assert len(data["requests"]) - len(accepted) == int(len(accepted) * 0.25), "Failed rejected ratio"
+    assert {user["id"] for user in data["users"] if user["role"] == 1} == set(groups), "Failed driver roles"
+
+    # Test a rectangular grid and a grid that is too small
+    data = generate_payload(20, grid_width=10, grid_height=3)
+    assert (len(data["pickupLocations"]), len(data["pickupLocations"][0])) == (3, 10), "Failed grid size"
+    compute_statistics(data)
+    with pytest.raises(ValueError):
+        generate_payload(20, grid_width=4, grid_height=4)
+
+
+def test_run_benchmark(tmp_path):
+    result = run_benchmark(200, repeat=1)
+    assert set(result["stages"]) == set(STAGES), "Missing stages"
+    assert all(stage["seconds"] >= 0 and "peak_bytes" in stage for stage in result["stages"].values())
+
+    # Test the command line writes a JSON report
+    output = tmp_path / "bench.json"
+    main(["--sizes", "100", "300", "--repeat", "1", "--no-memory", "--output", str(output)])
+    report = json.loads(output.read_text())
+    assert [entry["users"] for entry in report["results"]] == [100, 300], "Failed report sizes"
+
+    # Test the grid and group size sweeps from the command line
+    main(["--sizes", "100", "--repeat", "1", "--no-memory", "--output", str(output),
+          "--grid-width", "40", "--grid-height", "20", "--group-sizes", "2:0.5", "4:0.5"])
+    result = json.loads(output.read_text())["results"][0]
+    assert result["grid"] == [40, 20], "Failed grid size option"
+    with pytest.raises(SystemExit):
+        main(["--group-sizes", "two"])
@@ -0,0 +1,55 @@
+from cache import ResultCache, CachedProcessor
+
+
+def test_result_cache():
+    cache = ResultCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    # Test reading "a" makes "b" the least recently used
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache and "a" in cache and len(cache) == 2, "Failed LRU eviction"
+
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1), "Failed counters"
+
+
+def test_conditional_get(requests_mock, data, solution_data_list):
+    url = "http://sandboxcarpool.com/data"
+    get = requests_mock.get(url, [
+        {"json": data, "headers": {"ETag": '"v1"', "Last-Modified": "Sat, 17 Oct 2026 10:00:00 GMT"}},
+        {"status_code": 304},
+    ])
+    post = requests_mock.post(url, text="Worked")
+    processor = CachedProcessor()
+
+    assert processor.process(url) == solution_data_list, "Sorted groups stats does not match expected"
+    assert processor.process(url) == solution_data_list, "Failed not modified response"
+
+    # Test the second GET was conditional and the duplicate POST skipped
+    assert get.request_history[1].headers["If-None-Match"] == '"v1"'
+    assert get.request_history[1].headers["If-Modified-Since"] == "Sat, 17 Oct 2026 10:00:00 GMT"
+    assert post.call_count == 1, "Duplicate POST was not skipped"
+    assert processor.counters() == {"hits": 1, "misses": 1, "not_modified": 1,
+                                    "posts_skipped": 1, "size": 1}
+
+
+def test_content_hash_cache(requests_mock, data, solution_data_list):
+    # Same payload served from two shards without validators
+    requests_mock.get("http://sandboxcarpool.com/a", json=data)
+    requests_mock.get("http://sandboxcarpool.com/b", json=data)
+    requests_mock.get("http://sandboxcarpool.com/fail", status_code=500)
+    post_a = requests_mock.post("http://sandboxcarpool.com/a", text="Worked")
+    post_b = requests_mock.post("http://sandboxcarpool.com/b", text="Worked")
+    processor = CachedProcessor(skip_duplicate_post=False)
+
+    assert processor.process("http://sandboxcarpool.com/a") == solution_data_list
+    assert processor.process("http://sandboxcarpool.com/b") == solution_data_list
+    assert processor.process("http://sandboxcarpool.com/a") == solution_data_list
+
+    # Test only the first payload was computed, every POST was still sent
+    assert (processor.cache.hits, processor.cache.misses) == (2, 1), "Failed content hash cache"
+    assert (post_a.call_count, post_b.call_count) == (2, 1), "POST was skipped"
+
+    assert processor.process("http://sandboxcarpool.com/fail") == "Fail to GET data"
@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from cli import expand_paths, process_file, jsonl_line, run_batch, main
+
+
+@pytest.fixture
+def archive(tmp_path, data):
+    """
+    Directory of archived payloads, three valid ones (one nested) and a broken one
+    """
+    (tmp_path / "nested").mkdir()
+    for path in ("a.json", "b.json", "nested/c.json"):
+        (tmp_path / path).write_text(json.dumps(data))
+    broken = dict(data, pickupLocations=[[-1]])
+    (tmp_path / "broken.json").write_text(json.dumps(broken))
+    (tmp_path / "notes.txt").write_text("not a payload")
+    return tmp_path
+
+
+@pytest.fixture
+def api_server():
+    """
+    Local stand-in for the API, records every POST body
+    """
+    posted = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            posted.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(200)
+            self.send_header("Content-Length", "6")
+            self.end_headers()
+            self.wfile.write(b"Worked")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/data", posted
+    server.shutdown()
+    server.server_close()
+
+
+def test_expand_paths(archive):
+    directory = expand_paths([str(archive)])
+    assert [os.path.relpath(path, archive) for path in directory] == \
+        ["a.json", "b.json", "broken.json", os.path.join("nested", "c.json")], "Failed directory"
+
+    # Globs, plain files and duplicates
+    files = expand_paths([str(archive / "*.json"), str(archive / "a.json"), str(archive / "notes.txt")])
+    assert [os.path.basename(path) for path in files] == ["a.json", "b.json", "broken.json", "notes.txt"]
+
+    with pytest.raises(FileNotFoundError):
+        expand_paths([str(archive / "*.csv")])
+
+
+def test_process_file(archive, solution_data_list):
+    result = process_file(str(archive / "a.json"))
+    assert json.loads(result["statistics"]) == solution_data_list, "Failed statistics"
+    assert json.loads(jsonl_line(result)) == {"file": str(archive / "a.json"),
+                                              "statistics": solution_data_list}, "Failed JSON lines record"
+
+    assert process_file(str(archive / "broken.json"))["error"].startswith("KeyError"), "Failed broken payload"
+    assert process_file(str(archive / "notes.txt"))["error"].startswith("JSONDecodeError"), "Failed bad JSON"
+
+    # Validation drops the groups with missing users instead of failing
+    result = process_file(str(archive / "broken.json"), validation="drop")
+    assert json.loads(result["statistics"]) == [], "Failed validated payload"
+
+    # An unreachable POST URL or an unwritable output fails only that file
+    result = process_file(str(archive / "a.json"), post_url="http://127.0.0.1:1/data")
+    assert result["error"].startswith("ConnectionError") and not result["posted"], "Failed unreachable POST"
+    result = process_file(str(archive / "a.json"), output_dir=str(archive / "notes.txt"))
+    assert "error" in result, "Failed unwritable output"
+
+
+def test_run_batch(archive, solution_data_list):
+    output = archive / "out.jsonl"
+    summary = run_batch(expand_paths([str(archive)]), str(output), workers=2, progress=None)
+
+    records = {os.path.basename(record["file"]): record for record in map(json.loads, output.read_text().splitlines())}
+    assert set(records) == {"a.json", "b.json", "c.json", "broken.json"}, "Failed one line per payload"
+    assert records["c.json"]["statistics"] == solution_data_list, "Failed nested payload"
+    assert "error" in records["broken.json"], "Failed to report the broken payload"
+    assert summary["files"] == 4 and summary["failed"] == 1 and summary["bytes"] > 0, "Failed summary"
+
+
+def test_main(archive, api_server, solution_data_list, capsys):
+    url, posted = api_server
+    output_dir = archive / "stats"
+
+    assert main([str(archive / "*.json"), "--output-dir", str(output_dir), "--workers", "2",
+                 "--post", url]) == 1, "Failed exit code with a broken payload"
+
+    assert sorted(os.listdir(output_dir)) == ["a.stats.json", "b.stats.json", "results.jsonl"]
+    assert json.loads((output_dir / "a.stats.json").read_text()) == solution_data_list, "Failed per file output"
+    assert posted == [solution_data_list] * 2, "Failed optional POST"
+
+    progress = capsys.readouterr().err.splitlines()
+    assert progress[-2].startswith("3/3 files, 1 failed"), "Failed progress"
+    assert json.loads(progress[-1])["files"] == 3, "Failed throughput summary"
+
+    # JSON lines to stdout by default
+    assert main([str(archive / "a.json"), "--quiet", "--workers", "1"]) == 0
+    assert json.loads(capsys.readouterr().out)["statistics"] == solution_data_list, "Failed stdout output"
+
+
+def test_output_dir_layout(archive, data, solution_data_list):
+    # Payloads with the same name in different directories keep their own output
+    (archive / "other").mkdir()
+    (archive / "other" / "c.json").write_text(json.dumps(dict(data, requests=[])))
+    output_dir = archive / "stats"
+
+    summary = run_batch([str(archive / "nested" / "c.json"), str(archive / "other" / "c.json")],
+                        output_dir=str(output_dir), workers=2, progress=None)
+    assert summary["failed"] == 0, "Failed summary"
+    assert json.loads((output_dir / "nested" / "c.stats.json").read_text()) == solution_data_list, \
+        "Failed mirrored output"
+    assert json.loads((output_dir / "other" / "c.stats.json").read_text()) == [], "Failed same named output"
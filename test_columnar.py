@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from main import fetch_rider_and_driver_coords, fetch_driver_passengers
+from columnar import GroupColumns
+
+
+def sparse_cells(grid):
+    return np.array([(user_id, x, y) for y, row in enumerate(grid)
+                     for x, user_id in enumerate(row) if user_id != -1])
+
+
+def test_averages():
+    driver_passengers = {5: [3, 4], 6: [7, 8]}
+    pickup_coords = {3: (12, 13), 4: (2, 9), 7: (4, 6),
+                     8: (5, 5), 5: (13, 7), 6: (13, 2)}
+    dropoff_coords = {3: (13, 1), 4: (3, 11),
+                      7: (8, 9), 8: (9, 8),
+                      5: (11, 10), 6: (13, 7)}
+
+    pickup, dropoff = GroupColumns.from_mappings(
+        driver_passengers, pickup_coords, dropoff_coords).averages()
+
+    # Same floor averages as calculate_average_coords
+    assert pickup.tolist() == [[9, 9], [7, 4]], "Failed average pickup"
+    assert dropoff.tolist() == [[9, 7], [10, 8]], "Failed average dropoff"
+
+    # Test with an empty
+    columns = GroupColumns.from_mappings({}, {}, {})
+    assert len(columns) == 0 and columns.sorted_entries() == [], "Failed empty test"
+
+
+def test_sorted_entries_from_mappings(data, solution_data_list):
+    columns = GroupColumns.from_mappings(
+        fetch_driver_passengers(data["requests"]),
+        fetch_rider_and_driver_coords(data["pickupLocations"]),
+        fetch_rider_and_driver_coords(data["dropoffLocations"]))
+
+    assert columns.sorted_entries() == solution_data_list, "Sorted groups stats does not match expected"
+
+
+def test_sorted_entries_from_arrays(data, solution_data_list):
+    requests = data["requests"]
+    columns = GroupColumns.from_arrays(
+        drivers=np.array([request["driver"] for request in requests]),
+        riders=np.array([request["rider"] for request in requests]),
+        accepted=np.array([request["accepted"] for request in requests]),
+        pickup_cells=sparse_cells(data["pickupLocations"]),
+        dropoff_cells=sparse_cells(data["dropoffLocations"]))
+
+    # Groups are numbered in the order fetch_driver_passengers produces
+    assert columns.driver_ids.tolist() == list(fetch_driver_passengers(requests)), "Group order failed"
+    assert columns.sorted_entries() == solution_data_list, "Sorted groups stats does not match expected"
+
+
+def test_missing_user(data):
+    requests = data["requests"]
+    arrays = dict(drivers=np.array([request["driver"] for request in requests]),
+                  riders=np.array([request["rider"] for request in requests]),
+                  accepted=np.array([request["accepted"] for request in requests]),
+                  dropoff_cells=sparse_cells(data["dropoffLocations"]))
+    pickup_cells = sparse_cells(data["pickupLocations"])
+    rider = int(arrays["riders"][arrays["accepted"] == 1][0])
+
+    # A grouped user without a pickup cell fails like calculate_average_coords
+    with pytest.raises(KeyError) as error:
+        GroupColumns.from_arrays(pickup_cells=pickup_cells[pickup_cells[:, 0] != rider], **arrays)
+    assert error.value.args == (rider,), "Failed missing user"
+
+    # So does a user ID above every cell
+    with pytest.raises(KeyError):
+        GroupColumns.from_arrays(pickup_cells=pickup_cells[pickup_cells[:, 0] < rider], **arrays)
+
+    # A negative ID is refused instead of overwriting the last users of the table
+    negative = np.vstack([pickup_cells, [[-3, 0, 0]]])
+    with pytest.raises(ValueError):
+        GroupColumns.from_arrays(pickup_cells=negative, **arrays)
@@ -0,0 +1,59 @@
+import random
+from main import decode_grid_coords, fetch_driver_passengers, calculate_average_coords
+from consolidation import (group_centroids, pairwise_distances, merge_candidates,
+                           merge_clusters, consolidate_payload)
+
+
+def brute_force(pickup_avg, dropoff_avg, threshold):
+    drivers = list(pickup_avg)
+    pairs = []
+    for i, driver in enumerate(drivers):
+        for other in drivers[i + 1:]:
+            distance = sum(abs(a - b) for a, b in zip(pickup_avg[driver] + dropoff_avg[driver],
+                                                      pickup_avg[other] + dropoff_avg[other]))
+            if distance <= threshold:
+                pairs.append((distance, driver, other))
+    position = {driver: index for index, driver in enumerate(drivers)}
+    pairs.sort(key=lambda pair: (pair[0], position[pair[1]], position[pair[2]]))
+    return [(driver, other, distance) for distance, driver, other in pairs]
+
+
+def test_pairwise_distances():
+    drivers, points = group_centroids({5: (0, 0), 7: (3, 4)}, {5: (1, 1), 7: (0, 0)})
+    assert drivers.tolist() == [5, 7], "Failed drivers"
+    assert pairwise_distances(points, points).tolist() == [[0, 9], [9, 0]], "Failed distances"
+
+
+def test_merge_candidates():
+    rng = random.Random(22)
+    pickup_avg = {driver: (rng.randrange(300), rng.randrange(300)) for driver in rng.sample(range(5000), 800)}
+    dropoff_avg = {driver: (rng.randrange(300), rng.randrange(300)) for driver in pickup_avg}
+
+    # Test against a scan of every pair, with tiny blocks and buckets of every size
+    for threshold in (0, 40, 120, 1200):
+        expected = brute_force(pickup_avg, dropoff_avg, threshold)
+        assert merge_candidates(pickup_avg, dropoff_avg, threshold, block_size=7) == expected, \
+            f"Failed candidates with threshold {threshold}"
+
+    # Stacked groups are all candidates of each other
+    stacked = {1: (2, 2), 2: (2, 2), 3: (2, 2)}
+    assert merge_candidates(stacked, stacked, 0) == [(1, 2, 0), (1, 3, 0), (2, 3, 0)], "Failed stacked groups"
+    assert merge_candidates({1: (0, 0)}, {1: (0, 0)}, 10) == [], "Failed single group"
+    assert merge_candidates({}, {}, 10) == [], "Failed no groups"
+
+
+def test_merge_clusters():
+    candidates = [(1, 2, 0), (4, 5, 1), (2, 3, 2), (9, 4, 3)]
+    assert merge_clusters(candidates) == [[1, 2, 3], [4, 5, 9]], "Failed clusters"
+    assert merge_clusters([]) == [], "Failed no candidates"
+
+
+def test_consolidate_payload(data):
+    pickup_avg, dropoff_avg = calculate_average_coords(
+        fetch_driver_passengers(data["requests"]),
+        decode_grid_coords(data["pickupLocations"]),
+        decode_grid_coords(data["dropoffLocations"]))
+
+    candidates, clusters = consolidate_payload(data, 6)
+    assert candidates == brute_force(pickup_avg, dropoff_avg, 6), "Failed payload candidates"
+    assert clusters == merge_clusters(candidates), "Failed payload clusters"
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from main import (fetch_rider_and_driver_coords, fetch_driver_passengers, calculate_average_coords,
+                  build_statistics, encode_grid)
+from dense import DenseCoords, DriverRiders, load_dense_payload, dense_statistics
+
+
+def test_dense_coords(data):
+    expected = fetch_rider_and_driver_coords(data["pickupLocations"])
+    coords = DenseCoords.from_grid(data["pickupLocations"])
+
+    assert coords == expected and len(coords) == len(expected), "Failed to match the dict of coords"
+    assert coords[9] == (9, 1) and isinstance(coords[9][0], int), "Failed lookup"
+    assert 9 in coords and 11 not in coords and -1 not in coords and "9" not in coords, "Failed membership"
+    with pytest.raises(KeyError):
+        coords[0]
+    assert list(coords) == sorted(expected), "Failed iteration in ID order"
+    assert coords.xy.dtype == np.int32, "Failed compact storage"
+
+    # Bulk lookups
+    assert coords.lookup(np.array([9, 1])).tolist() == [[9, 1], [2, 0]], "Failed bulk lookup"
+    with pytest.raises(KeyError):
+        coords.lookup(np.array([9, 42]))
+
+    # Encoded grids and empty grids
+    assert DenseCoords.from_grid(encode_grid(data["pickupLocations"], "rle")) == expected, "Failed rle grid"
+    assert len(DenseCoords.from_grid([])) == 0, "Failed empty grid"
+
+    # Negative IDs would overwrite the users at the end of the table
+    with pytest.raises(ValueError):
+        DenseCoords.from_cells([[1, 0, 0], [-2, 1, 1]])
+
+
+def test_driver_riders(data):
+    expected = fetch_driver_passengers(data["requests"])
+    driver_riders = DriverRiders.from_requests(data["requests"])
+
+    assert driver_riders == expected, "Failed to match the dict of groups"
+    assert list(driver_riders) == list(expected), "Failed order of the drivers"
+    assert driver_riders.offsets.tolist() == [0, 3, 5, 7], "Failed CSR offsets"
+    assert driver_riders[6] == [7, 10] and 2 not in driver_riders, "Failed lookup"
+    with pytest.raises(KeyError):
+        driver_riders[2]
+
+    # Riders keep their request order inside an interleaved group
+    driver_riders = DriverRiders.from_arrays(np.array([3, 1, 3, 1]), np.array([9, 8, 7, 6]),
+                                             np.array([True, True, True, False]))
+    assert dict(driver_riders) == {3: [9, 7], 1: [8]}, "Failed interleaved requests"
+    assert driver_riders.rider_groups().tolist() == [0, 0, 1], "Failed rider groups"
+
+    assert len(DriverRiders.from_requests([])) == 0, "Failed empty requests"
+
+
+def test_existing_callers(data, solution_data_list):
+    driver_riders, pickup, dropoff = load_dense_payload(data)
+
+    # The views stand in for the dictionaries
+    assert calculate_average_coords(driver_riders, pickup, dropoff) == calculate_average_coords(
+        fetch_driver_passengers(data["requests"]),
+        fetch_rider_and_driver_coords(data["pickupLocations"]),
+        fetch_rider_and_driver_coords(data["dropoffLocations"])), "Failed averages"
+    assert build_statistics(driver_riders, pickup, dropoff) == solution_data_list, "Failed statistics"
+
+    assert dense_statistics(driver_riders, pickup, dropoff) == solution_data_list, "Failed dense statistics"
+
+    # Missing users fail like the dictionaries do
+    data["pickupLocations"][1][9] = -1
+    with pytest.raises(KeyError):
+        dense_statistics(*load_dense_payload(data))
@@ -0,0 +1,62 @@
+import random
+import pytest
+from distance_index import DistanceIndex
+
+
+def test_insert_update_remove():
+    index = DistanceIndex()
+    index.insert(5, 2)
+    index.insert(6, 5)
+    index.insert(1, 4)
+    index.insert(7, 4)
+
+    # Ties keep insertion order
+    assert list(index) == [5, 1, 7, 6], "Failed ordering"
+
+    # Test updating and keeping the position among ties
+    index.update(6, 0)
+    index.update(1, 3)
+    index.update(1, 4)
+    assert list(index) == [6, 5, 1, 7], "Failed update"
+
+    # Test removing
+    index.remove(5)
+    assert list(index) == [6, 1, 7] and 5 not in index and len(index) == 3, "Failed remove"
+
+    # Test inserting an indexed driver and removing a missing one
+    with pytest.raises(KeyError):
+        index.insert(6, 1)
+    with pytest.raises(KeyError):
+        index.remove(5)
+
+
+def test_queries():
+    index = DistanceIndex()
+    for driver, distance in [(1, 9), (2, 3), (3, 3), (4, 7), (5, 0)]:
+        index.insert(driver, distance)
+
+    assert index.top_k(3) == [(5, 0), (2, 3), (3, 3)], "Failed top k"
+    assert index.top_k(10) == [(5, 0), (2, 3), (3, 3), (4, 7), (1, 9)], "Failed top k larger than index"
+    assert index.range(3, 7) == [(2, 3), (3, 3), (4, 7)], "Failed range"
+    assert index.range(10, 20) == [], "Failed empty range"
+
+
+def test_matches_sorted():
+    # Small blocks force splits and block removals
+    index = DistanceIndex(load=4)
+    distances = {}
+    rng = random.Random(7)
+    for step in range(2000):
+        driver = rng.randrange(100)
+        action = rng.random()
+        if driver not in index:
+            distances[driver] = rng.randrange(30)
+            index.insert(driver, distances[driver])
+        elif action < 0.5:
+            distances[driver] = rng.randrange(30)
+            index.update(driver, distances[driver])
+        else:
+            del distances[driver]
+            index.remove(driver)
+
+        assert [distances[driver] for driver in index] == sorted(distances.values()), "Index out of order"
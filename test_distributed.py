@@ -0,0 +1,183 @@
+import json
+import socket
+import threading
+import pytest
+from distributed import (split_tiles, tile_partial_sums, send_frame, receive_frame, create_worker, worker_address,
+                         Coordinator, process_and_post_statistics_distributed)
+
+
+@pytest.fixture
+def workers():
+    servers = [create_worker() for _ in range(2)]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield [worker_address(server) for server in servers]
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def dying_worker(received: threading.Event):
+    """
+    Stand-in for a worker that dies after receiving its first tile
+    """
+    listener = socket.create_server(("127.0.0.1", 0))
+
+    def serve():
+        connection, _ = listener.accept()
+        with connection:
+            while receive_frame(connection)["type"] != "tile":
+                pass
+        received.set()
+        listener.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return "127.0.0.1:%d" % listener.getsockname()[1]
+
+
+def rejecting_worker(received: threading.Event):
+    """
+    Stand-in for a worker that answers every tile with an error
+    """
+    listener = socket.create_server(("127.0.0.1", 0))
+
+    def serve():
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except OSError:
+                return
+            with connection:
+                try:
+                    while True:
+                        message = receive_frame(connection)
+                        if message["type"] == "tile":
+                            send_frame(connection, {"type": "error", "message": "MemoryError: "})
+                            received.set()
+                except ConnectionError:
+                    pass
+
+    threading.Thread(target=serve, daemon=True).start()
+    return "127.0.0.1:%d" % listener.getsockname()[1], listener
+
+
+def test_split_tiles():
+    grid = [[row * 10 + column for column in range(5)] for row in range(3)]
+    tiles = split_tiles(grid, 2)
+
+    assert [(row, column) for row, column, _ in tiles] == [(0, 0), (0, 2), (0, 4), (2, 0), (2, 2), (2, 4)], \
+        "Failed tile offsets"
+    assert tiles[2][2] == [[4], [14]] and tiles[4][2] == [[22, 23]], "Failed tile cells"
+
+    # Every cell is in exactly one tile
+    cells = sorted(cell for _, _, rows in tiles for cells in rows for cell in cells)
+    assert cells == sorted(cell for row in grid for cell in row), "Failed tile coverage"
+
+
+def test_tile_partial_sums():
+    rows = [[1, -1, 7],
+            [-1, 2, 3]]
+    # User 7 is not grouped, users 1 and 3 share group 4
+    groups, sums = tile_partial_sums(rows, [1, 2, 3], [4, 0, 4], row_offset=10, column_offset=20)
+
+    assert groups.tolist() == [0, 4], "Failed found groups"
+    assert sums.tolist() == [[21, 11, 1], [20 + 22, 10 + 11, 2]], "Failed tile sums"
+
+    groups, sums = tile_partial_sums(rows, [], [])
+    assert groups.tolist() == [] and sums.shape == (0, 3), "Failed tile without grouped users"
+
+
+def test_frames():
+    left, right = socket.socketpair()
+    with left, right:
+        send_frame(left, {"type": "tile", "rows": [[1, -1]]})
+        send_frame(left, {"type": "stop"})
+        assert receive_frame(right) == {"type": "tile", "rows": [[1, -1]]}, "Failed frame"
+        assert receive_frame(right) == {"type": "stop"}, "Failed second frame"
+        left.close()
+        with pytest.raises(ConnectionError):
+            receive_frame(right)
+
+
+def test_coordinator(workers, data, solution_data_list):
+    for tile_size in (1, 4, 100):
+        coordinator = Coordinator(workers, tile_size)
+        assert coordinator.compute_statistics(data) == solution_data_list, f"Failed tile size {tile_size}"
+        assert coordinator.failed_workers == [], "Failed healthy workers"
+
+    # Tiles are rejected when a grid is not dense
+    encoded = dict(data, pickupLocations={"format": "coo", "entries": []})
+    with pytest.raises(ValueError):
+        Coordinator(workers).compute_statistics(encoded)
+
+
+def test_coordinator_file(workers, data, solution_data_list, tmp_path):
+    path = tmp_path / "payload.json"
+    path.write_text(json.dumps(data))
+    for tile_size in (1, 3, 100):
+        coordinator = Coordinator(workers, tile_size)
+        assert coordinator.compute_statistics_file(str(path), chunk_size=7) == solution_data_list, \
+            f"Failed streamed tile size {tile_size}"
+
+    # Test with an empty payload
+    path.write_text("{}")
+    assert Coordinator(workers).compute_statistics_file(str(path)) is None, "Failed empty payload"
+
+    # Test an encoded grid found while streaming fails the run
+    path.write_text(json.dumps(dict(data, dropoffLocations={"format": "coo", "entries": []})))
+    with pytest.raises(ValueError, match="dense grid"):
+        Coordinator(workers).compute_statistics_file(str(path))
+
+
+def test_worker_failure(data, solution_data_list):
+    received = threading.Event()
+    dead = dying_worker(received)
+
+    # The healthy worker only starts serving once the dying one took a tile
+    server = create_worker()
+    threading.Thread(target=lambda: received.wait(5) and server.serve_forever(), daemon=True).start()
+
+    coordinator = Coordinator([dead, worker_address(server)], tile_size=4, timeout=5)
+    assert coordinator.compute_statistics(data) == solution_data_list, "Failed to reassign the tile"
+    assert coordinator.failed_workers == [dead] and coordinator.reassigned == 1, "Failed failure counters"
+
+    server.shutdown()
+    server.server_close()
+
+    # Nothing is left to reassign to
+    with pytest.raises(ConnectionError):
+        Coordinator([worker_address(server)], timeout=1).compute_statistics(data)
+
+
+def test_worker_error(data, solution_data_list):
+    received = threading.Event()
+    failing, listener = rejecting_worker(received)
+
+    # The error answer drops the worker and its tile goes to the healthy one
+    server = create_worker()
+    threading.Thread(target=lambda: received.wait(5) and server.serve_forever(), daemon=True).start()
+
+    coordinator = Coordinator([failing, worker_address(server)], tile_size=4, timeout=5)
+    assert coordinator.compute_statistics(data) == solution_data_list, "Failed to retry the rejected tile"
+    assert coordinator.failed_workers == [failing] and coordinator.reassigned == 1, "Failed failure counters"
+
+    server.shutdown()
+    server.server_close()
+
+    # A tile rejected by every worker fails the run
+    with pytest.raises(ValueError, match="rejected by every worker"):
+        Coordinator([failing], timeout=5).compute_statistics(data)
+    listener.close()
+
+
+def test_process_and_post_statistics_distributed(requests_mock, workers, data, solution_data_list):
+    url = "https://example.com/api"
+    requests_mock.get(url, json=data)
+    requests_mock.post(url, text="Worked")
+
+    assert process_and_post_statistics_distributed(url, workers, tile_size=8) == solution_data_list, \
+        "Failed distributed statistics"
+    assert requests_mock.last_request.json() == solution_data_list, "Failed POST body"
+
+    requests_mock.get(url, status_code=500, json={})
+    assert process_and_post_statistics_distributed(url, workers) == "Fail to GET data", "Failed GET"
@@ -0,0 +1,30 @@
+import json
+import pytest
+from encoding import get_encoder, encode_statistics, iter_encoded_statistics
+
+
+def test_get_encoder(solution_data_list):
+    # Every encoder produces the same JSON value
+    for name in ("auto", "json", "pretty"):
+        assert json.loads(get_encoder(name)(solution_data_list)) == solution_data_list, f"Failed {name}"
+
+    # Test with an unknown encoder
+    with pytest.raises(ValueError):
+        get_encoder("yaml")
+
+
+def test_encode_statistics(solution_data_list):
+    body = encode_statistics(solution_data_list, "json")
+    assert body == json.dumps(solution_data_list, separators=(",", ":")).encode(), "Failed compact output"
+    assert len(body) < len(encode_statistics(solution_data_list, "pretty")), "Compact output is not smaller"
+
+
+def test_iter_encoded_statistics(solution_data_list):
+    # Test every batch size gives the same body as the single shot encoder
+    for batch_size in (1, 2, 3, 100):
+        chunks = list(iter_encoded_statistics(iter(solution_data_list), "json", batch_size))
+        assert b"".join(chunks) == encode_statistics(solution_data_list, "json"), \
+            f"Failed with batch size {batch_size}"
+
+    # Test with no statistics
+    assert b"".join(iter_encoded_statistics([])) == b"[]", "Failed empty test"
@@ -0,0 +1,85 @@
+import json
+import os
+import random
+from main import fetch_rider_and_driver_coords, fetch_driver_passengers, sort_statistics
+from encoding import encode_statistics, iter_json_array
+from external_sort import ExternalSorter, iter_statistics, write_jsonl, process_and_post_statistics_external
+
+
+def random_entries(count, seed=3):
+    rng = random.Random(seed)
+    # Few distinct distances so most entries tie
+    return [{"driverId": driver, "riderIds": [driver + 1],
+             "averagePickup": {"x": rng.randrange(4), "y": rng.randrange(4)},
+             "averageDropoff": {"x": rng.randrange(4), "y": rng.randrange(4)}} for driver in range(count)]
+
+
+def test_iter_statistics(data, solution_data_list):
+    entries = iter_statistics(fetch_driver_passengers(data["requests"]),
+                              fetch_rider_and_driver_coords(data["pickupLocations"]),
+                              fetch_rider_and_driver_coords(data["dropoffLocations"]))
+    assert sort_statistics(list(entries)) == solution_data_list, "Failed entries of every group"
+
+
+def test_external_sorter(tmp_path):
+    entries = random_entries(2000)
+    expected = [json.dumps(entry, separators=(",", ":")).encode() for entry in sort_statistics(entries)]
+
+    # Test in memory, with spilled runs and with several merge passes
+    for memory_budget, fan_in in ((1 << 30, 64), (20000, 64), (5000, 2)):
+        sorter = ExternalSorter(memory_budget, encoder="json", tmpdir=str(tmp_path), fan_in=fan_in)
+        sorter.extend(entries)
+        spilled = len(sorter.runs)
+        assert len(sorter) == 2000, "Failed entry count"
+        assert list(sorter) == expected, f"Failed order with a budget of {memory_budget}"
+        assert (spilled > 0) == (memory_budget < 1 << 30), "Failed to spill runs"
+        assert os.listdir(tmp_path) == [], "Failed to remove the runs"
+
+    # Test the runs are removed when the output is not read
+    with ExternalSorter(5000, encoder="json", tmpdir=str(tmp_path)) as sorter:
+        sorter.extend(entries)
+        assert os.listdir(tmp_path), "Failed to spill runs"
+    assert os.listdir(tmp_path) == [], "Failed to remove unread runs"
+
+    with ExternalSorter() as sorter:
+        assert list(sorter) == [] and b"".join(iter_json_array(sorter)) == b"[]", "Failed empty sorter"
+
+
+def test_write_jsonl(tmp_path):
+    entries = random_entries(50)
+    sorter = ExternalSorter(2000, encoder="json", tmpdir=str(tmp_path))
+    sorter.extend(entries)
+
+    path = tmp_path / "sorted.jsonl"
+    assert write_jsonl(sorter, str(path)) == 50, "Failed count of written entries"
+    with open(path) as file:
+        assert [json.loads(line) for line in file] == sort_statistics(entries), "Failed JSON lines output"
+
+
+def test_process_and_post_statistics_external(requests_mock, data, solution_data_list, tmp_path):
+    bodies = []
+
+    def receive(request, context):
+        # The body is streamed, read it while the POST is being sent
+        bodies.append(b"".join(request.body))
+        return "Worked"
+
+    requests_mock.get("http://sandboxcarpool.com/data", json=data, status_code=200)
+    requests_mock.post("http://sandboxcarpool.com/data", text=receive)
+
+    # A tiny budget spills every group to its own run
+    count = process_and_post_statistics_external("http://sandboxcarpool.com/data", memory_budget=1,
+                                                 encoder="json", tmpdir=str(tmp_path))
+    assert count == 3, "Failed entry count"
+    assert bodies[0] == encode_statistics(solution_data_list, "json"), "Failed streamed POST body"
+    assert os.listdir(tmp_path) == [], "Failed to remove the runs"
+
+    # Test the JSON lines output does not POST
+    output = tmp_path / "stats.jsonl"
+    assert process_and_post_statistics_external("http://sandboxcarpool.com/data", output=str(output)) == 3
+    with open(output) as file:
+        assert [json.loads(line) for line in file] == solution_data_list, "Failed JSON lines output"
+    assert len(bodies) == 1, "Failed to skip the POST"
+
+    requests_mock.get("http://sandboxcarpool.com/data", json={}, status_code=200)
+    assert process_and_post_statistics_external("http://sandboxcarpool.com/data") == "Fail to GET data"
@@ -0,0 +1,91 @@
+import json
+import pytest
+from main import calculate_average_coords, fetch_driver_passengers, build_statistics, encode_grid
+from group_stats import GroupStats
+
+
+def rebuilt(stats):
+    # Recompute the averages from scratch
+    driver_passengers = {driver: stats.riders(driver) for driver in stats.drivers()}
+    return calculate_average_coords(driver_passengers, stats.pickup_coords, stats.dropoff_coords)
+
+
+def test_from_payload(data):
+    stats = GroupStats.from_payload(data)
+    driver_passengers = fetch_driver_passengers(data["requests"])
+
+    assert stats.drivers() == list(driver_passengers), "Failed group order"
+    assert stats.averages() == rebuilt(stats), "Failed initial averages"
+    expected = build_statistics(driver_passengers, stats.pickup_coords, stats.dropoff_coords)
+    assert {entry["driverId"]: entry for entry in stats.entries()} == \
+        {entry["driverId"]: entry for entry in expected}, "Failed entries"
+
+    # Test with encoded grids
+    encoded = dict(data, pickupLocations=encode_grid(data["pickupLocations"], "rle"),
+                   dropoffLocations=encode_grid(data["dropoffLocations"], "coo"))
+    assert GroupStats.from_payload(encoded).entries() == stats.entries(), "Failed encoded grids"
+
+
+def test_accept_and_revoke():
+    stats = GroupStats({5: [3, 4]},
+                       {3: (12, 13), 4: (2, 9), 5: (13, 7), 8: (1, 1), 9: (0, 4)},
+                       {3: (13, 1), 4: (3, 11), 5: (11, 10), 8: (2, 2), 9: (6, 6)})
+
+    # Test adding a rider to an existing group
+    stats.accept(5, 8)
+    assert stats.riders(5) == [3, 4, 8], "Failed to add rider"
+    assert stats.averages() == rebuilt(stats), "Failed accept"
+
+    # Test removing a rider
+    stats.revoke(5, 3)
+    assert stats.average(5) == ((5, 5), (5, 7)), "Failed revoke"
+    assert stats.driver_of(3) is None, "Failed to release rider"
+
+    # Test a new group and dropping it once it has no riders
+    stats.accept(3, 9)
+    assert 3 in stats and stats.averages() == rebuilt(stats), "Failed new group"
+    stats.revoke(3, 9)
+    assert 3 not in stats and len(stats) == 1, "Failed to drop empty group"
+
+    # Test a rider accepted by two drivers
+    with pytest.raises(ValueError):
+        stats.accept(9, 4)
+
+    # Test revoking a request that was never accepted
+    with pytest.raises(KeyError):
+        stats.revoke(5, 9)
+
+    # Test a user without a location
+    with pytest.raises(KeyError):
+        stats.accept(5, 42)
+    assert stats.riders(5) == [4, 8], "Failed accept left the group modified"
+
+
+def test_move(data):
+    stats = GroupStats.from_payload(data)
+
+    # Test moving a rider, a driver and an ungrouped user
+    stats.move_pickup(3, (0, 0))
+    stats.move_dropoff(5, (14, 14))
+    stats.move_pickup(1, (7, 3))
+    stats.move_dropoff(2, (0, 14))
+    assert stats.pickup_coords[3] == (0, 0), "Failed to move pickup"
+    assert stats.averages() == rebuilt(stats), "Failed averages after moves"
+
+
+def test_sorted_entries(data):
+    stats = GroupStats.from_payload(data)
+    with open("test_solution.json", "r") as solution:
+        assert stats.sorted_entries() == json.load(solution), "Sorted groups stats does not match expected"
+
+    # Test the order follows updates
+    stats.move_pickup(1, (13, 11))
+    driver_passengers = {driver: stats.riders(driver) for driver in stats.drivers()}
+    assert stats.sorted_entries() == build_statistics(
+        driver_passengers, stats.pickup_coords, stats.dropoff_coords), "Failed order after update"
+
+    # Test top k and range queries
+    assert stats.top_k(1) == stats.sorted_entries()[:1], "Failed top k"
+    limit = stats.distance(5)
+    assert stats.within(0, limit) == [entry for entry in stats.sorted_entries()
+                                      if stats.distance(entry["driverId"]) <= limit], "Failed range"
@@ -0,0 +1,106 @@
+import gzip
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+import http_compression
+from http_compression import available_codecs, accept_encoding, compress_chunks, decompress_chunks
+from main import build_statistics, process_and_post_statistics
+from streaming import fetch_payload_stream
+
+
+@pytest.fixture
+def gzip_server(data):
+    """
+    Local stand-in for the API that gzips the GET body when asked and
+    records the decompressed POST body
+    """
+    requests_seen = []
+    body = json.dumps(data).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests_seen.append(dict(self.headers))
+            payload = body
+            self.send_response(200)
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                payload = gzip.compress(body)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            # Chunked transfer encoding of a streamed body
+            raw = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                raw += self.rfile.read(size)
+                self.rfile.readline()
+                if size == 0:
+                    break
+            requests_seen.append({"headers": dict(self.headers), "body": gzip.decompress(raw)})
+            self.send_response(200)
+            self.send_header("Content-Length", "6")
+            self.end_headers()
+            self.wfile.write(b"Worked")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/data", requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+def test_compress_chunks(data):
+    body = json.dumps(data).encode()
+
+    for codec in available_codecs():
+        # Test whole and chunked bodies round trip
+        compressed = list(compress_chunks(body, codec))
+        assert b"".join(decompress_chunks(compressed, codec)) == body, f"Failed {codec} round trip"
+
+        pieces = [body[start:start + 100] for start in range(0, len(body), 100)]
+        compressed = b"".join(compress_chunks(iter(pieces), codec))
+        assert len(compressed) < len(body) // 5, f"{codec} did not compress the sparse grids"
+
+        # Test decompressing one byte at a time
+        split = [compressed[index:index + 1] for index in range(len(compressed))]
+        assert b"".join(decompress_chunks(split, codec)) == body, f"Failed {codec} byte stream"
+
+    assert gzip.decompress(b"".join(compress_chunks(body))) == body, "Output is not gzip"
+    assert "gzip" in accept_encoding().split(", ")
+
+    # Test with an unknown codec
+    with pytest.raises(ValueError):
+        list(compress_chunks(body, "lzma"))
+
+
+def test_accept_encoding(monkeypatch):
+    # zstd is only asked for when urllib3 can decode the response
+    monkeypatch.setattr(http_compression, "RESPONSE_ZSTD", False)
+    assert accept_encoding() == "gzip", "Failed without urllib3 zstd"
+    monkeypatch.setattr(http_compression, "RESPONSE_ZSTD", True)
+    assert accept_encoding() == "zstd, gzip", "Failed with urllib3 zstd"
+
+
+def test_compressed_transport(gzip_server, solution_data_list):
+    url, requests_seen = gzip_server
+
+    assert process_and_post_statistics(url, compression="gzip") == solution_data_list, \
+        "Sorted groups stats does not match expected"
+
+    get, post = requests_seen
+    assert "gzip" in get["Accept-Encoding"], "GET did not ask for gzip"
+    assert post["headers"]["Content-Encoding"] == "gzip", "POST body is not marked as gzip"
+    assert json.loads(post["body"]) == solution_data_list, "Failed compressed POST body"
+
+    # Test streaming decompression of the GET while parsing
+    payload = fetch_payload_stream(url, chunk_size=32, compressed=True)
+    assert build_statistics(*payload) == solution_data_list, "Failed streamed compressed GET"
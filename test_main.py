@@ -1,15 +1,10 @@
 import json
 import pytest
-from main import (manhattan_distance, fetch_rider_and_driver_coords,
+from main import (manhattan_distance, fetch_rider_and_driver_coords, fetch_sparse_coords,
+                  fetch_rle_coords, decode_grid_coords, decode_grid_cells, encode_grid, compute_statistics,
                   fetch_driver_passengers, create_entry, calculate_coord_total,
                   calculate_average_coords, fetch_response, post_response, process_and_post_statistics)
-
-
-@pytest.fixture
-def data():
-    with open("test_data.json", "r") as file:
-        data = json.load(file)
-    return data
+from metrics import MetricsCollector
 
 
 @pytest.fixture
@@ -19,12 +14,6 @@ def solution_data_str():
     return json.dumps(data)
 
 
-@pytest.fixture
-def solution_data_list():
-    with open("test_solution.json", "r") as data:
-        return json.load(data)
-
-
 def test_manhattan_distance():
     # Test with positive coords
     assert manhattan_distance((1, 4), (3, 7)) == 7, "Failed positive coords"
@@ -63,6 +52,81 @@ def test_fetch_rider_and_driver_coords(data):
     assert fetch_rider_and_driver_coords(
         {}) == {}, "Expected empty input to return empty coordinates"
 
+    # Test with a rectangular grid (more columns than rows)
+    assert fetch_rider_and_driver_coords([
+        [-1, -1, -1, -1, 4],
+        [-1, 2, -1, -1, -1]
+    ]) == {4: (4, 0), 2: (1, 1)}, "Failed rectangular grid (wide)"
+
+    # Test with a rectangular grid (more rows than columns)
+    assert fetch_rider_and_driver_coords([
+        [-1, -1],
+        [-1, -1],
+        [3, -1],
+        [-1, 7]
+    ]) == {3: (0, 2), 7: (1, 3)}, "Failed rectangular grid (tall)"
+
+
+def test_fetch_sparse_coords(data):
+    # Build the sparse form from the dense sample grid
+    entries = [(user_id, x, y) for y, row in enumerate(data["pickupLocations"])
+               for x, user_id in enumerate(row) if user_id != -1]
+
+    # Test sparse input matches the dense grid scan
+    assert fetch_sparse_coords(entries) == fetch_rider_and_driver_coords(
+        data["pickupLocations"]), "Sparse coordinates do not match dense coordinates"
+
+    # Test with empty input
+    assert fetch_sparse_coords([]) == {}, "Expected empty input to return empty coordinates"
+
+
+def test_fetch_rle_coords():
+    rows = [
+        [[1, 1], [-1, 4]],
+        [[-1, 5]],
+        [[-1, 3], [2, 1], [-1, 1]]
+    ]
+
+    # Test the example from the docstring
+    assert fetch_rle_coords(rows) == {1: (0, 0), 2: (3, 2)}, "Failed run-length encoded rows"
+
+    # Test with empty input
+    assert fetch_rle_coords([]) == {}, "Expected empty input to return empty coordinates"
+
+    # Test a user run covering more than one cell
+    with pytest.raises(ValueError):
+        fetch_rle_coords([[[-1, 2], [7, 3]]])
+
+
+def test_decode_grid_coords(data, solution_data_list):
+    expected = fetch_rider_and_driver_coords(data["pickupLocations"])
+
+    # Test every encoding decodes to the same coordinates
+    assert decode_grid_coords(data["pickupLocations"]) == expected, "Failed dense grid"
+    for grid_format in ("coo", "rle"):
+        encoded = encode_grid(data["pickupLocations"], grid_format)
+        assert (encoded["width"], encoded["height"]) == (15, 15), f"Failed {grid_format} size"
+        assert decode_grid_coords(encoded) == expected, f"Failed {grid_format} grid"
+
+    # Test a payload mixing encodings
+    mixed = dict(data, pickupLocations=encode_grid(data["pickupLocations"], "rle"),
+                 dropoffLocations=encode_grid(data["dropoffLocations"], "coo"))
+    assert compute_statistics(mixed) == solution_data_list, "Failed payload with encoded grids"
+
+    # Test the cells of every encoding match the dense scan
+    cells = decode_grid_cells(data["pickupLocations"]).tolist()
+    for grid_format in ("coo", "rle"):
+        encoded = encode_grid(data["pickupLocations"], grid_format)
+        assert decode_grid_cells(encoded).tolist() == cells, f"Failed {grid_format} cells"
+
+    # Test with empty input and an unknown format
+    assert decode_grid_cells({}).shape == (0, 3), "Failed empty cells"
+    assert decode_grid_coords({}) == {} and decode_grid_coords([]) == {}, "Failed empty test"
+    with pytest.raises(ValueError):
+        decode_grid_coords({"format": "bitmap"})
+    with pytest.raises(ValueError):
+        encode_grid(data["pickupLocations"], "bitmap")
+
 
 def test_fetch_driver_passengers(data):
 
@@ -236,3 +300,37 @@ def test_process_and_post_statistics(requests_mock, data, solution_data_str, sol
     # Test if the data fetching via, therefore short circuiting occurs
     assert process_and_post_statistics(
         "http://sandboxcarpool.com/dataempty") == "Fail to GET data"
+
+
+def test_process_and_post_statistics_body(requests_mock, data, solution_data_list):
+    requests_mock.get("http://sandboxcarpool.com/data",
+                      json=data, status_code=200)
+    requests_mock.post("http://sandboxcarpool.com/data", text="Worked")
+
+    # Test the POST body is compact JSON
+    process_and_post_statistics("http://sandboxcarpool.com/data", encoder="json")
+    body = requests_mock.last_request.body
+    assert json.loads(body) == solution_data_list and b"\n" not in body, "Failed compact POST body"
+
+    # Test the POST body can be streamed
+    process_and_post_statistics("http://sandboxcarpool.com/data", stream=True)
+    body = b"".join(requests_mock.last_request.body)
+    assert json.loads(body) == solution_data_list, "Failed streamed POST body"
+
+
+def test_process_and_post_statistics_metrics(requests_mock, data, solution_data_list):
+    requests_mock.get("http://sandboxcarpool.com/data",
+                      json=data, status_code=200)
+    requests_mock.post("http://sandboxcarpool.com/data", text="Worked")
+
+    metrics = MetricsCollector()
+    assert process_and_post_statistics(
+        "http://sandboxcarpool.com/data", metrics=metrics) == solution_data_list
+
+    # Test every stage is recorded in order with its item counts
+    stages = {record["stage"]: record for record in metrics.records}
+    assert list(stages) == ["get", "grouping", "pickup_grid", "dropoff_grid",
+                            "averaging", "sort", "serialize", "post"], "Failed stage order"
+    assert stages["pickup_grid"]["counts"] == {"cells_scanned": 225, "users_found": 10}
+    assert stages["grouping"]["counts"]["groups"] == 3, "Failed group count"
+    assert stages["serialize"]["counts"]["payload_bytes"] == len(requests_mock.last_request.body)
@@ -0,0 +1,93 @@
+import random
+from main import manhattan_distance, build_statistics, fetch_rider_and_driver_coords
+from matching import KDTreeIndex, match_riders, unassigned_riders, match_payload
+
+
+def distance(a, b):
+    return manhattan_distance((a[0], b[0]), (a[1], b[1]))
+
+
+def test_kd_tree_index():
+    rng = random.Random(11)
+    points = {driver: tuple(rng.randrange(200) for _ in range(4)) for driver in range(300)}
+
+    for leaf_size in (1, 8, 500):
+        index = KDTreeIndex(points, leaf_size)
+
+        # Test against a scan of every driver
+        for _ in range(50):
+            point = tuple(rng.randrange(-20, 220) for _ in range(4))
+            expected = min(points, key=lambda driver: (
+                distance(point, points[driver]) + distance(point[2:], points[driver][2:]), driver))
+            assert index.nearest(point) == expected, f"Failed nearest with leaf size {leaf_size}"
+
+    # Test removal and the pickup distance limit
+    index = KDTreeIndex({1: (0, 0, 0, 0), 2: (10, 10, 0, 0)}, 1)
+    index.remove(1)
+    assert index.nearest((0, 0, 0, 0)) == 2 and 1 not in index, "Failed remove"
+    assert index.nearest((0, 0, 50, 50), max_distance=19) is None, "Failed distance limit"
+    assert index.nearest((0, 0, 50, 50), max_distance=20) == 2, "Failed distance limit"
+    index.remove(2)
+    assert index.nearest((0, 0, 0, 0)) is None and len(index) == 0, "Failed empty index"
+
+
+def test_match_riders():
+    pickup_coords = {1: (0, 0), 2: (9, 9), 5: (1, 0), 6: (8, 9), 7: (0, 1)}
+    dropoff_coords = {1: (5, 5), 2: (0, 0), 5: (5, 6), 6: (1, 1), 7: (5, 5)}
+
+    # Test the example from the docstring
+    assert match_riders([5, 6], [1, 2], pickup_coords, dropoff_coords, capacity=1) == ({5: 1, 6: 2}, [])
+
+    # Test capacity sends the next rider to the other driver
+    assert match_riders([5, 7, 6], [1, 2], pickup_coords, dropoff_coords, capacity=1) == \
+        ({5: 1, 7: 2}, [6]), "Failed capacity"
+
+    # Test seats already taken, the distance limit and riders without a location
+    assert match_riders([5, 42], [1, 2], pickup_coords, dropoff_coords, capacity={1: 1, 2: 1},
+                        seats_taken={1: 1}, max_distance=5) == ({}, [5, 42]), "Failed limits"
+
+
+def test_match_riders_against_all_pairs():
+    rng = random.Random(5)
+    pickup = {user: (rng.randrange(100), rng.randrange(100)) for user in range(400)}
+    dropoff = {user: (rng.randrange(100), rng.randrange(100)) for user in range(400)}
+    drivers, riders = list(range(40)), list(range(40, 400))
+
+    assignments, unmatched = match_riders(riders, drivers, pickup, dropoff, capacity=3)
+
+    # Greedy all-pairs reference
+    seats = {driver: 3 for driver in drivers}
+    expected = {}
+    for rider in riders:
+        open_drivers = [driver for driver in drivers if seats[driver]]
+        if not open_drivers:
+            break
+        best = min(open_drivers, key=lambda driver: (
+            distance(pickup[rider], pickup[driver]) + distance(dropoff[rider], dropoff[driver]), driver))
+        expected[rider] = best
+        seats[best] -= 1
+
+    assert assignments == expected, "Failed to match the all-pairs scan"
+    assert unmatched == riders[len(expected):], "Failed unmatched riders"
+
+
+def test_match_payload(data):
+    # Reject every request of rider 10
+    rejected = dict(data, requests=[dict(request, accepted=request["accepted"] and request["rider"] != 10)
+                                    for request in data["requests"]])
+    assert unassigned_riders(rejected) == [10], "Failed unassigned riders"
+
+    # Driver 5 is the closest (pickup 3 + 2, dropoff 6 + 1)
+    driver_passengers, unmatched = match_payload(rejected, capacity=3)
+    assert unmatched == [] and driver_passengers[5] == [3, 4, 10], "Failed to regroup rider 10"
+    stats = build_statistics(driver_passengers, fetch_rider_and_driver_coords(data["pickupLocations"]),
+                             fetch_rider_and_driver_coords(data["dropoffLocations"]))
+    assert len(stats) == 3, "Failed statistics of the matched groups"
+
+    # Test the next closest driver once driver 5 is full
+    driver_passengers, unmatched = match_payload(rejected, capacity=2)
+    assert unmatched == [] and driver_passengers[6] == [7, 10], "Failed with a full driver"
+
+    # Test every driver full leaves the rider unmatched
+    driver_passengers, unmatched = match_payload(rejected, capacity=1)
+    assert unmatched == [10], "Failed with full drivers"
@@ -0,0 +1,44 @@
+import json
+import pytest
+from metrics import MetricsCollector, NULL_METRICS
+
+
+def test_stage_records():
+    forwarded = []
+    metrics = MetricsCollector(hooks=[forwarded.append])
+
+    with metrics.stage("scan") as stage:
+        cells = [[-1] * 100 for _ in range(100)]
+        stage.count(cells_scanned=10000, users_found=0)
+
+    record = metrics.records[0]
+    assert record["stage"] == "scan" and record["counts"] == {"cells_scanned": 10000, "users_found": 0}
+    assert record["wall_seconds"] >= 0 and record["cpu_seconds"] >= 0, "Failed timings"
+    assert record["net_blocks"] > 0 and cells, "Failed net block count"
+    assert forwarded == [record], "Hook did not receive the record"
+    assert json.loads(metrics.to_json()) == metrics.records, "Failed JSON export"
+
+    # Test freeing more than the stage keeps gives a negative net count
+    with metrics.stage("free"):
+        del cells
+    assert metrics.records[-1]["net_blocks"] < 0, "Failed net block count of a freeing stage"
+
+    # Test a failing stage is still recorded
+    with pytest.raises(KeyError):
+        with metrics.stage("scan"):
+            {}["missing"]
+    assert metrics.records[-1]["failed"] is True, "Failed stage not flagged"
+
+    totals = metrics.totals()["scan"]
+    assert totals["calls"] == 2 and totals["counts"]["cells_scanned"] == 10000, "Failed totals"
+
+    metrics.clear()
+    assert metrics.records == [], "Failed clear"
+
+
+def test_null_metrics():
+    # Disabled metrics hand out one shared no-op stage
+    stage = NULL_METRICS.stage("scan")
+    assert stage is NULL_METRICS.stage("sort"), "Null stage is not shared"
+    with stage as entered:
+        entered.count(users_found=3)
@@ -0,0 +1,51 @@
+import pytest
+from main import fetch_driver_passengers, compute_statistics, encode_grid
+from parallel import (group_lookup, band_partial_sums, merge_partial_sums, statistics_from_sums,
+                      split_rows, compute_statistics_banded, process_payloads)
+
+
+def test_split_rows():
+    grid = [[n] for n in range(5)]
+    assert split_rows(grid, 2) == [(0, [[0], [1], [2]]), (3, [[3], [4]])], "Failed two bands"
+    assert split_rows(grid, 10) == [(n, [[n]]) for n in range(5)], "Failed more bands than rows"
+    assert split_rows([], 3) == [], "Failed empty grid"
+
+    # Encoded grids have no rows to split
+    with pytest.raises(ValueError):
+        split_rows({"format": "coo", "entries": [[1, 0, 0]]}, 2)
+
+
+def test_band_partial_sums(data, solution_data_list):
+    driver_passengers = fetch_driver_passengers(data["requests"])
+    group_of = group_lookup(driver_passengers)
+    groups = len(driver_passengers)
+
+    # Partial sums of every band merge into the sums of the whole grid
+    sums = {}
+    for key in ("pickupLocations", "dropoffLocations"):
+        whole = band_partial_sums(data[key], group_of, groups)
+        bands = [band_partial_sums(band, group_of, groups, offset) for offset, band in split_rows(data[key], 4)]
+        sums[key] = merge_partial_sums(bands, groups)
+        assert (sums[key] == whole).all(), f"Failed merging bands of {key}"
+
+    assert statistics_from_sums(driver_passengers, sums["pickupLocations"],
+                                sums["dropoffLocations"]) == solution_data_list, "Failed statistics from sums"
+
+    # Test a user missing from a grid
+    with pytest.raises(KeyError):
+        statistics_from_sums(driver_passengers, sums["pickupLocations"] * 0, sums["dropoffLocations"])
+
+
+def test_compute_statistics_banded(data, solution_data_list):
+    assert compute_statistics_banded(data, bands=4, workers=2) == solution_data_list, \
+        "Sorted groups stats does not match expected"
+
+    # Test with encoded grids next to a dense one
+    encoded = dict(data, pickupLocations=encode_grid(data["pickupLocations"], "rle"))
+    assert compute_statistics_banded(encoded, bands=4, workers=2) == solution_data_list, "Failed encoded grid"
+
+
+def test_process_payloads(data, solution_data_list):
+    rejected = dict(data, requests=data["requests"][:3])
+    assert process_payloads([data, rejected], workers=2) == [
+        solution_data_list, compute_statistics(rejected)], "Failed batch of payloads"
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+import pipeline
+from main import fetch_response, post_response
+from pipeline import create_session, process_and_post_statistics_many
+
+
+@pytest.fixture
+def shard_server(data):
+    """
+    Local stand-in for the API, every /shard/<n> and /drop/<n> path serves the sample data,
+    /missing/<n> answers 404 and a POST to /drop/<n> is dropped without an answer
+    """
+    posted = {}
+    clients = set()
+    body = json.dumps(data).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, payload):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            clients.add(self.client_address)
+            if self.path.startswith(("/shard/", "/drop/")):
+                self._reply(200, body)
+            else:
+                self._reply(404, b"{}")
+
+        def do_POST(self):
+            clients.add(self.client_address)
+            if self.path.startswith("/drop/"):
+                # Hang up without answering, the client sees a connection error
+                self.close_connection = True
+                return
+            length = int(self.headers["Content-Length"])
+            posted[self.path] = json.loads(self.rfile.read(length))
+            self._reply(200, b"Worked")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", posted, clients
+    server.shutdown()
+    server.server_close()
+
+
+def test_create_session():
+    session = create_session(4)
+    assert session.get_adapter("http://example.com")._pool_maxsize == 4, "Failed pool size"
+    session.close()
+
+
+def test_process_and_post_statistics_many(shard_server, solution_data_list):
+    base, posted, clients = shard_server
+    urls = [f"{base}/shard/{n}" for n in range(12)] + [f"{base}/missing/0"]
+
+    results = asyncio.run(process_and_post_statistics_many(urls, concurrency=3))
+
+    # Test results come back in order, the failed shard short circuits
+    assert results[:-1] == [solution_data_list] * 12, "Sorted groups stats does not match expected"
+    assert results[-1] == "Fail to GET data", "Failed to short circuit"
+
+    # Test every shard posted its statistics
+    assert posted == {f"/shard/{n}": solution_data_list for n in range(12)}, "Failed POST"
+
+    # Test connections were reused instead of opened per request
+    assert len(clients) <= 3, "Failed to reuse pooled connections"
+
+    # Test with no urls
+    assert asyncio.run(process_and_post_statistics_many([])) == [], "Failed empty test"
+
+
+def test_many_in_flight(shard_server, solution_data_list, monkeypatch):
+    base, posted, clients = shard_server
+    lock = threading.Lock()
+    counts = {"now": 0, "most": 0}
+
+    def track(change):
+        with lock:
+            counts["now"] += change
+            counts["most"] = max(counts["most"], counts["now"])
+
+    def fetch(url, session=None):
+        # A shard is in flight from its GET until its POST is answered
+        track(1)
+        data = fetch_response(url, session)
+        if data is None:
+            track(-1)
+        return data
+
+    def post(url, body, session=None):
+        try:
+            return post_response(url, body, session)
+        finally:
+            track(-1)
+
+    monkeypatch.setattr(pipeline, "fetch_response", fetch)
+    monkeypatch.setattr(pipeline, "post_response", post)
+
+    urls = [f"{base}/shard/{n}" for n in range(16)]
+    results = asyncio.run(process_and_post_statistics_many(urls, concurrency=2))
+
+    assert results == [solution_data_list] * 16, "Sorted groups stats does not match expected"
+    assert counts == {"now": 0, "most": 2}, "Failed to bound the shards in flight"
+
+
+def test_many_post_failure(shard_server, solution_data_list):
+    base, posted, clients = shard_server
+    urls = [f"{base}/shard/0", f"{base}/drop/0", f"{base}/shard/1"]
+
+    results = asyncio.run(process_and_post_statistics_many(urls, concurrency=3))
+
+    # Test the failed POST does not lose the statistics of the other shards
+    assert results == [solution_data_list, "Fail to POST data", solution_data_list], "Failed POST failure"
+    assert posted == {f"/shard/{n}": solution_data_list for n in range(2)}, "Failed POST"
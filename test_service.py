@@ -0,0 +1,143 @@
+import gzip
+import json
+import socket
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+import requests
+from service import LatencyRecorder, StatisticsService, create_server
+
+
+@pytest.fixture
+def api_server(data):
+    """
+    Local stand-in for the API, /data serves the sample data and records the POSTs
+    """
+    posted = []
+    body = json.dumps(data).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, payload):
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            found = self.path.startswith("/data")
+            self._reply(200 if found else 404, body if found else b"{}")
+
+        def do_POST(self):
+            if self.path.endswith("?drop"):
+                self.close_connection = True
+                return
+            posted.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self._reply(200, b"Worked")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", posted
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def service():
+    service = StatisticsService(workers=2, encoder="json")
+    server = create_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", service
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def test_latency_recorder():
+    recorder = LatencyRecorder(window=100)
+    for millisecond in range(1, 201):
+        recorder.record("statistics", millisecond / 1000)
+
+    # Only the latest 100 samples (101 to 200 ms) are kept, the count is total
+    report = recorder.percentiles()["statistics"]
+    assert report["count"] == 200, "Failed request count"
+    assert (round(report["p50_ms"]), round(report["p90_ms"]), round(report["p99_ms"]),
+            round(report["max_ms"])) == (150, 190, 199, 200), "Failed percentiles"
+    assert LatencyRecorder().percentiles() == {}, "Failed empty recorder"
+
+
+def test_statistics_route(service, data, solution_data_list):
+    base, state = service
+    body = json.dumps(data).encode()
+
+    with requests.Session() as client:
+        assert client.post(f"{base}/statistics", data=body).json() == solution_data_list, "Failed statistics"
+
+        # The same payload is served from the cache, compressed bodies are accepted
+        response = client.post(f"{base}/statistics", data=gzip.compress(body),
+                               headers={"Content-Encoding": "gzip"})
+        assert response.json() == solution_data_list, "Failed compressed payload"
+
+        assert client.post(f"{base}/statistics", data=b"{not json").status_code == 400, "Failed bad JSON"
+        response = client.post(f"{base}/statistics", data=b"not gzip at all", headers={"Content-Encoding": "gzip"})
+        assert response.status_code == 400 and "Corrupt gzip" in response.json()["error"], "Failed corrupt body"
+        assert client.post(f"{base}/statistics", data=b'{"requests": []}').status_code == 400, "Failed bad payload"
+        assert client.get(f"{base}/unknown").status_code == 404, "Failed unknown route"
+
+        status = client.get(f"{base}/status").json()
+
+    assert status["workers"] == 2, "Failed worker count"
+    assert status["cache"]["hits"] == 1 and status["cache"]["size"] == 1, "Failed warm cache"
+    assert status["latency"]["statistics"]["count"] == 5, "Failed latency count"
+    assert status["latency"]["statistics"]["p50_ms"] <= status["latency"]["statistics"]["max_ms"]
+
+
+def test_process_route(service, api_server, solution_data_list):
+    base, state = service
+    api, posted = api_server
+
+    with requests.Session() as client:
+        for _ in range(2):
+            response = client.post(f"{base}/process", json={"url": f"{api}/data"})
+            assert response.json() == {"url": f"{api}/data", "result": solution_data_list}, "Failed process"
+
+        # The second run was not re-posted
+        assert posted == [solution_data_list], "Failed to skip the duplicate POST"
+
+        response = client.post(f"{base}/process", json={"url": f"{api}/missing"})
+        assert response.status_code == 502 and response.json()["result"] == "Fail to GET data"
+
+        # The API drops the connection of the POST
+        response = client.post(f"{base}/process", json={"url": f"{api}/data?drop"})
+        assert response.status_code == 502 and "ConnectionError" in response.json()["error"], \
+            "Failed upstream error"
+
+    assert state.processor.counters()["posts_skipped"] == 1, "Failed warm processor"
+
+
+def test_unix_socket(tmp_path, data, solution_data_list):
+    path = str(tmp_path / "service.sock")
+    service = StatisticsService(workers=1, encoder="json")
+    server = create_server(service, unix_socket=path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    body = json.dumps(data).encode()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall(b"POST /statistics HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+                       + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        response = b""
+        while chunk := client.recv(65536):
+            response += chunk
+
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+    head, _, payload = response.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200"), "Failed status over the Unix socket"
+    assert json.loads(payload) == solution_data_list, "Failed statistics over the Unix socket"
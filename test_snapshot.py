@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from main import fetch_sparse_coords, fetch_rider_and_driver_coords, encode_grid
+from snapshot import write_snapshot, convert_json_snapshot, read_snapshot, snapshot_statistics
+
+
+def test_read_snapshot(tmp_path, data):
+    path = tmp_path / "payload.snap"
+    write_snapshot(data, path)
+    snapshot = read_snapshot(path)
+
+    # Test the grids round trip as sparse cells
+    assert fetch_sparse_coords(snapshot.pickup_cells.tolist()) == fetch_rider_and_driver_coords(
+        data["pickupLocations"]), "Failed pickup cells"
+    assert fetch_sparse_coords(snapshot.dropoff_cells.tolist()) == fetch_rider_and_driver_coords(
+        data["dropoffLocations"]), "Failed dropoff cells"
+    assert (snapshot.width, snapshot.height) == (15, 15), "Failed grid size"
+
+    # Test the requests round trip as packed records
+    assert snapshot.requests.dtype.itemsize == 9, "Requests are not packed"
+    assert [{"rider": int(rider), "driver": int(driver), "accepted": bool(accepted)}
+            for driver, rider, accepted in snapshot.requests] == data["requests"], "Failed requests"
+    assert isinstance(snapshot.pickup_cells, np.memmap), "Cells are not memory-mapped"
+
+    # Test with a file that is not a snapshot
+    other = tmp_path / "other.snap"
+    other.write_bytes(b"not a snapshot at all, just bytes")
+    with pytest.raises(ValueError):
+        read_snapshot(other)
+
+
+def test_snapshot_statistics(tmp_path, solution_data_list):
+    path = tmp_path / "payload.snap"
+    convert_json_snapshot("test_data.json", path)
+    assert snapshot_statistics(path) == solution_data_list, "Sorted groups stats does not match expected"
+
+    # Test with an empty payload
+    write_snapshot({"requests": [], "pickupLocations": [], "dropoffLocations": []}, path)
+    assert snapshot_statistics(path) == [], "Failed empty test"
+
+
+def test_snapshot_missing_rider(tmp_path, data):
+    # Remove an accepted rider from the pickup grid
+    rider = next(request["rider"] for request in data["requests"] if request["accepted"])
+    data["pickupLocations"] = [[-1 if cell == rider else cell for cell in row] for row in data["pickupLocations"]]
+
+    path = tmp_path / "payload.snap"
+    write_snapshot(data, path)
+    with pytest.raises(KeyError):
+        snapshot_statistics(path)
+
+
+def test_snapshot_encoded_grids(tmp_path, data, solution_data_list):
+    encoded = dict(data, pickupLocations=encode_grid(data["pickupLocations"], "rle"),
+                   dropoffLocations=encode_grid(data["dropoffLocations"], "coo"))
+    path = tmp_path / "payload.snap"
+    write_snapshot(encoded, path)
+
+    assert (read_snapshot(path).width, read_snapshot(path).height) == (15, 15), "Failed encoded grid size"
+    assert snapshot_statistics(path) == solution_data_list, "Failed encoded grids"
+
+    # Test a coo grid without a stored size
+    write_snapshot(dict(data, pickupLocations={"format": "coo", "entries": [[1, 20, 3]]}), path)
+    assert read_snapshot(path).width == 21, "Failed size of a coo grid"
+
+
+def test_snapshot_out_of_range(tmp_path, data):
+    path = tmp_path / "payload.snap"
+
+    # Test IDs that would wrap around in an int32
+    wide = dict(data, pickupLocations={"format": "coo", "entries": [[2 ** 31 + 5, 0, 0]]})
+    with pytest.raises(ValueError):
+        write_snapshot(wide, path)
+
+    wide = dict(data, requests=[{"driver": 2 ** 31 + 5, "rider": 1, "accepted": True}])
+    with pytest.raises(ValueError):
+        write_snapshot(wide, path)
@@ -0,0 +1,75 @@
+import json
+import pytest
+from main import fetch_rider_and_driver_coords, fetch_driver_passengers, build_statistics, encode_grid
+from streaming import parse_payload_stream, decode_chunks, load_payload_stream, fetch_payload_stream
+
+
+def test_parse_payload_stream(data):
+    text = json.dumps(data)
+    expected_pickup = fetch_rider_and_driver_coords(data["pickupLocations"])
+    expected_dropoff = fetch_rider_and_driver_coords(data["dropoffLocations"])
+    expected_passengers = fetch_driver_passengers(data["requests"])
+
+    # Test with chunk sizes that split tokens at every possible boundary
+    for size in (1, 2, 3, 7, 64, len(text)):
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        payload = parse_payload_stream(chunks)
+        assert payload.pickup_locations == expected_pickup, f"Pickup failed with chunk size {size}"
+        assert payload.dropoff_locations == expected_dropoff, f"Dropoff failed with chunk size {size}"
+        assert payload.driver_passengers == expected_passengers, f"Passengers failed with chunk size {size}"
+
+    # Test with an empty object
+    assert parse_payload_stream(["{ }"]) is None, "Failed Empty Test Case"
+
+    # Test with malformed JSON
+    with pytest.raises(ValueError):
+        parse_payload_stream(['{"requests": [{"rider": 1'])
+
+    # Test only whitespace may follow the payload, like json.loads
+    assert parse_payload_stream(["{}", " \n\t", "\r\n"]) is None, "Failed trailing whitespace"
+    for tail in ("x", "{}", ", 1"):
+        with pytest.raises(ValueError):
+            parse_payload_stream([text, " ", tail])
+
+
+def test_parse_encoded_grids(data, solution_data_list):
+    encoded = dict(data, pickupLocations=encode_grid(data["pickupLocations"], "rle"),
+                   dropoffLocations=encode_grid(data["dropoffLocations"], "coo"))
+    text = json.dumps(encoded)
+    payload = parse_payload_stream(text[i:i + 10] for i in range(0, len(text), 10))
+    assert build_statistics(*payload) == solution_data_list, "Failed streamed encoded grids"
+
+
+def test_decode_chunks():
+    # Test with a multibyte character split across chunks
+    encoded = '{"name": "Zavalá"}'.encode("utf-8")
+    chunks = [encoded[i:i + 1] for i in range(len(encoded))]
+    assert "".join(decode_chunks(chunks)) == '{"name": "Zavalá"}', "Failed split multibyte character"
+
+
+def test_load_payload_stream(solution_data_list):
+    payload = load_payload_stream("test_data.json", chunk_size=5)
+    assert build_statistics(*payload) == solution_data_list, "Sorted groups stats does not match expected"
+
+
+def test_fetch_payload_stream(requests_mock, data, solution_data_list):
+    requests_mock.get("http://sandboxcarpooldata.com/data",
+                      json=data, status_code=200)
+
+    requests_mock.get("http://sandboxcarpooldata.com/faildata",
+                      json=data, status_code=400)
+
+    requests_mock.get("http://sandboxcarpooldata.com/empty",
+                      json={}, status_code=200)
+
+    # Test for sucessful GET 200 response
+    payload = fetch_payload_stream("http://sandboxcarpooldata.com/data", chunk_size=16)
+    assert build_statistics(*payload) == solution_data_list, "Sorted groups stats does not match expected"
+
+    # Test for unsucessful GET 400 response
+    assert fetch_payload_stream(
+        "http://sandboxcarpooldata.com/faildata") is None, "Failed to return None"
+
+    # Test for empty GET 200 response
+    assert fetch_payload_stream(
+        "http://sandboxcarpooldata.com/empty") is None, "Failed Empty Test Case"
@@ -0,0 +1,75 @@
+import copy
+import pytest
+from main import encode_grid, compute_statistics, build_statistics
+from metrics import MetricsCollector
+from validation import PayloadValidationError, validate_payload, compute_validated_statistics
+
+
+@pytest.fixture
+def broken(data):
+    broken = copy.deepcopy(data)
+    # Rider 9 has no pickup
+    broken["pickupLocations"][1][9] = -1
+    # Rider 10 is twice on the dropoff grid
+    broken["dropoffLocations"][0][0] = 10
+    # Rider 4 is also accepted by driver 1
+    broken["requests"][7]["accepted"] = True
+    # Driver 6 is a rider
+    next(user for user in broken["users"] if user["id"] == 6)["role"] = 0
+    return broken
+
+
+def test_validate_payload(data, solution_data_list):
+    validated = validate_payload(data)
+    assert validated.issues == [], "Failed valid payload"
+    assert validated.driver_passengers == {1: [2, 8, 9], 5: [3, 4], 6: [7, 10]}, "Failed groups"
+
+    # Test against the unvalidated statistics for every grid encoding
+    for grid_format in ("coo", "rle"):
+        encoded = dict(data, pickupLocations=encode_grid(data["pickupLocations"], grid_format),
+                       dropoffLocations=encode_grid(data["dropoffLocations"], grid_format))
+        assert compute_validated_statistics(encoded) == solution_data_list, f"Failed {grid_format} grids"
+
+    metrics = MetricsCollector()
+    assert compute_validated_statistics(data, metrics=metrics) == compute_statistics(data), "Failed statistics"
+    assert [record["stage"] for record in metrics.records] == ["validation", "averaging", "sort"]
+    assert metrics.records[0]["counts"] == {"requests": 10, "groups": 3, "issues": 0}, "Failed counts"
+
+
+def test_validate_payload_raise(broken):
+    with pytest.raises(PayloadValidationError) as error:
+        validate_payload(broken)
+
+    issues = error.value.issues
+    assert {"code": "missing_location", "request": 2, "user": 9, "grid": "pickupLocations"} in issues
+    assert {"code": "duplicate_location", "user": 10, "grid": "dropoffLocations"} in issues
+    assert {"code": "rider_accepted_twice", "request": 7, "user": 4, "driver": 1, "first_driver": 5} in issues
+    assert {"code": "driver_role", "request": 5, "user": 6} in issues
+    assert {"code": "driver_role", "request": 6, "user": 6} in issues
+    assert len(issues) == 5, "Failed to report only the broken records"
+    assert isinstance(error.value, ValueError), "Failed error type"
+
+    # Duplicated users
+    broken["users"].append({"name": "Twin", "id": 2, "role": 0})
+    with pytest.raises(PayloadValidationError) as error:
+        validate_payload(broken)
+    assert {"code": "duplicate_user", "user": 2} in error.value.issues, "Failed duplicate user"
+
+    with pytest.raises(ValueError):
+        validate_payload(broken, mode="ignore")
+
+
+def test_validate_payload_drop(broken):
+    validated = validate_payload(broken, mode="drop")
+
+    # Rider 9, driver 6 and the second acceptance of rider 4 are dropped
+    assert validated.driver_passengers == {1: [2, 8], 5: [3, 4]}, "Failed to drop requests"
+    assert 10 not in validated.dropoff_locations and 9 not in validated.pickup_locations, "Failed locations"
+    assert {"code": "missing_location", "request": 6, "user": 10, "grid": "dropoffLocations"} in validated.issues
+
+    stats = compute_validated_statistics(broken, mode="drop")
+    assert stats == build_statistics(*validated[:3]), "Failed statistics of the kept groups"
+
+    # The unvalidated statistics crash on the same payload
+    with pytest.raises(KeyError):
+        compute_statistics(broken)
@@ -0,0 +1,111 @@
+import json
+import socket
+import threading
+import pytest
+from main import build_statistics
+from windowed import WindowedAggregator, WindowResult, aggregate, read_events, open_events
+
+
+def locations(data):
+    # One location event per user at time 0, from the sample grids
+    events = {}
+    for key, kind in (("pickupLocations", "pickup"), ("dropoffLocations", "dropoff")):
+        for y, row in enumerate(data[key]):
+            for x, user in enumerate(row):
+                if user != -1:
+                    events.setdefault(user, {"time": 0, "type": "location", "user": user})[kind] = [x, y]
+    return list(events.values())
+
+
+def accepts(data, time):
+    return [{"time": time, "type": "accept", "driver": request["driver"], "rider": request["rider"]}
+            for request in data["requests"] if request["accepted"]]
+
+
+def test_tumbling_windows(data, solution_data_list):
+    events = locations(data) + accepts(data, 1) + [
+        {"time": 12, "type": "cancel", "driver": 1, "rider": 9},
+        # A cancel only revokes the group, the location of rider 9 is still known
+        {"time": 13, "type": "accept", "driver": 1, "rider": 9},
+        {"time": 14, "type": "location", "user": 9, "pickup": [9, 1], "dropoff": [4, 4]},
+        {"time": 15, "type": "accept", "driver": 1, "rider": 9},
+        {"time": 25, "type": "cancel", "driver": 6, "rider": 10},
+    ]
+    results = list(aggregate(events, window=10))
+
+    # The first window holds the whole sample, the second the re-accepted rider only
+    assert results[0] == WindowResult(0, 10, solution_data_list), "Failed first window"
+    assert results[1].start == 10 and results[1].end == 20, "Failed window bounds"
+    assert [entry["riderIds"] for entry in results[1].statistics] == [[9]], "Failed second window"
+    assert len(results) == 2, "Failed to skip the empty window"
+
+
+def test_sliding_windows(data):
+    events = locations(data) + [
+        {"time": 1, "type": "accept", "driver": 5, "rider": 3},
+        {"time": 6, "type": "accept", "driver": 5, "rider": 4},
+        {"time": 11, "type": "location", "user": 4, "pickup": [0, 0]},
+        {"time": 30, "type": "location", "user": 2, "dropoff": [1, 1]},
+    ]
+    results = list(aggregate(events, window=10, step=5))
+
+    groups = [(result.end, result.statistics[0]["riderIds"]) for result in results]
+    assert groups == [(5, [3]), (10, [3, 4]), (15, [4])], "Failed sliding membership"
+
+    # Test the moved pickup of rider 4 is in the window ending at 15
+    expected = build_statistics({5: [4]}, {4: (0, 0), 5: (13, 7)}, {4: (3, 11), 5: (11, 10)})
+    assert results[2].statistics == expected, "Failed moved location"
+
+
+def test_bounded_state(data):
+    aggregator = WindowedAggregator(window=10)
+    for event in locations(data) + accepts(data, 1):
+        aggregator.push(event)
+    assert aggregator.active() == (7, 10, 3), "Failed active state"
+
+    # Once the window has passed, only the newest location is kept
+    aggregator.push({"time": 100, "type": "location", "user": 2, "pickup": [1, 1], "dropoff": [2, 2]})
+    assert aggregator.active() == (0, 1, 0), "Failed to forget the history"
+
+    # Late events, accepts without a location and unknown cancels are dropped
+    aggregator.push({"time": 50, "type": "accept", "driver": 1, "rider": 2})
+    aggregator.push({"time": 101, "type": "accept", "driver": 1, "rider": 2})
+    aggregator.push({"time": 101, "type": "cancel", "driver": 1, "rider": 3})
+    assert (aggregator.late, aggregator.skipped) == (1, 2), "Failed dropped events"
+
+    # Cancelled users keep their locations until their accept leaves the window
+    aggregator = WindowedAggregator(window=10)
+    for event in locations(data) + accepts(data, 1):
+        aggregator.push(event)
+    aggregator.push({"time": 2, "type": "cancel", "driver": 1, "rider": 9})
+    assert aggregator.active() == (6, 10, 3), "Failed to keep the cancelled locations"
+    aggregator.push({"time": 100, "type": "location", "user": 2, "pickup": [1, 1], "dropoff": [2, 2]})
+    assert aggregator.active() == (0, 1, 0), "Failed to forget the cancelled users"
+
+    with pytest.raises(ValueError):
+        aggregator.push({"time": 101, "type": "teleport"})
+    with pytest.raises(ValueError):
+        WindowedAggregator(window=0)
+
+
+def test_open_events(data, solution_data_list, tmp_path):
+    events = locations(data) + accepts(data, 1)
+    lines = "\n".join(json.dumps(event) for event in events) + "\n\n"
+
+    path = tmp_path / "events.jsonl"
+    path.write_text(lines)
+    assert list(read_events(lines.splitlines())) == events, "Failed JSON lines"
+    assert list(aggregate(open_events(str(path)), 10))[0].statistics == solution_data_list, "Failed file"
+
+    # Test a TCP socket that sends the events then closes
+    listener = socket.create_server(("127.0.0.1", 0))
+
+    def send():
+        connection, _ = listener.accept()
+        with connection:
+            connection.sendall(lines.encode())
+
+    threading.Thread(target=send, daemon=True).start()
+    source = f"tcp://127.0.0.1:{listener.getsockname()[1]}"
+    assert list(aggregate(open_events(source), 10))[0].statistics == solution_data_list, "Failed socket"
+    listener.close()
@@ -0,0 +1,187 @@
+from typing import List, Tuple, Dict, NamedTuple
+from collections import defaultdict
+import numpy as np
+from main import decode_grid_cells, record_columns, build_statistics
+from metrics import MetricsCollector, NULL_METRICS
+
+# Bits of the per user flags
+PICKUP = 1
+DROPOFF = 2
+RIDER_ROLE = 4
+DRIVER_ROLE = 8
+
+GRIDS = (("pickupLocations", PICKUP), ("dropoffLocations", DROPOFF))
+
+MODES = ("raise", "drop")
+
+
+class PayloadValidationError(ValueError):
+    """
+    Raised when a payload breaks the invariants needed to compute its statistics
+
+    Attributes:
+        issues (List[Dict]): One structured report per problem, see `validate_payload`
+    """
+
+    def __init__(self, issues: List[Dict]):
+        self.issues = issues
+        codes = sorted({issue["code"] for issue in issues})
+        super().__init__(f"Invalid payload, {len(issues)} issue(s): {', '.join(codes)}")
+
+
+class ValidatedPayload(NamedTuple):
+    """
+    Everything `build_statistics` needs, produced by the validation pass
+    """
+    driver_passengers: Dict[int, List[int]]
+    pickup_locations: Dict[int, Tuple[int, int]]
+    dropoff_locations: Dict[int, Tuple[int, int]]
+    issues: List[Dict]
+
+
+def validate_payload(data: Dict, mode: str = "raise") -> ValidatedPayload:
+    """
+    Checks a payload in one pass and decodes what `build_statistics` needs on the way
+
+    Every user ID indexes a small array of bit flags (on the pickup grid, on the dropoff grid,
+    rider or driver role), so the checks are array lookups instead of dictionary scans and the
+    grids are only read once. Issues are reported as dictionaries with a `code`:
+        - "duplicate_location": `user` is on the `grid` more than once
+        - "duplicate_user": `user` is listed more than once in `users`
+        - "missing_location": `user` of the accepted `request` (index in `requests`)
+          is not on the `grid`
+        - "rider_accepted_twice": `user` was already accepted by `first_driver`, the `request`
+          accepts it again for `driver`
+        - "driver_role": the `user` accepting the `request` has role 0 (rider) in `users`
+
+    Args:
+        data (Dict): API payload, the grids may use any encoding read by `decode_grid_coords`
+        mode (str): "raise" fails with every issue found,
+                    "drop" leaves out the offending locations and requests and continues
+
+    Return:
+        ValidatedPayload: The groups, both location maps and the issues found (dropped in "drop" mode)
+
+    Raises:
+        PayloadValidationError: In "raise" mode, if any issue was found
+        ValueError: If the mode is unknown
+
+    Example:
+        validate_payload(data, mode="drop").issues
+
+        Output:
+        [{"code": "missing_location", "request": 3, "user": 11, "grid": "pickupLocations"}]
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown validation mode: {mode}")
+
+    issues: List[Dict] = []
+    requests = data["requests"]
+    users = data.get("users") or []
+
+    cells = {key: decode_grid_cells(data[key]) for key, _ in GRIDS}
+    user_ids, roles = record_columns(users, "id", "role").T
+    # JSON booleans decode to True/False, accepted is read as 1/0
+    riders, drivers, accepted = record_columns(requests, "rider", "driver", "accepted").T
+    accepted = np.flatnonzero(accepted == 1)
+    riders, drivers = riders[accepted], drivers[accepted]
+
+    # One flag per user ID, the extra last slot stands for every negative (invalid) ID
+    size = 1 + max([int(ids.max()) for ids in (cells[key][:, 0] for key, _ in GRIDS) if len(ids)]
+                   + [int(ids.max()) for ids in (user_ids, riders, drivers) if len(ids)], default=0)
+    flags = np.zeros(size + 1, dtype=np.uint8)
+
+    def slot(ids: np.ndarray) -> np.ndarray:
+        return np.where(ids >= 0, ids, size)
+
+    locations: Dict[str, Dict[int, Tuple[int, int]]] = {}
+    for key, flag in GRIDS:
+        ids, columns, rows = cells[key].T
+        placed = ids >= 0
+        counts = np.bincount(ids[placed], minlength=size + 1)
+        for user in np.flatnonzero(counts > 1).tolist():
+            issues.append({"code": "duplicate_location", "user": user, "grid": key})
+
+        if mode == "drop":
+            # An ambiguous location is no location
+            placed &= counts[slot(ids)] == 1
+        flags[ids[placed]] |= flag
+        locations[key] = dict(zip(ids[placed].tolist(), zip(columns[placed].tolist(), rows[placed].tolist())))
+
+    if users:
+        counts = np.bincount(user_ids[user_ids >= 0], minlength=size + 1)
+        for user in np.flatnonzero(counts > 1).tolist():
+            issues.append({"code": "duplicate_user", "user": user})
+        # The first entry of a duplicated user decides its role
+        first = np.unique(user_ids, return_index=True)[1]
+        flags[slot(user_ids[first])] |= np.where(roles[first] == 1, DRIVER_ROLE, RIDER_ROLE).astype(np.uint8)
+        flags[size] = 0
+
+    rider_flags, driver_flags = flags[slot(riders)], flags[slot(drivers)]
+    keep = np.ones(len(accepted), dtype=bool)
+
+    for key, flag in GRIDS:
+        for ids, present in ((riders, rider_flags), (drivers, driver_flags)):
+            missing = (present & flag) == 0
+            keep &= ~missing
+            for position in np.flatnonzero(missing).tolist():
+                issues.append({"code": "missing_location", "request": int(accepted[position]),
+                               "user": int(ids[position]), "grid": key})
+
+    if users:
+        rider_driver = (driver_flags & RIDER_ROLE) != 0
+        keep &= ~rider_driver
+        for position in np.flatnonzero(rider_driver).tolist():
+            issues.append({"code": "driver_role", "request": int(accepted[position]),
+                           "user": int(drivers[position])})
+
+    # Only the first acceptance of a rider counts
+    first = np.zeros(len(accepted), dtype=bool)
+    first[np.unique(riders, return_index=True)[1]] = True
+    if not first.all():
+        first_driver = dict(zip(riders[first].tolist(), drivers[first].tolist()))
+        for position in np.flatnonzero(~first).tolist():
+            rider = int(riders[position])
+            issues.append({"code": "rider_accepted_twice", "request": int(accepted[position]), "user": rider,
+                           "driver": int(drivers[position]), "first_driver": first_driver[rider]})
+        keep &= first
+
+    if issues and mode == "raise":
+        raise PayloadValidationError(issues)
+
+    driver_passengers: Dict = defaultdict(list)
+    for driver, rider in zip(drivers[keep].tolist(), riders[keep].tolist()):
+        driver_passengers[driver].append(rider)
+
+    return ValidatedPayload(driver_passengers, locations["pickupLocations"],
+                            locations["dropoffLocations"], issues)
+
+
+def compute_validated_statistics(data: Dict, mode: str = "raise",
+                                 metrics: MetricsCollector = None) -> List[Dict]:
+    """
+    Validates a payload then generates its sorted statistics, the same output as
+    `compute_statistics` for a valid payload
+
+    Args:
+        data (Dict): API payload shaped like `test_data.json`
+        mode (str): "raise" or "drop", see `validate_payload`
+        metrics (MetricsCollector): Records the `validation`, `averaging` and `sort` stages, off by default
+
+    Return:
+        List[Dict]: Groups of the statistics sorted in ascending order using manhattan distance
+
+    Raises:
+        PayloadValidationError: In "raise" mode, if the payload is invalid
+    """
+    metrics = metrics or NULL_METRICS
+
+    with metrics.stage("validation") as stage:
+        validated = validate_payload(data, mode)
+        stage.count(requests=len(data["requests"]), groups=len(validated.driver_passengers),
+                    issues=len(validated.issues))
+
+    return build_statistics(validated.driver_passengers,
+                            validated.pickup_locations,
+                            validated.dropoff_locations,
+                            metrics)
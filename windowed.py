@@ -0,0 +1,238 @@
+from typing import List, Tuple, Dict, Iterable, Iterator, NamedTuple
+from collections import deque
+import argparse
+import json
+import math
+import socket
+import sys
+from group_stats import GroupStats
+
+
+class WindowResult(NamedTuple):
+    """
+    Statistics of the groups active in the window [start, end)
+    """
+    start: float
+    end: float
+    statistics: List[Dict]
+
+
+class WindowedAggregator:
+    """
+    Rolling statistics over a time ordered stream of request events
+
+    Events are dictionaries with a `time` and a `type`:
+        - {"type": "accept", "driver": 1, "rider": 2}: the rider joins the driver's group
+        - {"type": "cancel", "driver": 1, "rider": 2}: the rider leaves the driver's group
+        - {"type": "location", "user": 2, "pickup": [x, y], "dropoff": [x, y]}: sets either or both
+          locations of a user
+
+    The groups live in a `GroupStats`, so every event only updates the sums of the group it
+    touches. Windows are `window` long and end every `step` (tumbling windows when step is the
+    window), an accept counts in every window that contains its time. When an event reaches the
+    end of a window, the accepts older than the window are revoked and the sorted statistics of
+    the window are emitted. Expired accepts and the locations of users that are no longer grouped
+    are forgotten, so memory is bounded by the events of the active window.
+
+    Args:
+        window (float): Length of a window, in the unit of the event times
+        step (float): Time between two window ends, defaults to the window (tumbling)
+
+    Attributes:
+        late (int): Events dropped because their time is before the end of the last emitted window
+        skipped (int): Events dropped because they do not apply (unknown location, rider already
+            in another group, cancel of a request that is not active)
+
+    Example:
+        aggregator = WindowedAggregator(window=60, step=10)
+        for event in events:
+            for result in aggregator.push(event):
+                print(result.end, result.statistics)
+        aggregator.flush()
+    """
+
+    def __init__(self, window: float, step: float = None):
+        if window <= 0 or (step is not None and step <= 0):
+            raise ValueError("The window and step must be positive")
+        self.window = window
+        self.step = step or window
+        self.stats = GroupStats({}, {}, {})
+        self.late = 0
+        self.skipped = 0
+        # End of the window being filled, set by the first event
+        self._end = None
+        # Active accepts as (time, sequence, driver, rider) in time order
+        self._accepts: deque = deque()
+        # Rider mapped to the sequence of the accept that grouped it
+        self._accepted: Dict[int, int] = {}
+        self._sequence = 0
+        # Location updates as (time, user) in time order, and the latest time of each user
+        self._updates: deque = deque()
+        self._located: Dict[int, float] = {}
+
+    def push(self, event: Dict) -> List[WindowResult]:
+        """
+        Applies one event, after emitting every window that ends at or before its time
+
+        Return:
+            List[WindowResult]: Windows closed by the event, usually none
+        """
+        time = event["time"]
+        if self._end is None:
+            self._end = (math.floor(time / self.step) + 1) * self.step
+        if time < self._end - self.step:
+            self.late += 1
+            return []
+
+        results = []
+        while time >= self._end:
+            results.extend(self._close_window())
+            if not self._accepted and time >= self._end:
+                # Every window up to the event's is empty, jump straight to it
+                self._end = (math.floor(time / self.step) + 1) * self.step
+                self._expire(self._end - self.window)
+        self._apply(event, time)
+        return results
+
+    def flush(self) -> List[WindowResult]:
+        """
+        Emits the window being filled, at the end of the stream
+        """
+        if self._end is None or not self.stats:
+            return []
+        return self._close_window()
+
+    def _close_window(self) -> List[WindowResult]:
+        start, end = self._end - self.window, self._end
+        self._expire(start)
+        self._end += self.step
+
+        if not self.stats:
+            # Nothing is active, skip the empty windows up to the next event
+            return []
+        return [WindowResult(start, end, self.stats.sorted_entries())]
+
+    def _apply(self, event: Dict, time: float):
+        kind = event["type"]
+        if kind == "location":
+            user = event["user"]
+            if event.get("pickup") is not None:
+                self.stats.move_pickup(user, tuple(event["pickup"]))
+            if event.get("dropoff") is not None:
+                self.stats.move_dropoff(user, tuple(event["dropoff"]))
+            self._located[user] = time
+            self._updates.append((time, user))
+            return
+        if kind not in ("accept", "cancel"):
+            raise ValueError(f"Unknown event type: {kind}")
+
+        driver, rider = event["driver"], event["rider"]
+        if kind == "accept":
+            try:
+                self.stats.accept(driver, rider)
+            except (KeyError, ValueError):
+                self.skipped += 1
+                return
+            # Accepting again refreshes the request
+            self._sequence += 1
+            self._accepted[rider] = self._sequence
+            self._accepts.append((time, self._sequence, driver, rider))
+        else:
+            if self.stats.driver_of(rider) != driver:
+                self.skipped += 1
+                return
+            # Only the group changes, the locations expire with the accept in `_expire`
+            self.stats.revoke(driver, rider)
+            del self._accepted[rider]
+
+    def _expire(self, start: float):
+        # Revoke the accepts that ended before the window starts, cancelled ones were already revoked
+        while self._accepts and self._accepts[0][0] < start:
+            _, sequence, driver, rider = self._accepts.popleft()
+            if self._accepted.get(rider) == sequence:
+                self.stats.revoke(driver, rider)
+                del self._accepted[rider]
+            self._forget(driver, start)
+            self._forget(rider, start)
+
+        while self._updates and self._updates[0][0] < start:
+            _, user = self._updates.popleft()
+            self._forget(user, start)
+
+    def _forget(self, user: int, start: float):
+        # Drop the locations of a user that is not grouped and was not located in the window
+        grouped = user in self.stats or self.stats.driver_of(user) is not None
+        if not grouped and self._located.get(user, start) < start:
+            del self._located[user]
+            self.stats.pickup_coords.pop(user, None)
+            self.stats.dropoff_coords.pop(user, None)
+
+    def active(self) -> Tuple[int, int, int]:
+        """
+        Size of the state kept: active accepts, located users and groups
+        """
+        return len(self._accepted), len(self._located), len(self.stats)
+
+
+def aggregate(events: Iterable[Dict], window: float, step: float = None) -> Iterator[WindowResult]:
+    """
+    Runs a `WindowedAggregator` over a whole event stream
+
+    Args:
+        events (Iterable[Dict]): Time ordered events, see `WindowedAggregator`
+        window (float): Length of a window
+        step (float): Time between two window ends, defaults to the window (tumbling)
+
+    Return:
+        Iterator[WindowResult]: Every non empty window in time order, the last one is flushed
+            when the stream ends
+    """
+    aggregator = WindowedAggregator(window, step)
+    for event in events:
+        yield from aggregator.push(event)
+    yield from aggregator.flush()
+
+
+def read_events(lines: Iterable[str]) -> Iterator[Dict]:
+    """
+    Parses JSON lines events, blank lines are ignored
+    """
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def open_events(source: str) -> Iterator[Dict]:
+    """
+    Reads the events of a JSON lines file, a TCP socket ("tcp://host:port") or a
+    Unix socket ("unix:///path"), one event per line until the stream ends
+    """
+    if source.startswith("tcp://"):
+        host, port = source[len("tcp://"):].rsplit(":", 1)
+        connection = socket.create_connection((host, int(port)))
+    elif source.startswith("unix://"):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(source[len("unix://"):])
+    else:
+        with open(source, "r", encoding="utf-8") as file:
+            yield from read_events(file)
+        return
+
+    with connection, connection.makefile("r", encoding="utf-8") as stream:
+        yield from read_events(stream)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Rolling carpool statistics over a request event stream")
+    parser.add_argument("source", help="JSON lines file, tcp://host:port or unix:///path")
+    parser.add_argument("--window", type=float, required=True, help="window length, in event time units")
+    parser.add_argument("--step", type=float, help="time between window ends, tumbling windows by default")
+    args = parser.parse_args(argv)
+
+    for result in aggregate(open_events(args.source), args.window, args.step):
+        sys.stdout.write(json.dumps(result._asdict()) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()